@@ -0,0 +1,52 @@
+"""
+Distância percorrida por trecho entre amostras consecutivas (NumPy).
+
+- odometer_deltas: diferença entre leituras de hodômetro;
+- gps_deltas: haversine entre pontos GPS (fallback sem hodômetro).
+Trechos negativos (reset/troca de device) ou implausíveis (velocidade
+implícita acima de MAX_SPEED_KMH) viram 0, assim como trechos GPS com
+intervalo maior que GPS_MAX_GAP_MS (linha reta entre pontos distantes no
+tempo não é trajeto; o hodômetro continua valendo). O primeiro trecho não
+tem amostra anterior e também é 0.
+"""
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+MAX_SPEED_KMH = 180.0   # acima disso o salto é ruído/reset, não deslocamento
+JUMP_SLACK_KM = 0.5     # folga p/ resolução do hodômetro e amostras muito próximas
+GPS_MAX_GAP_MS = 30 * 60 * 1000
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _clean(delta: np.ndarray, ts_ms: np.ndarray, max_kmh: float, max_gap_ms: float = np.inf) -> np.ndarray:
+    gap = np.diff(ts_ms)
+    hours = gap / 3_600_000
+    bad = (~np.isfinite(delta) | (delta < 0) | (delta > max_kmh * hours + JUMP_SLACK_KM)
+           | (gap > max_gap_ms))
+    return np.concatenate([[0.0], np.where(bad, 0.0, delta)])
+
+
+def odometer_deltas(ts_ms, odometer_km, max_kmh: float = MAX_SPEED_KMH) -> np.ndarray:
+    """km de cada amostra desde a anterior (entrada ordenada por ts_ms)."""
+    ts = np.asarray(ts_ms, dtype=float)
+    km = np.asarray(odometer_km, dtype=float)
+    if len(ts) == 0:
+        return np.zeros(0)
+    return _clean(np.diff(km), ts, max_kmh)
+
+
+def gps_deltas(ts_ms, lat, lon, max_kmh: float = MAX_SPEED_KMH,
+               max_gap_ms: float = GPS_MAX_GAP_MS) -> np.ndarray:
+    """km de cada ponto desde o anterior (entrada ordenada por ts_ms)."""
+    ts = np.asarray(ts_ms, dtype=float)
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    if len(ts) == 0:
+        return np.zeros(0)
+    return _clean(haversine_km(lat[:-1], lon[:-1], lat[1:], lon[1:]), ts, max_kmh, max_gap_ms)
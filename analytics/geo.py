@@ -0,0 +1,73 @@
+"""
+Funções geográficas vetorizadas (pandas/NumPy).
+"""
+import numpy as np
+import pandas as pd
+
+INCIDENT_TOLERANCE_MS = 5 * 60 * 1000  # incidente <-> ponto GPS mais próximo em até ±5 min
+PASSAGE_GAP_MS = 10 * 60 * 1000         # pontos na área a mais de 10 min = outra passagem
+
+
+def locate_events(events: pd.DataFrame, points: pd.DataFrame,
+                  tolerance_ms: int = INCIDENT_TOLERANCE_MS) -> pd.DataFrame:
+    """
+    Posiciona eventos no ponto GPS mais próximo no tempo do mesmo device.
+
+    events: device_id, ts_ms (+ quaisquer colunas); points: device_id, ts_ms, latitude, longitude.
+    Retorna `events` (ordenado por ts_ms) com latitude/longitude; NaN se não há
+    ponto dentro de `tolerance_ms`. Um merge_asof por device, O(n log n).
+    """
+    ev = events.drop(columns=[c for c in ("latitude", "longitude") if c in events.columns])
+    ev = ev.astype({"ts_ms": "int64", "device_id": str}).sort_values("ts_ms", kind="stable")
+    pts = (points[["device_id", "ts_ms", "latitude", "longitude"]]
+           .dropna(subset=["latitude", "longitude"])
+           .astype({"ts_ms": "int64", "device_id": str, "latitude": float, "longitude": float})
+           .sort_values("ts_ms", kind="stable"))
+    if ev.empty or pts.empty:
+        return ev.assign(latitude=float("nan"), longitude=float("nan"))
+    return pd.merge_asof(ev, pts, on="ts_ms", by="device_id",
+                         tolerance=tolerance_ms, direction="nearest")
+
+
+def merge_windows(ts_ms, pad_ms: int) -> list[tuple[int, int]]:
+    """Une janelas [t-pad, t+pad] sobrepostas em intervalos disjuntos."""
+    out: list[list[int]] = []
+    for t in sorted(int(v) for v in ts_ms):
+        lo, hi = t - pad_ms, t + pad_ms
+        if out and lo <= out[-1][1]:
+            out[-1][1] = max(out[-1][1], hi)
+        else:
+            out.append([lo, hi])
+    return [(a, b) for a, b in out]
+
+
+def in_polygon(lat, lon, polygon: list[tuple[float, float]]) -> np.ndarray:
+    """Máscara dos pontos dentro do polígono [(lat, lon), ...] (ray casting, lat/lon planos)."""
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    inside = np.zeros(len(lat), dtype=bool)
+    n = len(polygon)
+    for i in range(n):
+        (ya, xa), (yb, xb) = polygon[i], polygon[(i + 1) % n]
+        if ya == yb:
+            continue
+        crosses = (ya > lat) != (yb > lat)
+        x = xa + (lat - ya) * (xb - xa) / (yb - ya)
+        inside ^= crosses & (lon < x)
+    return inside
+
+
+def passages(points: pd.DataFrame, gap_ms: int = PASSAGE_GAP_MS) -> pd.DataFrame:
+    """
+    Pontos dentro de uma área (device_id, ts_ms) -> uma linha por passagem:
+    device_id, entry_ms, exit_ms, points. Intervalo maior que `gap_ms` entre
+    pontos do mesmo device na área abre uma passagem nova.
+    """
+    if points.empty:
+        return pd.DataFrame(columns=["device_id", "entry_ms", "exit_ms", "points"])
+    p = points[["device_id", "ts_ms"]].sort_values(["device_id", "ts_ms"], kind="stable")
+    new = (p["device_id"] != p["device_id"].shift()) | (p["ts_ms"].diff() > gap_ms)
+    out = (p.groupby(new.cumsum().to_numpy())
+             .agg(device_id=("device_id", "first"), entry_ms=("ts_ms", "min"),
+                  exit_ms=("ts_ms", "max"), points=("ts_ms", "size")))
+    return out.sort_values("entry_ms", ignore_index=True)
@@ -0,0 +1,61 @@
+"""
+Grade fixa lat/lon para agregar pontos (mapa de calor da frota).
+
+Célula base de CELL_DEG graus (1/128° ≈ 870 m de latitude), com índices
+inteiros não negativos (lat + 90, lon + 180): um nível mais grosso é só
+divisão inteira por k = 2^n, no SQL (GROUP BY cy / k) ou no NumPy.
+"""
+import numpy as np
+
+CELL_DEG = 1 / 128
+CELLS_ACROSS = 160        # células no maior lado do recorte (nível de detalhe 1x)
+
+
+def cells(lat, lon) -> tuple[np.ndarray, np.ndarray]:
+    """Índices (cy, cx) da célula base de cada ponto."""
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    return (np.floor((lat + 90) / CELL_DEG).astype(np.int64),
+            np.floor((lon + 180) / CELL_DEG).astype(np.int64))
+
+
+def aggregate(lat, lon) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Pontos -> (cy, cx, n) por célula base (ignora coordenadas ausentes)."""
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    ok = np.isfinite(lat) & np.isfinite(lon)
+    if not ok.any():
+        e = np.zeros(0, dtype=np.int64)
+        return e, e, e
+    cy, cx = cells(lat[ok], lon[ok])
+    keys, n = np.unique(np.stack([cy, cx], axis=1), axis=0, return_counts=True)
+    return keys[:, 0], keys[:, 1], n
+
+
+def centers(cy, cx, k: int = 1) -> tuple[np.ndarray, np.ndarray]:
+    """Centro (lat, lon) das células do nível k."""
+    size = CELL_DEG * k
+    return (np.asarray(cy) + 0.5) * size - 90, (np.asarray(cx) + 0.5) * size - 180
+
+
+def _wquantile(v: np.ndarray, w: np.ndarray, q: float) -> float:
+    order = np.argsort(v)
+    cw = np.cumsum(w[order])
+    return float(v[order][np.searchsorted(cw, q * cw[-1])])
+
+
+def pick_level(cy, cx, n, k: int, detail: float = 1.0, trim: float = 0.01) -> int:
+    """
+    Nível (k potência de 2) p/ a área onde a frota rodou, a partir de uma
+    amostra grossa (células do nível k com pesos n): ~CELLS_ACROSS x detail
+    células no maior lado do recorte, descartando `trim` dos pontos em cada
+    ponta (ruído de GPS longe da operação não dita a resolução).
+    """
+    cy, cx, n = (np.asarray(a, dtype=float) for a in (cy, cx, n))
+    if len(n) == 0:
+        return 1
+    span_y = (_wquantile(cy, n, 1 - trim) - _wquantile(cy, n, trim) + 1) * k
+    lat = (_wquantile(cy, n, 0.5) + 0.5) * k * CELL_DEG - 90
+    span_x = (_wquantile(cx, n, 1 - trim) - _wquantile(cx, n, trim) + 1) * k * np.cos(np.radians(lat))
+    want = max(span_y, span_x) / (CELLS_ACROSS * detail)
+    return int(2 ** max(0, int(np.ceil(np.log2(max(want, 1.0))))))
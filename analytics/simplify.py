@@ -0,0 +1,101 @@
+"""
+Simplificação de séries para visualização (servidor, NumPy).
+
+- simplify_path: Douglas–Peucker com orçamento de pontos (rota no mapa).
+- lttb: Largest-Triangle-Three-Buckets (velocidade x tempo).
+Ambas devolvem índices dos pontos mantidos (sempre incluem o primeiro e o
+último), então o DataFrame original fica intacto para exportação.
+"""
+import heapq
+
+import numpy as np
+
+
+def path_budget(window_days: float, detail: float = 1.0) -> int:
+    """Orçamento de pontos da rota: cresce com a janela, com teto para o navegador."""
+    base = 1500 + 500 * max(window_days, 0.0)
+    return int(min(max(base * detail, 200), 20_000))
+
+
+def chart_budget(detail: float = 1.0) -> int:
+    """Pontos do gráfico de linha: ~2 por pixel de largura já é indistinguível."""
+    return int(min(max(2000 * detail, 200), 10_000))
+
+
+def _seg_dist(x: np.ndarray, y: np.ndarray, i: int, j: int) -> tuple[float, int]:
+    """Maior distância (e índice) dos pontos i+1..j-1 ao segmento i–j."""
+    if j - i < 2:
+        return 0.0, -1
+    xs, ys = x[i + 1:j], y[i + 1:j]
+    dx, dy = x[j] - x[i], y[j] - y[i]
+    norm = dx * dx + dy * dy
+    if norm == 0.0:
+        d = np.hypot(xs - x[i], ys - y[i])
+    else:
+        t = np.clip(((xs - x[i]) * dx + (ys - y[i]) * dy) / norm, 0.0, 1.0)
+        d = np.hypot(xs - (x[i] + t * dx), ys - (y[i] + t * dy))
+    k = int(np.argmax(d))
+    return float(d[k]), i + 1 + k
+
+
+def simplify_path(lon, lat, budget: int, tolerance: float = 0.0) -> np.ndarray:
+    """
+    Douglas–Peucker guloso por orçamento: divide sempre o trecho de maior
+    desvio até atingir `budget` pontos (ou desvio <= `tolerance`, em graus).
+    Retorna índices ordenados dos pontos mantidos.
+    """
+    x = np.asarray(lon, dtype=float)
+    y = np.asarray(lat, dtype=float)
+    n = len(x)
+    if n <= max(budget, 2):
+        return np.arange(n)
+    # corrige a escala da longitude pela latitude média (distâncias ~ isotrópicas)
+    x = x * np.cos(np.radians(np.nanmean(y)))
+
+    keep = [0, n - 1]
+    heap = []
+    d, k = _seg_dist(x, y, 0, n - 1)
+    if k >= 0:
+        heap.append((-d, 0, n - 1, k))
+    while heap and len(keep) < budget:
+        neg_d, i, j, k = heapq.heappop(heap)
+        if -neg_d <= tolerance:
+            break
+        keep.append(k)
+        for a, b in ((i, k), (k, j)):
+            d, kk = _seg_dist(x, y, a, b)
+            if kk >= 0:
+                heapq.heappush(heap, (-d, a, b, kk))
+    return np.sort(np.asarray(keep))
+
+
+def lttb(x, y, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: escolhe `n_out` índices preservando a forma
+    visual da série (picos de velocidade não somem como numa média/amostragem).
+    `x` numérico crescente (ex.: ts_ms).
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    y = np.nan_to_num(y)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)  # n_out-2 baldes internos
+    out = np.empty(n_out, dtype=int)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        # média do próximo balde (ou o último ponto)
+        if b + 2 < len(edges):
+            nlo, nhi = edges[b + 1], edges[b + 2]
+            cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        else:
+            cx, cy = x[-1], y[-1]
+        xs, ys = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - cx) * (ys - y[a]) - (x[a] - xs) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        out[b + 1] = a
+    return out
@@ -0,0 +1,72 @@
+"""
+Segmentação de viagens e paradas a partir dos pontos GPS de um device (NumPy).
+
+Ponto "em movimento" = speed >= MOVING_KMH. Dois pontos em movimento
+consecutivos ficam na mesma viagem, a não ser que entre eles haja uma
+parada (pontos parados por STOP_MIN_MS ou mais) ou um buraco sem dados de
+GAP_MS ou mais. A viagem começa no último ponto parado antes de sair e
+termina no primeiro ponto parado ao chegar (quando estão a menos de GAP_MS).
+Viagens curtas demais (MIN_TRIP_KM e MIN_TRIP_MS) são ruído de GPS/manobra.
+
+Sem ignição nos log_records: velocidade e tempo decidem sozinhos.
+"""
+import numpy as np
+
+MOVING_KMH = 5.0
+STOP_MIN_MS = 5 * 60 * 1000       # parado por 5 min encerra a viagem
+GAP_MS = 15 * 60 * 1000           # 15 min sem pontos também
+MIN_TRIP_KM = 0.2
+MIN_TRIP_MS = 60 * 1000
+
+FIELDS = ("start_ms", "end_ms", "duration_ms", "points", "km", "max_kmh", "avg_kmh",
+          "lat_min", "lat_max", "lon_min", "lon_max")
+
+
+def segment(ts_ms, speed, lat, lon, delta_km) -> tuple[list[dict], int | None]:
+    """
+    Viagens dos pontos (um device, ordenados por ts_ms). Retorna (viagens,
+    resume_ms): de onde segmentar de novo quando chegarem pontos novos — o
+    início da última viagem se ela ainda pode continuar (sem parada longa
+    depois dela), senão o último ponto. None se não há pontos.
+    """
+    ts = np.asarray(ts_ms, dtype=np.int64)
+    spd = np.nan_to_num(np.asarray(speed, dtype=float))
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    dkm = np.nan_to_num(np.asarray(delta_km, dtype=float))
+    if len(ts) == 0:
+        return [], None
+    moving = np.flatnonzero(spd >= MOVING_KMH)
+    if len(moving) == 0:
+        return [], int(ts[-1])
+
+    # quebra entre pontos em movimento consecutivos (i, j)
+    gap = np.diff(ts[moving])
+    stopped_between = np.diff(moving) > 1
+    brk = (gap >= GAP_MS) | (stopped_between & (gap >= STOP_MIN_MS))
+    firsts = moving[np.concatenate([[True], brk])]
+    lasts = moving[np.concatenate([brk, [True]])]
+
+    n = len(ts)
+    trips = []
+    resume = int(ts[-1])
+    for a, b in zip(firsts, lasts):
+        a = a - 1 if a > 0 and ts[a] - ts[a - 1] < GAP_MS else a          # saída: último ponto parado
+        # a última viagem só está fechada com uma parada longa o bastante depois dela
+        if b == lasts[-1] and not (b < n - 1 and ts[-1] - ts[b] >= STOP_MIN_MS):
+            resume = int(ts[a])
+        b = b + 1 if b + 1 < n and ts[b + 1] - ts[b] < GAP_MS else b      # chegada: primeiro ponto parado
+        dur = int(ts[b] - ts[a])
+        km = float(dkm[a + 1:b + 1].sum())
+        if km < MIN_TRIP_KM or dur < MIN_TRIP_MS:
+            continue
+        la, lo = lat[a:b + 1], lon[a:b + 1]
+        ok = np.isfinite(la) & np.isfinite(lo)
+        trips.append({
+            "start_ms": int(ts[a]), "end_ms": int(ts[b]), "duration_ms": dur, "points": int(b - a + 1),
+            "km": round(km, 3), "max_kmh": float(spd[a:b + 1].max()),
+            "avg_kmh": round(km / (dur / 3_600_000), 1) if dur else 0.0,
+            "lat_min": float(la[ok].min()) if ok.any() else None, "lat_max": float(la[ok].max()) if ok.any() else None,
+            "lon_min": float(lo[ok].min()) if ok.any() else None, "lon_max": float(lo[ok].max()) if ok.any() else None,
+        })
+    return trips, resume
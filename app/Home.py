@@ -2,7 +2,6 @@ import pandas as pd
 import pytz
 import streamlit as st
 from pathlib import Path
-from sqlalchemy import create_engine, text
 from datetime import datetime, timedelta, timezone
 import pydeck as pdk
 import plotly.express as px
@@ -12,28 +11,17 @@ from pathlib import Path
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
-# ---------------------------------------------------------------------------
-# ---- HOTFIX: get_api direto aqui para o Streamlit Cloud ----
-import os
-import mygeotab
-
-def get_api():
-    user   = os.environ.get("MYGEOTAB_USERNAME")
-    pwd    = os.environ.get("MYGEOTAB_PASSWORD")
-    db     = os.environ.get("MYGEOTAB_DB")
-    server = os.environ.get("MYGEOTAB_SERVER")  # opcional
-
-    if not user or not pwd or not db:
-        raise ValueError("Defina MYGEOTAB_USERNAME, MYGEOTAB_PASSWORD e MYGEOTAB_DB em Secrets.")
-
-    api = mygeotab.API(username=user, password=pwd, database=db, server=server)
-    api.authenticate()
-    return api
-# ------------------------------------------------------------
-from config import get_api
+from db.models import read_engine, to_epoch_ms
+from db import queries
+from db.cache import QueryCache, scope, DEVICE_REGISTRY
+from analytics.simplify import simplify_path, lttb, path_budget, chart_budget
+from analytics.geo import locate_events, passages, INCIDENT_TOLERANCE_MS
+from analytics import grid
+import perf
 
 # ====== Config & helpers ======
 st.set_page_config(page_title="Forttis • Geotab MVP", layout="wide")
+perf.start_run("dashboard")  # tempos deste rerun (painel "Performance"; FORTTIS_PERF=1)
 
 TZ_SP = pytz.timezone("America/Sao_Paulo")
 
@@ -46,72 +34,69 @@ st.caption("Selecione veículo e período para visualizar rota e velocidade.")
 
 @st.cache_resource
 def get_engine():
-    db_path = Path(__file__).resolve().parents[1] / "forttis.db"
-    return create_engine(f"sqlite:///{db_path}")
+    # conexões somente leitura (WAL): não bloqueiam nem são bloqueadas pelo sync
+    return read_engine
 
 ENGINE = get_engine()
 
-@st.cache_data(ttl=60)
+@st.cache_resource
+def get_cache():
+    # um cache por processo, compartilhado entre as sessões: sem ttl, cada resultado
+    # vale até o ETL gravar algo nos devices/dias que ele leu (db.cache, data_versions)
+    return QueryCache(bind=read_engine)
+
+CACHE = get_cache()
+
+def dias_sp(dt_ini_utc, dt_fim_utc):
+    """Dias locais (SP) de uma janela UTC: escopo das consultas por janela no cache."""
+    return dt_ini_utc.astimezone(TZ_SP).date(), dt_fim_utc.astimezone(TZ_SP).date()
+
+@perf.timed("app.load_devices_df")
+@CACHE.cached(scope=lambda: DEVICE_REGISTRY)
 def load_devices_df():
-    return pd.read_sql("SELECT id, name FROM devices ORDER BY name", ENGINE)
+    return queries.load_devices(ENGINE)
 
-@st.cache_data(ttl=60)
+@perf.timed("app.load_points_df")
+@CACHE.cached(scope=lambda d, a, b: scope(d, *dias_sp(a, b)))
 def load_points_df(device_label, dt_ini_utc, dt_fim_utc):
-    q = text("""
-        SELECT device_id, date_time, latitude, longitude, speed
-        FROM log_records
-        WHERE device_id = :did
-          AND date_time BETWEEN :dt_from AND :dt_to
-        ORDER BY date_time ASC
-    """)
-    return pd.read_sql(q, ENGINE, params={
-        "did": device_label,
-        "dt_from": dt_ini_utc.isoformat(),
-        "dt_to": dt_fim_utc.isoformat()
-    })
+    return queries.load_points(device_label, to_epoch_ms(dt_ini_utc), to_epoch_ms(dt_fim_utc), ENGINE)
+
+@perf.timed("app.load_trips_df")
+@CACHE.cached(scope=lambda d, a, b: scope(d, *dias_sp(a, b)))
+def load_trips_df(device_label, dt_ini_utc, dt_fim_utc):
+    """Viagens do veículo iniciadas no período (segmentadas pelo ETL, tabela trips)."""
+    df = queries.load_trips(device_label, to_epoch_ms(dt_ini_utc), to_epoch_ms(dt_fim_utc), ENGINE)
+    df["inicio_sp"] = pd.to_datetime(df["start_ms"], unit="ms", utc=True).dt.tz_convert(TZ_SP)
+    df["fim_sp"] = pd.to_datetime(df["end_ms"], unit="ms", utc=True).dt.tz_convert(TZ_SP)
+    return df
+
+def fmt_dur(ms):
+    """ms -> '2h 05m' (ou '-' se ausente)."""
+    if ms is None or pd.isna(ms):
+        return "-"
+    mins = int(ms // 60_000)
+    return f"{mins // 60}h {mins % 60:02d}m"
 
-@st.cache_data(ttl=60)
-def load_km_period(dt_ini_utc, dt_fim_utc, only_device_id: str | None):
+@perf.timed("app.load_km_period")
+@CACHE.cached(scope=lambda d0, d1, d: scope(d, d0, d1))
+def load_km_period(day_ini, day_fim, only_device_id: str | None):
     """
-    Calcula km rodados no período: (max(odômetro) - min(odômetro)).
+    Km rodados no período (dias locais): soma dos trechos (hodômetro ou GPS), do rollup diário.
     Se only_device_id=None, agrega por veículo e também retorna total da frota.
     """
-    base = """
-        SELECT device_id,
-               MIN(odometer_km) AS odo_min,
-               MAX(odometer_km) AS odo_max
-        FROM odometer_samples
-        WHERE date_time BETWEEN :dt_from AND :dt_to
-    """
-    params = {"dt_from": dt_ini_utc.isoformat(), "dt_to": dt_fim_utc.isoformat()}
-    if only_device_id:
-        base += " AND device_id = :did"
-        params["did"] = only_device_id
-    base += " GROUP BY device_id"
-    df = pd.read_sql(text(base), ENGINE, params=params)
-    if df.empty:
-        return df, 0.0
-    df["km_periodo"] = (df["odo_max"] - df["odo_min"]).clip(lower=0)
-    total = float(df["km_periodo"].sum())
-    return df[["device_id","km_periodo"]], total
-
-@st.cache_data(ttl=60)
+    return queries.load_km_period(day_ini.isoformat(), day_fim.isoformat(), only_device_id, ENGINE)
+
+@perf.timed("app.load_severe_df")
+@CACHE.cached(scope=lambda d0, d1, d: scope(d, d0, d1))
+def load_severe_df(day_ini, day_fim, only_device_id: str | None):
+    """Incidentes graves por veículo no período (rollup diário)."""
+    return queries.load_severe_by_device(day_ini.isoformat(), day_fim.isoformat(), only_device_id, ENGINE)
+
+@perf.timed("app.load_incidents_df")
+@CACHE.cached(scope=lambda a, b, d: scope(d, *dias_sp(a, b)))
 def load_incidents_df(dt_ini_utc, dt_fim_utc, only_device_id: str | None):
-    base_sql = """
-        SELECT e.device_id, e.rule_name, e.severity, e.date_time, d.name AS device_name
-        FROM exception_events e
-        JOIN devices d ON d.id = e.device_id
-        WHERE e.date_time BETWEEN :dt_from AND :dt_to
-          AND e.rule_name IN ('Harsh Braking','Harsh Acceleration','Harsh Cornering','Possible Collision')
-    """
-    params = {"dt_from": dt_ini_utc.isoformat(), "dt_to": dt_fim_utc.isoformat()}
-    if only_device_id:
-        base_sql += " AND e.device_id = :did"
-        params["did"] = only_device_id
-    base_sql += " ORDER BY e.date_time ASC"
-    df = pd.read_sql(text(base_sql), ENGINE, params=params)
+    df = queries.load_incidents(to_epoch_ms(dt_ini_utc), to_epoch_ms(dt_fim_utc), only_device_id, ENGINE)
     if not df.empty:
-        df["dt_utc"] = pd.to_datetime(df["date_time"]).dt.tz_localize("UTC")
         df["dt_sp"] = df["dt_utc"].dt.tz_convert(TZ_SP)
         # cor por severidade (RGB)
         sev_map = {
@@ -120,17 +105,80 @@ def load_incidents_df(dt_ini_utc, dt_fim_utc, only_device_id: str | None):
             "Medium":   [255, 200, 0],
             "Low":      [120, 180, 255],
         }
-        df["color"] = df["severity"].map(sev_map).fillna([150,150,150])
+        df["color"] = df["severity"].map(lambda sev: sev_map.get(sev, [150, 150, 150]))
     return df
 
-def fetch_feed(api, type_name: str, from_version: str | None = None, results_limit: int = 1000):
-    """Wrapper compatível para GetFeed em qualquer versão do SDK."""
-    params = {"typeName": type_name, "resultsLimit": results_limit}
-    if from_version:
-        params["fromVersion"] = from_version
-    return api.call("GetFeed", **params)
+def escopo_pendentes(pend):
+    """Devices e dias (±tolerância) dos incidentes pendentes."""
+    ms = [pend["ts_ms"].min() - INCIDENT_TOLERANCE_MS, pend["ts_ms"].max() + INCIDENT_TOLERANCE_MS]
+    a, b = pd.to_datetime(ms, unit="ms", utc=True).tz_convert(TZ_SP).date
+    return scope(pend["device_id"].unique().tolist(), a, b)
+
+@perf.timed("app.locate_pending_incidents")
+@CACHE.cached(scope=escopo_pendentes, key=lambda pend: tuple(pend["id"]))
+def locate_pending_incidents(pend):
+    """Fallback p/ incidentes ainda sem posição gravada: id -> latitude/longitude."""
+    pts = queries.load_points_near(pend, bind=ENGINE)
+    return locate_events(pend, pts)[["id", "latitude", "longitude"]]
+
+HEAT_PROBE_LEVEL = 16  # amostra grossa da grade (~14 km) p/ escolher a resolução do mapa de calor
+
+@perf.timed("app.load_fleet_heat")
+@CACHE.cached(scope=lambda d0, d1, detail: scope(None, d0, d1))
+def load_fleet_heat(day_ini, day_fim, detail):
+    """Pontos da frota por célula (cache diário da grade), no nível que cabe na área rodada."""
+    d0, d1 = day_ini.isoformat(), day_fim.isoformat()
+    probe = queries.load_grid_cells(d0, d1, HEAT_PROBE_LEVEL, ENGINE)
+    k = grid.pick_level(probe["cy"], probe["cx"], probe["n"], HEAT_PROBE_LEVEL, detail)
+    cells = probe if k == HEAT_PROBE_LEVEL else queries.load_grid_cells(d0, d1, k, ENGINE)
+    lat, lon = grid.centers(cells["cy"], cells["cx"], k)
+    return pd.DataFrame({"lat": lat, "lon": lon, "n": cells["n"]}), k
+
+@perf.timed("app.load_area_passages")
+@CACHE.cached(scope=lambda area, a, b: scope(None, *dias_sp(a, b)))
+def load_area_passages(area, dt_ini_utc, dt_fim_utc):
+    """Pontos da frota na área (índice espacial) e as passagens por device."""
+    pts = queries.load_points_in_area(list(area), to_epoch_ms(dt_ini_utc), to_epoch_ms(dt_fim_utc), ENGINE)
+    return pts, passages(pts)
+
+def parse_area(texto):
+    """'lat, lon' por linha -> tupla de vértices (2 = cantos do retângulo, 3+ = polígono)."""
+    area = []
+    for linha in texto.strip().splitlines():
+        if linha.strip():
+            lat, lon = (float(v) for v in linha.replace(";", ",").split(","))
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                raise ValueError(linha)
+            area.append((lat, lon))
+    if len(area) < 2:
+        raise ValueError("mínimo 2 pontos")
+    return tuple(area)
+
+@perf.timed("app.load_last_sync")
+@CACHE.cached()
+def load_last_sync():
+    """Horário do último ponto gravado pelo sync (etl.sync)."""
+    return queries.load_last_point_ms(ENGINE)
+
+@perf.timed("app.load_incident_ranking_df")
+@CACHE.cached(scope=lambda d0, d1: scope(None, d0, d1))
+def load_incident_ranking_df(day_ini, day_fim):
+    return queries.load_incident_ranking(day_ini.isoformat(), day_fim.isoformat(), 10, ENGINE)
+
+@perf.timed("app.load_points_ranking_df")
+@CACHE.cached()
+def load_points_ranking_df():
+    return queries.load_points_ranking(5, ENGINE)
 
-# ====== Sidebar (filtros + sincronização) ======
+def taxa_por_100km(num_inc, km):
+    if not km or km <= 0:
+        return None
+    return (num_inc / km) * 100.0
+
+# ====== Sidebar (filtros globais + sincronização) ======
+# Só o que vale para a página inteira fica aqui: mudar estes filtros reexecuta
+# tudo. Os controles de cada seção (escopo dos incidentes, viagem no mapa,
+# mapa de calor, busca por área) ficam dentro do fragmento da seção.
 with st.sidebar:
     st.header("Filtros")
 
@@ -152,283 +200,392 @@ with st.sidebar:
         st.error("Data inicial maior que final.")
         st.stop()
 
-    # escopo dos incidentes (precisa estar ANTES de usar)
-    scope_inc = st.radio(
-        "Escopo dos incidentes",
-        options=["Somente veículo selecionado", "Toda a frota no período"],
-        index=0,
-    )
-
-
-    
-
-    # Botão “Sincronizar Logs”
-    if st.button("🔄 Sincronizar Logs"):
-        from etl.pipeline import save_logrecords
-        from db.models import get_session, SyncState
-
-        api = get_api()
-        s = get_session()
+    # nível de detalhe do mapa/gráfico (pontos enviados ao navegador)
+    detalhe = st.select_slider("Detalhe do mapa/gráfico", options=["Baixo", "Médio", "Alto"], value="Médio")
+    detail_factor = {"Baixo": 0.5, "Médio": 1.0, "Alto": 2.0}[detalhe]
 
-        sync = s.query(SyncState).filter_by(entity="LogRecord").first()
-        from_version = sync.to_version if sync else None
+    # Ingestão roda fora do dashboard: `python -m etl.sync` (GetFeed contínuo)
+    last_ms = load_last_sync()
+    if last_ms:
+        last_sp = pd.to_datetime(last_ms, unit="ms", utc=True).tz_convert(TZ_SP)
+        st.caption(f"Último ponto sincronizado: {last_sp.strftime('%d/%m %H:%M:%S')} (SP)")
+    else:
+        st.caption("Sem pontos sincronizados. Rode `python -m etl.sync`.")
 
-        feed = fetch_feed(api, "LogRecord", from_version=from_version, results_limit=1000)
-        save_logrecords(feed.get("data", []))
+    # preenchido no fim do script (show_perf), com os tempos deste rerun
+    perf_box = st.expander("Performance", expanded=False)
 
-        # atualiza token
-        if sync:
-            sync.to_version = feed["toVersion"]
+def show_perf():
+    """Fecha a medição do rerun (grava a linha JSON) e mostra a tabela no painel."""
+    run = perf.end_run()
+    with perf_box:
+        if run is None:
+            st.caption("Desativado. Rode com FORTTIS_PERF=1 para medir.")
         else:
-            sync = SyncState(entity="LogRecord", to_version=feed["toVersion"])
-            s.add(sync)
-        s.commit()
-
-        st.cache_data.clear()  # invalida caches de consultas
-        st.success(f"{len(feed.get('data', []))} novos pontos sincronizados!")
-        st.rerun()
-
-# ====== Consulta ao SQLite com a janela selecionada ======
-# (fora do sidebar)
-only_this_device = device_label if scope_inc == "Somente veículo selecionado" else None
-
-dt_ini_sp = datetime.combine(data_ini, datetime.min.time()).replace(tzinfo=TZ_SP)
-dt_fim_sp = datetime.combine(data_fim, datetime.max.time()).replace(tzinfo=TZ_SP)
+            st.caption(f"Rerun: {run.total_ms:,.0f} ms — gravado em {perf.METRICS_FILE.name}".replace(",", "."))
+            st.dataframe(pd.DataFrame(run.rows()), hide_index=True, use_container_width=True)
+            st.caption("Reruns parciais (uma seção) são gravados como 'dashboard:<seção>'.")
+        c = CACHE.stats()
+        st.caption(f"Cache de consultas: {c['entries']} resultados, {c['bytes'] / 2**20:.1f} de "
+                   f"{c['max_bytes'] / 2**20:.0f} MB ({c['hits']} acertos, {c['misses']} leituras).")
+
+dt_ini_sp = TZ_SP.localize(datetime.combine(data_ini, datetime.min.time()))
+dt_fim_sp = TZ_SP.localize(datetime.combine(data_fim, datetime.max.time()))
 dt_ini_utc = dt_ini_sp.astimezone(timezone.utc)
 dt_fim_utc = dt_fim_sp.astimezone(timezone.utc)
 
-df = load_points_df(device_label, dt_ini_utc, dt_fim_utc)
-inc = load_incidents_df(dt_ini_utc, dt_fim_utc, only_this_device)
-
-
-km_df, km_total = load_km_period(dt_ini_utc, dt_fim_utc, only_this_device)
-km_sel = float(km_df["km_periodo"].iloc[0]) if (only_this_device and not km_df.empty) else None
-
-# cartões: adiciona mais um KPI
-col1, col2, col3, col4 = st.columns(4)
-# (col1..col4 já existem; vamos mostrar km no período ao lado)
-if only_this_device:
-    st.metric("Km no período (veículo)", f"{(km_sel or 0):,.1f}".replace(",", "."))
-else:
-    st.metric("Km no período (frota)", f"{km_total:,.1f}".replace(",", "."))
-
-# KPI de incidentes graves
-graves = int((inc["severity"].isin(["Critical","High"])).sum()) if not inc.empty else 0
-st.metric("Incidentes graves (High/Critical)", f"{graves}")
-
-
-def taxa_por_100km(num_inc, km):
-    if not km or km <= 0:
-        return None
-    return (num_inc / km) * 100.0
-
-if only_this_device:
-    taxa = taxa_por_100km(graves, km_sel)
-    if taxa is not None:
-        st.metric("Incidentes graves por 100 km (veículo)", f"{taxa:.2f}")
-else:
-    # frota: somatório graves / km_total
-    taxa = taxa_por_100km(graves, km_total)
-    if taxa is not None:
-        st.metric("Incidentes graves por 100 km (frota)", f"{taxa:.2f}")
-
-
-
-st.subheader("Ranking — Menor taxa de incidentes graves por 100 km (período)")
-# 1) incidentes graves por device no período
-inc_g = inc[inc["severity"].isin(["High","Critical"])].copy()
-if inc_g.empty or km_df.empty:
-    st.info("Sem dados suficientes para calcular taxas por 100 km (verifique incidentes e odômetro).")
-else:
-    by_dev = inc_g.groupby("device_id").size().reset_index(name="graves")
-    # 2) junta com km_df
-    m = by_dev.merge(km_df, on="device_id", how="left")
-    m["taxa_100km"] = m.apply(lambda r: taxa_por_100km(r["graves"], r["km_periodo"]), axis=1)
-    # remove NAs e negativos
-    m = m.dropna(subset=["taxa_100km"])
-    # junta nomes
-    names = pd.read_sql("SELECT id, name FROM devices", ENGINE)
-    m = m.merge(names, left_on="device_id", right_on="id", how="left")
-    m = m.sort_values(["taxa_100km","name"], ascending=[True, True])
-    if m.empty:
-        st.info("Sem taxas calculáveis (falta odômetro ou incidentes).")
-    else:
-        fig_tax = px.bar(m.head(10), x="name", y="taxa_100km",
-                         labels={"name":"Veículo", "taxa_100km":"Incidentes graves / 100 km"},
-                         title="Top 10 • Menor taxa (quanto menor, melhor)")
-        st.plotly_chart(fig_tax, use_container_width=True)
-
-
-
-# ====== KPIs ======
-st.subheader("Resumo")
-col1, col2, col3, col4 = st.columns(4)
-col1.metric("Pontos no período", f"{len(df):,}".replace(",", "."))
-if not df.empty:
-    first_utc = pd.to_datetime(df["date_time"].iloc[0]).tz_localize("UTC")
-    last_utc  = pd.to_datetime(df["date_time"].iloc[-1]).tz_localize("UTC")
-    col2.metric("Início (SP)", first_utc.tz_convert(TZ_SP).strftime("%d/%m %H:%M"))
-    col3.metric("Fim (SP)",    last_utc.tz_convert(TZ_SP).strftime("%d/%m %H:%M"))
-    dur = (last_utc - first_utc)
-    horas = int(dur.total_seconds() // 3600); mins = int((dur.total_seconds() % 3600) // 60)
-    col4.metric("Tempo de rota (aprox.)", f"{horas}h {mins}m")
-else:
-    col2.metric("Início (SP)", "-")
-    col3.metric("Fim (SP)", "-")
-    col4.metric("Tempo de rota (aprox.)", "-")
-    st.info("Sem pontos nesse período. Aumente a janela ou escolha outro veículo.")
-    st.stop()
-
-# ====== Prep dados (SP) ======
-df["dt_utc"] = pd.to_datetime(df["date_time"]).dt.tz_localize("UTC")
-df["dt_sp"] = df["dt_utc"].dt.tz_convert(TZ_SP)
-df["lat"] = df["latitude"].astype(float)
-df["lon"] = df["longitude"].astype(float)
-
-# ====== Mapa ======
-st.subheader("Mapa de Rotas")
-mid_lat, mid_lon = df["lat"].mean(), df["lon"].mean()
-layer_pts = pdk.Layer(
-    "ScatterplotLayer",
-    data=df[["lat", "lon"]],
-    get_position='[lon, lat]',
-    get_radius=8,
-    pickable=True,
-    auto_highlight=True,
-)
-layer_path = pdk.Layer(
-    "PathLayer",
-    data=[{"path": df[["lon", "lat"]].to_numpy().tolist()}],
-    get_path="path",
-    width_scale=2,
-    width_min_pixels=2,
-)
-view_state = pdk.ViewState(latitude=mid_lat, longitude=mid_lon, zoom=11)
-st.pydeck_chart(pdk.Deck(map_style=None, initial_view_state=view_state, layers=[layer_path, layer_pts]))
-
-# ====== Gráfico velocidade x tempo ======
-st.subheader("Velocidade x Tempo")
-fig = px.line(df, x="dt_sp", y="speed", labels={"dt_sp": "Hora (SP)", "speed": "Velocidade"})
-st.plotly_chart(fig, use_container_width=True)
-
-# ====== Incidentes: por regra ======
-st.subheader("Incidentes por Regra (período selecionado)")
-if inc.empty:
-    st.info("Sem incidentes no período/escopo selecionado.")
-else:
-    g_rule = inc.groupby("rule_name").size().reset_index(name="qtd").sort_values("qtd", ascending=False)
-    fig_rule = px.bar(g_rule, x="rule_name", y="qtd", title="Distribuição por Regra")
-    st.plotly_chart(fig_rule, use_container_width=True)
-
-# ====== Linha do tempo de graves ======
-st.subheader("Linha do tempo — Incidentes graves (High/Critical)")
-if inc.empty:
-    st.info("Sem incidentes graves no período.")
-else:
-    inc_graves = inc[inc["severity"].isin(["High","Critical"])].copy()
-    if inc_graves.empty:
-        st.info("Sem High/Critical no período.")
-    else:
-        inc_graves["dia"] = inc_graves["dt_sp"].dt.date
-        g_day = inc_graves.groupby("dia").size().reset_index(name="qtd")
-        fig_day = px.line(g_day, x="dia", y="qtd", markers=True, labels={"dia":"Dia (SP)", "qtd":"Qtd"})
-        st.plotly_chart(fig_day, use_container_width=True)
-
-# ====== Ranking — Menos incidentes graves (período) ======
-st.subheader("Ranking — Menos incidentes graves (período selecionado)")
-q_inc_rank = text("""
-    SELECT d.name,
-           SUM(CASE WHEN e.severity IN ('Critical','High') THEN 1 ELSE 0 END) AS graves
-    FROM exception_events e
-    JOIN devices d ON d.id = e.device_id
-    WHERE e.date_time BETWEEN :dt_from AND :dt_to
-      AND e.rule_name IN ('Harsh Braking','Harsh Acceleration','Harsh Cornering','Possible Collision')
-    GROUP BY d.id
-    ORDER BY graves ASC, d.name ASC
-    LIMIT 10
-""")
-df_inc_rank = pd.read_sql(q_inc_rank, ENGINE, params={"dt_from": dt_ini_utc.isoformat(), "dt_to": dt_fim_utc.isoformat()})
-if df_inc_rank.empty:
-    st.info("Sem incidentes graves agregados neste período.")
-else:
-    fig_inc_rank = px.bar(df_inc_rank, x="name", y="graves", title="Top 10 — Menos incidentes graves (quanto menor, melhor)")
-    st.plotly_chart(fig_inc_rank, use_container_width=True)
-
-# ====== Mapa — Incidentes (match temporal com pontos) ======
-st.subheader("Mapa — Incidentes no período")
-if inc.empty:
-    st.info("Sem incidentes para mapear.")
-else:
-    # pontos usados para georreferenciar incidentes:
-    if only_this_device:
-        pts = df.copy()
-    else:
-        # fallback: usa o mesmo veículo selecionado (para evitar carregar toda a frota aqui)
-        pts = df.copy()
-    if pts.empty:
-        st.info("Sem pontos suficientes para georreferenciar os incidentes.")
-    else:
-        pts["dt_utc"] = pd.to_datetime(pts["date_time"]).dt.tz_localize("UTC")
-        inc_map = []
-        for _, row in inc.iterrows():
-            dev = row["device_id"]
-            t = row["dt_utc"]
-            window = pts[(pts["device_id"]==dev) & (pts["dt_utc"].between(t - pd.Timedelta("5min"), t + pd.Timedelta("5min")))]
-            if not window.empty:
-                idx = (window["dt_utc"] - t).abs().idxmin()
-                inc_map.append({
-                    "lat": float(window.loc[idx,"latitude"]),
-                    "lon": float(window.loc[idx,"longitude"]),
-                    "sev": row["severity"],
-                    "rule": row["rule_name"],
-                    "ts": row["dt_sp"].strftime("%d/%m %H:%M"),
-                    "color": row["color"],
-                })
-        if not inc_map:
-            st.info("Não foi possível posicionar incidentes (sem pontos próximos no tempo).")
+# ====== Seções ======
+# Cada seção é um st.fragment que recebe só os filtros de que depende: um
+# controle dentro dela reexecuta apenas a seção. Seções caras abaixo da dobra
+# (rankings, mapa de incidentes) só carregam com o expander aberto; os CSVs
+# são gerados no clique.
+
+@st.fragment
+def secao_rota(device_label, data_ini, data_fim, dt_ini_utc, dt_fim_utc, detail_factor):
+    """Resumo, viagens, mapa de rotas e velocidade do veículo."""
+    with perf.ensure_run("dashboard:rota"):
+        df = load_points_df(device_label, dt_ini_utc, dt_fim_utc)
+        trips = load_trips_df(device_label, dt_ini_utc, dt_fim_utc)
+
+        # ====== KPIs ======
+        st.subheader("Resumo")
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Pontos no período", f"{len(df):,}".replace(",", "."))
+        if df.empty:
+            col2.metric("Início (SP)", "-")
+            col3.metric("Fim (SP)", "-")
+            col4.metric("Tempo em viagem", "-")
+            st.info("Sem pontos nesse período. Aumente a janela ou escolha outro veículo.")
+            return
+        col2.metric("Início (SP)", df["dt_utc"].iloc[0].tz_convert(TZ_SP).strftime("%d/%m %H:%M"))
+        col3.metric("Fim (SP)", df["dt_utc"].iloc[-1].tz_convert(TZ_SP).strftime("%d/%m %H:%M"))
+        # soma das viagens (sem as paradas), não último ponto - primeiro
+        col4.metric("Tempo em viagem", fmt_dur(trips["duration_ms"].sum()) if not trips.empty else "-")
+
+        # ====== Prep dados (SP) ======
+        df["dt_sp"] = df["dt_utc"].dt.tz_convert(TZ_SP)
+        df["lat"] = df["latitude"].astype(float)
+        df["lon"] = df["longitude"].astype(float)
+
+        # ====== Viagens (tabela trips) ======
+        st.subheader("Viagens no período")
+        df_rota = df
+        window_days = (dt_fim_utc - dt_ini_utc).total_seconds() / 86400
+        if trips.empty:
+            st.info("Nenhuma viagem segmentada no período (rode a migração 010 ou aguarde o sync).")
         else:
-            layer_inc = pdk.Layer(
+            st.dataframe(
+                pd.DataFrame({
+                    "Início (SP)": trips["inicio_sp"].dt.strftime("%d/%m %H:%M"),
+                    "Fim (SP)": trips["fim_sp"].dt.strftime("%d/%m %H:%M"),
+                    "Duração": trips["duration_ms"].map(fmt_dur),
+                    "Km": trips["km"].round(1),
+                    "Vel. média (km/h)": trips["avg_kmh"],
+                    "Vel. máx (km/h)": trips["max_kmh"],
+                    "Parada antes": trips["stop_before_ms"].map(fmt_dur),
+                }),
+                hide_index=True, use_container_width=True,
+            )
+            st.caption(f"{len(trips)} viagens, {trips['km'].sum():.1f} km.")
+            viagem = st.selectbox(
+                "Mostrar no mapa",
+                options=[None] + list(trips.index),
+                format_func=lambda i: "Período inteiro" if i is None else (
+                    f"{trips.at[i, 'inicio_sp']:%d/%m %H:%M} → {trips.at[i, 'fim_sp']:%H:%M} "
+                    f"({trips.at[i, 'km']:.1f} km)"),
+            )
+            if viagem is not None:
+                t = trips.loc[viagem]
+                df_rota = df[df["ts_ms"].between(t["start_ms"], t["end_ms"])]
+                window_days = (t["end_ms"] - t["start_ms"]) / 86_400_000
+
+        # ====== Mapa ======
+        # Só uma versão simplificada vai para o navegador; df (bruto) segue para exportação.
+        st.subheader("Mapa de Rotas")
+        geo = df_rota.dropna(subset=["lat", "lon"])
+        with perf.timer("prep:simplify_path"):
+            keep = simplify_path(geo["lon"].to_numpy(), geo["lat"].to_numpy(), path_budget(window_days, detail_factor))
+        df_map = geo.iloc[keep]
+        with perf.timer("chart:mapa_rota"):
+            mid_lat, mid_lon = df_map["lat"].mean(), df_map["lon"].mean()
+            layer_pts = pdk.Layer(
                 "ScatterplotLayer",
-                data=inc_map,
+                data=df_map[["lat", "lon"]],
                 get_position='[lon, lat]',
-                get_radius=60,
-                get_fill_color="color",
+                get_radius=8,
                 pickable=True,
+                auto_highlight=True,
             )
-            tooltip = {"html": "<b>{rule}</b><br/>{sev}<br/>{ts}", "style": {"backgroundColor": "steelblue", "color": "white"}}
-            st.pydeck_chart(pdk.Deck(
-                map_style=None,
-                initial_view_state=pdk.ViewState(latitude=df["lat"].mean(), longitude=df["lon"].mean(), zoom=11),
-                layers=[layer_inc],
-                tooltip=tooltip
-            ))
-
-# ====== Export CSV de Incidentes ======
-if not inc.empty:
-    st.download_button(
-        label="⚠️ Exportar CSV de Incidentes",
-        data=inc.drop(columns=["dt_utc","color"]).to_csv(index=False).encode("utf-8"),
-        file_name=f"incidentes_{'dev_'+device_label if only_this_device else 'frota'}_{data_ini}_{data_fim}.csv",
-        mime="text/csv"
+            layer_path = pdk.Layer(
+                "PathLayer",
+                data=[{"path": df_map[["lon", "lat"]].to_numpy().tolist()}],
+                get_path="path",
+                width_scale=2,
+                width_min_pixels=2,
+            )
+            view_state = pdk.ViewState(latitude=mid_lat, longitude=mid_lon, zoom=11)
+            deck = pdk.Deck(map_style=None, initial_view_state=view_state, layers=[layer_path, layer_pts])
+        with perf.timer("pydeck:mapa_rota"):  # serialização JSON + envio
+            st.pydeck_chart(deck)
+        if len(df_map) < len(df_rota):
+            st.caption(f"Rota simplificada: {len(df_map):,} de {len(df_rota):,} pontos.".replace(",", "."))
+
+        # ====== Gráfico velocidade x tempo ======
+        st.subheader("Velocidade x Tempo")
+        with perf.timer("chart:velocidade"):
+            df_speed = df_rota.iloc[lttb(df_rota["ts_ms"].to_numpy(), df_rota["speed"].to_numpy(),
+                                         chart_budget(detail_factor))]
+            fig = px.line(df_speed, x="dt_sp", y="speed", labels={"dt_sp": "Hora (SP)", "speed": "Velocidade"})
+            st.plotly_chart(fig, use_container_width=True)
+
+        # ====== Export CSV de pontos (gerado no clique) ======
+        st.download_button(
+            label="📥 Exportar CSV (pontos)",
+            data=lambda: df.to_csv(index=False).encode("utf-8"),
+            file_name=f"{device_label}_{data_ini}_{data_fim}.csv",
+            mime="text/csv",
+            on_click="ignore",
+        )
+
+def mapa_incidentes(inc):
+    if inc.empty:
+        st.info("Sem incidentes para mapear.")
+        return
+    # posição resolvida na ingestão; só os pendentes são casados aqui (merge_asof por device,
+    # com pontos apenas dos devices/janelas que têm incidente — vale também p/ a frota toda)
+    located = inc.set_index("id")
+    pend = inc[inc["latitude"].isna()]
+    if not pend.empty:
+        found = locate_pending_incidents(pend[["id", "device_id", "ts_ms"]])
+        located.update(found.set_index("id"))
+    located = located.reset_index().dropna(subset=["latitude", "longitude"])
+    if located.empty:
+        st.info("Não foi possível posicionar incidentes (sem pontos próximos no tempo).")
+        return
+    inc_map = pd.DataFrame({
+        "lat": located["latitude"].astype(float),
+        "lon": located["longitude"].astype(float),
+        "sev": located["severity"],
+        "rule": located["rule_name"],
+        "ts": located["dt_sp"].dt.strftime("%d/%m %H:%M"),
+        "color": located["color"],
+    })
+    layer_inc = pdk.Layer(
+        "ScatterplotLayer",
+        data=inc_map,
+        get_position='[lon, lat]',
+        get_radius=60,
+        get_fill_color="color",
+        pickable=True,
     )
+    tooltip = {"html": "<b>{rule}</b><br/>{sev}<br/>{ts}", "style": {"backgroundColor": "steelblue", "color": "white"}}
+    st.pydeck_chart(pdk.Deck(
+        map_style=None,
+        initial_view_state=pdk.ViewState(latitude=inc_map["lat"].mean(), longitude=inc_map["lon"].mean(), zoom=11),
+        layers=[layer_inc],
+        tooltip=tooltip
+    ))
+    if len(inc_map) < len(inc):
+        st.caption(f"{len(inc) - len(inc_map)} incidente(s) sem ponto GPS em ±5 min.")
+
+@st.fragment
+def secao_incidentes(device_label, data_ini, data_fim, dt_ini_utc, dt_fim_utc):
+    """KPIs de km/incidentes graves e gráficos de incidentes, no escopo escolhido aqui."""
+    with perf.ensure_run("dashboard:incidentes"):
+        st.subheader("Indicadores e incidentes")
+        scope_inc = st.radio(
+            "Escopo dos incidentes",
+            options=["Somente veículo selecionado", "Toda a frota no período"],
+            index=0,
+            horizontal=True,
+        )
+        only_this_device = device_label if scope_inc == "Somente veículo selecionado" else None
+
+        inc = load_incidents_df(dt_ini_utc, dt_fim_utc, only_this_device)
+        km_df, km_total = load_km_period(data_ini, data_fim, only_this_device)
+        km = (float(km_df["km_periodo"].iloc[0]) if not km_df.empty else 0.0) if only_this_device else km_total
+        sev_df = load_severe_df(data_ini, data_fim, only_this_device)
+        graves = int(sev_df["graves"].sum()) if not sev_df.empty else 0
+        quem = "veículo" if only_this_device else "frota"
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric(f"Km no período ({quem})", f"{km:,.1f}".replace(",", "."))
+        col2.metric("Incidentes graves (High/Critical)", f"{graves}")
+        taxa = taxa_por_100km(graves, km)
+        if taxa is not None:
+            col3.metric(f"Incidentes graves por 100 km ({quem})", f"{taxa:.2f}")
+
+        # ====== Incidentes: por regra ======
+        st.markdown("**Incidentes por Regra (período selecionado)**")
+        with perf.timer("chart:incidentes_regra"):
+            if inc.empty:
+                st.info("Sem incidentes no período/escopo selecionado.")
+            else:
+                g_rule = inc.groupby("rule_name").size().reset_index(name="qtd").sort_values("qtd", ascending=False)
+                fig_rule = px.bar(g_rule, x="rule_name", y="qtd", title="Distribuição por Regra")
+                st.plotly_chart(fig_rule, use_container_width=True)
+
+        # ====== Linha do tempo de graves ======
+        st.markdown("**Linha do tempo — Incidentes graves (High/Critical)**")
+        with perf.timer("chart:graves_por_dia"):
+            inc_graves = inc[inc["severity"].isin(["High", "Critical"])].copy() if not inc.empty else inc
+            if inc_graves.empty:
+                st.info("Sem High/Critical no período.")
+            else:
+                inc_graves["dia"] = inc_graves["dt_sp"].dt.date
+                g_day = inc_graves.groupby("dia").size().reset_index(name="qtd")
+                fig_day = px.line(g_day, x="dia", y="qtd", markers=True, labels={"dia": "Dia (SP)", "qtd": "Qtd"})
+                st.plotly_chart(fig_day, use_container_width=True)
+
+        # ====== Mapa — Incidentes (só com o expander aberto) ======
+        mapa = st.expander("Mapa — Incidentes no período", key="exp_mapa_incidentes", on_change="rerun")
+        if mapa.open:
+            with mapa, perf.timer("chart:mapa_incidentes"):
+                mapa_incidentes(inc)
+
+        # ====== Export CSV de Incidentes (gerado no clique) ======
+        if not inc.empty:
+            st.download_button(
+                label="⚠️ Exportar CSV de Incidentes",
+                data=lambda: inc.drop(columns=["dt_utc", "color"]).to_csv(index=False).encode("utf-8"),
+                file_name=f"incidentes_{'dev_'+device_label if only_this_device else 'frota'}_{data_ini}_{data_fim}.csv",
+                mime="text/csv",
+                on_click="ignore",
+            )
 
-# ====== Export CSV de pontos ======
-st.download_button(
-    label="📥 Exportar CSV (pontos)",
-    data=df.to_csv(index=False).encode("utf-8"),
-    file_name=f"{device_label}_{data_ini}_{data_fim}.csv",
-    mime="text/csv"
-)
-
-# ====== Ranking simples por pontos (todo o banco) ======
-st.subheader("Ranking de Veículos (mais pontos)")
-df_rank = pd.read_sql("""
-    SELECT d.name, COUNT(l.id) as pontos
-    FROM log_records l
-    JOIN devices d ON d.id = l.device_id
-    GROUP BY d.id
-    ORDER BY pontos DESC
-    LIMIT 5
-""", ENGINE)
-fig_rank = px.bar(df_rank, x="name", y="pontos", title="Top 5 veículos por pontos coletados")
-st.plotly_chart(fig_rank, use_container_width=True)
+@st.fragment
+def secao_mapa_frota(data_ini, data_fim, detail_factor):
+    """Mapa de calor da frota (células agregadas, não pontos), sob demanda."""
+    with perf.ensure_run("dashboard:mapa_frota"):
+        if not st.toggle("Mapa de calor da frota", value=False):
+            return
+        st.subheader("Mapa de calor — Frota (período)")
+        with perf.timer("chart:mapa_calor_frota"):
+            heat, heat_k = load_fleet_heat(data_ini, data_fim, detail_factor)
+            if heat.empty:
+                st.info("Sem pontos da frota no período.")
+                return
+            layer_heat = pdk.Layer(
+                "HeatmapLayer",
+                data=heat,
+                get_position='[lon, lat]',
+                get_weight="n",
+                radius_pixels=25,
+            )
+            view_heat = pdk.data_utils.compute_view(heat[["lon", "lat"]], view_proportion=0.95)
+            st.pydeck_chart(pdk.Deck(map_style=None, initial_view_state=view_heat, layers=[layer_heat]))
+            n_cells = f"{len(heat):,}".replace(",", ".")
+            n_pts = f"{int(heat['n'].sum()):,}".replace(",", ".")
+            st.caption(f"{n_cells} células de ~{heat_k * grid.CELL_DEG * 111:.1f} km; {n_pts} pontos.")
+
+@st.fragment
+def secao_area(dt_ini_utc, dt_fim_utc):
+    """Busca por área (índice espacial): quais veículos passaram ali no período, e quando."""
+    with perf.ensure_run("dashboard:area"):
+        with st.expander("Busca por área", expanded=False):
+            area_txt = st.text_area(
+                "Vértices (lat, lon por linha)",
+                placeholder="-23.55, -46.64\n-23.53, -46.62",
+                help="2 pontos = retângulo pelos cantos; 3 ou mais = polígono.",
+            )
+        if not area_txt.strip():
+            return
+        try:
+            area = parse_area(area_txt)
+        except ValueError:
+            st.error("Use 'lat, lon' por linha, com pelo menos 2 pontos.")
+            return
+        st.subheader("Passagens pela área (período)")
+        with perf.timer("chart:busca_area"):
+            area_pts, area_pass = load_area_passages(area, dt_ini_utc, dt_fim_utc)
+            if area_pass.empty:
+                st.info("Nenhum veículo passou pela área no período.")
+                return
+            names = load_devices_df().set_index("id")["name"]
+            tab = area_pass.assign(
+                veiculo=area_pass["device_id"].map(names).fillna(area_pass["device_id"]),
+                entrada=pd.to_datetime(area_pass["entry_ms"], unit="ms", utc=True).dt.tz_convert(TZ_SP),
+                saida=pd.to_datetime(area_pass["exit_ms"], unit="ms", utc=True).dt.tz_convert(TZ_SP),
+            )
+            st.dataframe(
+                tab[["veiculo", "entrada", "saida", "points"]].rename(columns={
+                    "veiculo": "Veículo", "entrada": "Entrada (SP)", "saida": "Saída (SP)", "points": "Pontos"}),
+                hide_index=True, use_container_width=True,
+            )
+            contorno = [[lon, lat] for lat, lon in area] if len(area) > 2 else [
+                [area[0][1], area[0][0]], [area[1][1], area[0][0]],
+                [area[1][1], area[1][0]], [area[0][1], area[1][0]]]
+            layer_area = pdk.Layer(
+                "PolygonLayer",
+                data=[{"contorno": contorno}],
+                get_polygon="contorno",
+                get_fill_color=[0, 120, 255, 30],
+                get_line_color=[0, 120, 255],
+                line_width_min_pixels=2,
+            )
+            amostra = area_pts.iloc[::max(1, len(area_pts) // 5000)]  # o mapa é só referência
+            layer_area_pts = pdk.Layer(
+                "ScatterplotLayer",
+                data=amostra[["longitude", "latitude"]],
+                get_position='[longitude, latitude]',
+                get_radius=15,
+                radius_min_pixels=2,
+                get_fill_color=[255, 80, 0],
+            )
+            view_area = pdk.data_utils.compute_view([p for p in contorno], view_proportion=1.0)
+            st.pydeck_chart(pdk.Deck(map_style=None, initial_view_state=view_area,
+                                     layers=[layer_area, layer_area_pts]))
+            st.caption(f"{area_pass['device_id'].nunique()} veículos, {len(area_pass)} passagens, "
+                       f"{len(area_pts)} pontos na área.")
+
+@st.fragment
+def secao_rankings(data_ini, data_fim):
+    """Rankings da frota no período; só consultados com o expander aberto."""
+    rankings = st.expander("Rankings da frota (período)", key="exp_rankings", on_change="rerun")
+    if not rankings.open:
+        return
+    with rankings, perf.ensure_run("dashboard:rankings"):
+        st.markdown("**Ranking — Menor taxa de incidentes graves por 100 km**")
+        with perf.timer("chart:taxa_100km"):
+            sev_df = load_severe_df(data_ini, data_fim, None)
+            km_df, _ = load_km_period(data_ini, data_fim, None)
+            if sev_df.empty or km_df.empty:
+                st.info("Sem dados suficientes para calcular taxas por 100 km (verifique incidentes e odômetro).")
+            else:
+                m = sev_df.merge(km_df, on="device_id", how="left")
+                m["taxa_100km"] = m.apply(lambda r: taxa_por_100km(r["graves"], r["km_periodo"]), axis=1)
+                # remove NAs e negativos
+                m = m.dropna(subset=["taxa_100km"])
+                m = m.merge(load_devices_df(), left_on="device_id", right_on="id", how="left")
+                m = m.sort_values(["taxa_100km", "name"], ascending=[True, True])
+                if m.empty:
+                    st.info("Sem taxas calculáveis (falta odômetro ou incidentes).")
+                else:
+                    fig_tax = px.bar(m.head(10), x="name", y="taxa_100km",
+                                     labels={"name": "Veículo", "taxa_100km": "Incidentes graves / 100 km"},
+                                     title="Top 10 • Menor taxa (quanto menor, melhor)")
+                    st.plotly_chart(fig_tax, use_container_width=True)
+
+        st.markdown("**Ranking — Menos incidentes graves**")
+        with perf.timer("chart:ranking_graves"):
+            df_inc_rank = load_incident_ranking_df(data_ini, data_fim)
+            if df_inc_rank.empty:
+                st.info("Sem incidentes graves agregados neste período.")
+            else:
+                fig_inc_rank = px.bar(df_inc_rank, x="name", y="graves", title="Top 10 — Menos incidentes graves (quanto menor, melhor)")
+                st.plotly_chart(fig_inc_rank, use_container_width=True)
+
+        st.markdown("**Ranking de Veículos (mais pontos, todo o banco)**")
+        with perf.timer("chart:ranking_pontos"):
+            df_rank = load_points_ranking_df()
+            fig_rank = px.bar(df_rank, x="name", y="pontos", title="Top 5 veículos por pontos coletados")
+            st.plotly_chart(fig_rank, use_container_width=True)
+
+secao_rota(device_label, data_ini, data_fim, dt_ini_utc, dt_fim_utc, detail_factor)
+secao_incidentes(device_label, data_ini, data_fim, dt_ini_utc, dt_fim_utc)
+secao_mapa_frota(data_ini, data_fim, detail_factor)
+secao_area(dt_ini_utc, dt_fim_utc)
+secao_rankings(data_ini, data_fim)
+
+# ====== Performance (este rerun) ======
+show_perf()
@@ -0,0 +1,319 @@
+"""
+API Geotab falsa, em processo, sobre a frota sintética (bench.synth).
+
+Substitui `mygeotab.API` onde o código recebe `api` (etl.sync.run, savers,
+etl.devices): get, call("Get"/"GetFeed"/"GetCountOf"), multi_call
+(ExecuteMultiCall) e authenticate, com as exceções do próprio mygeotab.
+
+    from bench.fake_geotab import FakeGeotabAPI
+    from bench.synth import FleetSpec
+    api = FakeGeotabAPI(FleetSpec(devices=20, days=3), latency=0.15, failure_rate=0.02,
+                        rate_limit=(60, 60))
+    etl.sync.run(api=api, once=True)
+    print(api.stats())
+
+Semântica do GetFeed: versões são posições no feed (hex de 16 dígitos, como
+na Geotab); toVersion = fromVersion + itens devolvidos; resultsLimit é
+limitado a MAX_RESULTS. Repetir o mesmo fromVersion devolve a mesma página.
+O feed é gerado sob demanda (cursor), então escalas grandes não ficam na memória.
+
+Injeção de problemas:
+  - latency / jitter / latency_per_item: atraso por chamada (segundos);
+  - rate_limit=(chamadas, janela_s): OverLimitException acima do limite;
+  - failure_rate: fração de chamadas que falham (timeout ou DbUnavailable);
+  - fail_next(n): as próximas n chamadas falham;
+  - session_ttl / expire_sessions(): InvalidUserException; como no mygeotab,
+    só re-autentica sozinho se as credenciais ainda tiverem a senha.
+"""
+import random
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from itertools import islice
+
+from mygeotab import Credentials
+from mygeotab.api import camelcaseify_parameters, convert_get_parameters
+from mygeotab.exceptions import AuthenticationException, MyGeotabException, TimeoutException
+
+from bench.synth import ODOMETER_DIAGNOSTIC_ID, FleetSpec, devices, diagnostics, generate, rules
+
+MAX_RESULTS = 50_000
+SERVER = "fake.geotab.local"
+INDEX_MAX_ITEMS = 2_000_000   # até aqui, Get por device usa um índice em memória
+
+_FEEDS = {  # typeName -> atributo de DeviceDay
+    "LogRecord": "logrecords",
+    "StatusData": "status_data",
+    "ExceptionEvent": "exception_events",
+}
+
+
+def _error(name: str, message: str) -> MyGeotabException:
+    return MyGeotabException({"errors": [{"name": name, "message": message}]})
+
+
+def _version(v: int) -> str:
+    return f"{v:016x}"
+
+
+def _parse_version(v) -> int:
+    return int(v, 16) if v else 0
+
+
+def _as_dt(v):
+    if v is None or isinstance(v, datetime):
+        return v
+    return datetime.fromisoformat(str(v).replace("Z", "+00:00"))
+
+
+def _matches(item: dict, search: dict | None) -> bool:
+    """Subconjunto dos filtros da Geotab: id, deviceSearch, diagnosticSearch, fromDate/toDate."""
+    if not search:
+        return True
+    if "id" in search and item.get("id") != search["id"]:
+        return False
+    dev = (search.get("deviceSearch") or {}).get("id")
+    if dev and (item.get("device") or {}).get("id") != dev:
+        return False
+    diag = (search.get("diagnosticSearch") or {}).get("id")
+    if diag and (item.get("diagnostic") or {}).get("id") != diag:
+        return False
+    when = item.get("dateTime") or item.get("activeFrom")
+    frm, to = _as_dt(search.get("fromDate")), _as_dt(search.get("toDate"))
+    if when is not None and ((frm and when < frm) or (to and when > to)):
+        return False
+    return True
+
+
+class _Feed:
+    """Cursor sobre o feed de um tipo (+ filtro). Reinicia a geração se voltar atrás."""
+
+    def __init__(self, spec: FleetSpec, attr: str, search: dict | None):
+        self.spec, self.attr, self.search = spec, attr, search
+        self._reset()
+
+    def _items(self):
+        for dd in generate(self.spec):
+            for it in getattr(dd, self.attr):
+                if _matches(it, self.search):
+                    yield it
+
+    def _reset(self):
+        self.it = self._items()
+        self.pos = 0           # versão do primeiro item em buf
+        self.buf = deque()
+
+    def page(self, start: int, n: int) -> list[dict]:
+        if start < self.pos:
+            self._reset()
+        while self.pos < start:
+            if not self.buf and not self._fill(start - self.pos):
+                break
+            drop = min(len(self.buf), start - self.pos)
+            for _ in range(drop):
+                self.buf.popleft()
+            self.pos += drop
+        if self.pos < start:
+            return []
+        self._fill(n - len(self.buf))
+        return list(islice(self.buf, n))
+
+    def _fill(self, k: int) -> int:
+        got = 0
+        for it in islice(self.it, max(k, 0)):
+            self.buf.append(it)
+            got += 1
+        return got
+
+
+class FakeGeotabAPI:
+    def __init__(self, spec: FleetSpec | None = None, username: str = "bench@forttis.local",
+                 password: str | None = "bench", database: str = "bench", session_id: str | None = None,
+                 latency: float = 0.0, jitter: float = 0.0, latency_per_item: float = 0.0,
+                 rate_limit: tuple[int, float] | None = None, failure_rate: float = 0.0,
+                 session_ttl: float | None = None, seed: int = 0):
+        self.spec = spec or FleetSpec()
+        self.credentials = Credentials(username, session_id, database, SERVER, password)
+        self.latency, self.jitter, self.latency_per_item = latency, jitter, latency_per_item
+        self.rate_limit = rate_limit
+        self.failure_rate = failure_rate
+        self.session_ttl = session_ttl
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._devices = devices(self.spec)
+        self._rules = rules()
+        self._diagnostics = diagnostics()
+        self._feeds: dict[tuple, _Feed] = {}
+        self._index: dict[str, dict[str, list[dict]]] = {}
+        self._calls_at: deque = deque()
+        self._sessions: dict[str, float] = {session_id: time.monotonic()} if session_id else {}
+        self._fail_next = 0
+        self._password = password
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.items_served = 0
+        self.authentications = 0
+
+    # ===== controle (testes/benchmark) =====
+    def fail_next(self, n: int = 1) -> None:
+        self._fail_next += n
+
+    def expire_sessions(self) -> None:
+        self._sessions.clear()
+
+    def stats(self) -> dict:
+        return {"calls": dict(self.calls), "errors": dict(self.errors),
+                "items_served": self.items_served, "authentications": self.authentications}
+
+    # ===== interface do mygeotab.API =====
+    def authenticate(self, is_global: bool = True) -> Credentials:
+        self._sleep(0)
+        self.calls["Authenticate"] += 1
+        if self.credentials.password != self._password:
+            raise AuthenticationException(self.credentials.username, self.credentials.database, SERVER)
+        self.authentications += 1
+        sid = f"fake-{self.authentications:06d}"
+        self._sessions[sid] = time.monotonic()
+        # como o mygeotab: as credenciais novas (com sessão) não guardam a senha
+        self.credentials = Credentials(self.credentials.username, sid, self.credentials.database, SERVER)
+        return self.credentials
+
+    def get(self, type_name, **parameters):
+        return self.call("Get", type_name=type_name, **convert_get_parameters(parameters))
+
+    def multi_call(self, calls):
+        formatted = [dict(method=c[0], params=c[1] if len(c) > 1 else {}) for c in calls]
+        return self.call("ExecuteMultiCall", calls=formatted)
+
+    def call(self, method, **parameters):
+        if method is None:
+            raise Exception("A method name must be specified")
+        params = camelcaseify_parameters(parameters)
+        if not self.credentials.session_id:
+            self.authenticate()
+        try:
+            return self._handle(method, params)
+        except MyGeotabException as e:
+            if e.name == "InvalidUserException" and self.credentials.password:
+                self.authenticate()
+                return self._handle(method, params)
+            if e.name == "InvalidUserException":
+                raise AuthenticationException(self.credentials.username, self.credentials.database,
+                                              SERVER) from e
+            raise
+
+    # ===== "servidor" =====
+    def _sleep(self, items: int) -> None:
+        delay = self.latency + self.latency_per_item * items
+        if self.jitter:
+            delay += self._rng.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _check(self) -> None:
+        now = time.monotonic()
+        started = self._sessions.get(self.credentials.session_id)
+        if started is None or (self.session_ttl is not None and now - started > self.session_ttl):
+            self._sessions.pop(self.credentials.session_id, None)
+            raise _error("InvalidUserException", "Incorrect login credentials")
+        if self.rate_limit:
+            limit, window = self.rate_limit
+            while self._calls_at and now - self._calls_at[0] > window:
+                self._calls_at.popleft()
+            if len(self._calls_at) >= limit:
+                raise _error("OverLimitException",
+                             f"API calls quota exceeded. Maximum admitted {limit} per {window:g}s.")
+            self._calls_at.append(now)
+        if self._fail_next or (self.failure_rate and self._rng.random() < self.failure_rate):
+            self._fail_next = max(0, self._fail_next - 1)
+            if self._rng.random() < 0.5:
+                raise TimeoutException(SERVER)
+            raise _error("DbUnavailableException", "Database temporarily unavailable")
+
+    def _handle(self, method: str, params: dict):
+        with self._lock:
+            self.calls[method] += 1
+            try:
+                self._check()
+                if method == "ExecuteMultiCall":
+                    result = [self._dispatch(c["method"], camelcaseify_parameters(c.get("params") or {}))
+                              for c in params.get("calls") or []]
+                    n = sum(len(r) if isinstance(r, list) else 1 for r in result)
+                else:
+                    result = self._dispatch(method, params)
+                    n = len(result["data"]) if method == "GetFeed" else (
+                        len(result) if isinstance(result, list) else 1)
+            except (MyGeotabException, TimeoutException) as e:
+                self.errors[getattr(e, "name", type(e).__name__)] += 1
+                raise
+            self.items_served += n
+        self._sleep(n)
+        return result
+
+    def _dispatch(self, method: str, params: dict):
+        if method == "GetFeed":
+            return self._get_feed(params)
+        if method == "Get":
+            limit = params.get("resultsLimit")
+            items = self._iter_all(params.get("typeName"), params.get("search"))
+            return list(islice(items, limit) if limit else items)
+        if method == "GetCountOf":
+            return sum(1 for _ in self._iter_all(params.get("typeName"), None))
+        raise _error("MissingMethodException", f"The method '{method}' could not be found.")
+
+    def _iter_all(self, type_name: str, search: dict | None):
+        if type_name == "Device":
+            return (d for d in self._devices if _matches(d, search))
+        if type_name == "Rule":
+            return (r for r in self._rules if _matches(r, search))
+        if type_name == "Diagnostic":
+            return (d for d in self._diagnostics if _matches(d, search))
+        if not self._has_status(type_name, search):
+            return iter(())
+        attr = _FEEDS.get(type_name)
+        if attr is None:
+            raise _error("ArgumentException", f"Unknown type '{type_name}'")
+        dev = ((search or {}).get("deviceSearch") or {}).get("id")
+        if dev and self.spec.logrecords <= INDEX_MAX_ITEMS:
+            return (it for it in self._by_device(attr).get(dev, []) if _matches(it, search))
+        return (it for dd in generate(self.spec) for it in getattr(dd, attr) if _matches(it, search))
+
+    @staticmethod
+    def _has_status(type_name: str, search: dict | None) -> bool:
+        """A frota sintética só tem StatusData de odômetro: outro diagnóstico volta vazio sem varrer nada."""
+        diag = ((search or {}).get("diagnosticSearch") or {}).get("id")
+        return type_name != "StatusData" or not diag or diag == ODOMETER_DIAGNOSTIC_ID
+
+    def _by_device(self, attr: str) -> dict[str, list[dict]]:
+        """device_id -> itens do tipo (gerado uma vez; Get por device sem varrer a frota toda)."""
+        idx = self._index.get(attr)
+        if idx is None:
+            idx = self._index[attr] = {}
+            for dd in generate(self.spec):
+                idx.setdefault(dd.device_id, []).extend(getattr(dd, attr))
+        return idx
+
+    def _get_feed(self, params: dict) -> dict:
+        type_name = params.get("typeName")
+        start = _parse_version(params.get("fromVersion"))
+        limit = min(int(params.get("resultsLimit") or MAX_RESULTS), MAX_RESULTS)
+        if type_name == "Device":
+            data = self._devices[start:start + limit]
+        elif type_name == "Rule":
+            data = self._rules[start:start + limit]
+        elif type_name == "Diagnostic":
+            data = self._diagnostics[start:start + limit]
+        elif not self._has_status(type_name, params.get("search")):
+            data = []
+        elif type_name in _FEEDS:
+            search = params.get("search")
+            key = (type_name, repr(sorted(search.items())) if search else None)
+            feed = self._feeds.get(key)
+            if feed is None:
+                feed = self._feeds[key] = _Feed(self.spec, _FEEDS[type_name], search)
+            data = feed.page(start, limit)
+        else:
+            raise _error("ArgumentException", f"Unknown type '{type_name}'")
+        return {"data": data, "toVersion": _version(start + len(data))}
@@ -0,0 +1,216 @@
+"""
+Benchmark de ingestão e consultas do dashboard sobre uma frota sintética.
+
+    python -m bench.harness                      # escala 10k
+    python -m bench.harness --scale 1m --scale 50m
+    python -m bench.harness --compare            # últimas 2 execuções de cada escala
+
+Para cada escala: cria um banco SQLite temporário (FORTTIS_DB), grava a frota
+de bench.synth pelos savers do ETL em páginas (como o sync), mede linhas/s e
+depois a latência dos loaders do dashboard (db.queries) numa janela de 7 dias.
+Cada execução vira uma linha JSON em bench/results.jsonl (commit, escala,
+ingestão, consultas), para comparar entre commits.
+
+Cada escala roda num processo próprio: db.models cria o engine no import.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from bench.synth import FleetSpec, devices, generate
+
+ROOT = Path(__file__).resolve().parents[1]
+RESULTS = ROOT / "bench" / "results.jsonl"
+
+SCALES = {
+    "10k": FleetSpec(devices=5, days=2, points_per_day=1000),
+    "1m": FleetSpec(devices=50, days=20, points_per_day=1000),
+    "50m": FleetSpec(devices=500, days=50, points_per_day=2000),
+}
+PAGE_SIZE = 5000     # itens por chamada dos savers (tamanho de página do GetFeed)
+WINDOW_DAYS = 7
+REPEAT = 5
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def _pages(spec: FleetSpec, kind: str):
+    buf = []
+    for dd in generate(spec):
+        buf.extend(getattr(dd, kind))
+        while len(buf) >= PAGE_SIZE:
+            yield buf[:PAGE_SIZE]
+            buf = buf[PAGE_SIZE:]
+    if buf:
+        yield buf
+
+
+def ingest(spec: FleetSpec) -> dict:
+    """Grava a frota pelos savers; só o tempo dentro dos savers conta."""
+    from etl import pipeline
+    from etl.devices import save_devices
+
+    save_devices(devices(spec))
+    savers = {
+        "log_records": ("logrecords", pipeline.save_logrecords),
+        "odometer_samples": ("status_data", pipeline.save_odometer_samples),
+        "exception_events": ("exception_events", pipeline.save_exception_events),
+    }
+    out = {}
+    for table, (kind, save) in savers.items():
+        rows, secs = 0, 0.0
+        for page in _pages(spec, kind):
+            t0 = time.perf_counter()
+            res = save(page)
+            secs += time.perf_counter() - t0
+            rows += res.total
+        out[table] = {"rows": rows, "seconds": round(secs, 3),
+                      "rows_per_sec": round(rows / secs, 1) if secs else None}
+        print(f"  {table}: {rows:,} linhas em {secs:.1f}s")
+    return out
+
+
+def _time(fn, repeat: int) -> dict:
+    ms, n = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        res = fn()
+        ms.append((time.perf_counter() - t0) * 1000)
+        df = res[0] if isinstance(res, tuple) else res
+        n = len(df) if hasattr(df, "__len__") else 1
+    ms.sort()
+    return {"median_ms": round(statistics.median(ms), 2), "p95_ms": round(ms[int(0.95 * (len(ms) - 1))], 2),
+            "min_ms": round(ms[0], 2), "rows": n}
+
+
+def measure_queries(spec: FleetSpec, repeat: int = REPEAT) -> dict:
+    """Latência dos loaders do dashboard na última janela de WINDOW_DAYS dias da frota."""
+    from db import queries
+    from db.models import engine, to_epoch_ms
+
+    last = spec.start + timedelta(days=spec.days - 1)
+    first = max(spec.start, last - timedelta(days=WINDOW_DAYS - 1))
+    ms_from = to_epoch_ms(datetime(first.year, first.month, first.day, 3, tzinfo=timezone.utc))
+    ms_to = to_epoch_ms(datetime(last.year, last.month, last.day, 3, tzinfo=timezone.utc) + timedelta(days=1)) - 1
+    d0, d1 = first.isoformat(), last.isoformat()
+    did = devices(spec)[0]["id"]
+    area = [(-23.80, -46.90), (-23.30, -46.40)]  # ~55 km em volta do centro da frota sintética
+
+    loaders = {
+        "load_points_df": lambda: queries.load_points(did, ms_from, ms_to, engine),
+        "load_km_period": lambda: queries.load_km_period(d0, d1, None, engine),
+        "load_incidents_df": lambda: queries.load_incidents(ms_from, ms_to, None, engine),
+        "load_severe_by_device": lambda: queries.load_severe_by_device(d0, d1, None, engine),
+        "load_incident_ranking": lambda: queries.load_incident_ranking(d0, d1, 10, engine),
+        "load_points_ranking": lambda: queries.load_points_ranking(5, engine),
+        "load_last_point_ms": lambda: queries.load_last_point_ms(engine),
+        "load_grid_cells": lambda: queries.load_grid_cells(d0, d1, 1, engine),
+        "load_points_in_area": lambda: queries.load_points_in_area(area, ms_from, ms_to, engine),
+    }
+    out = {}
+    for name, fn in loaders.items():
+        out[name] = _time(fn, repeat)
+        print(f"  {name}: {out[name]['median_ms']} ms (mediana, {out[name]['rows']} linhas)")
+    return out
+
+
+def workspace(scale: str) -> Path:
+    """Banco/arquivo temporários p/ este processo (precisa ser antes de importar db.models)."""
+    workdir = Path(tempfile.mkdtemp(prefix=f"forttis-bench-{scale}-"))
+    os.environ["FORTTIS_DB"] = str(workdir / "bench.db")
+    os.environ["FORTTIS_ARCHIVE"] = str(workdir / "archive")
+    from db.models import create_all
+    create_all()
+    return workdir
+
+
+def append_result(out: Path, result: dict) -> None:
+    with open(out, "a", encoding="utf-8") as f:
+        f.write(json.dumps(result) + "\n")
+
+
+def run_scale(scale: str, out: Path, repeat: int, keep: bool) -> dict:
+    """Roda uma escala neste processo."""
+    spec = SCALES[scale]
+    workdir = workspace(scale)
+    try:
+        print(f"[{scale}] {spec.logrecords:,} LogRecords, {spec.status_data:,} StatusData -> {workdir}")
+        result = {
+            "run_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _commit(),
+            "scale": scale,
+            "spec": {**asdict(spec), "start": spec.start.isoformat()},
+            "ingest": ingest(spec),
+            "queries": measure_queries(spec, repeat),
+            "db_bytes": (workdir / "bench.db").stat().st_size,
+        }
+    finally:
+        if not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    append_result(out, result)
+    return result
+
+
+def compare(path: Path) -> None:
+    """Compara as duas últimas execuções de cada escala (variação %)."""
+    runs: dict[str, list[dict]] = {}
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if line.strip():
+            r = json.loads(line)
+            if r.get("kind", "harness") == "harness":
+                runs.setdefault(r["scale"], []).append(r)
+    for scale, rs in runs.items():
+        if len(rs) < 2:
+            continue
+        a, b = rs[-2], rs[-1]
+        print(f"[{scale}] {a['commit']} -> {b['commit']}")
+        for table, m in b["ingest"].items():
+            old = a["ingest"].get(table, {}).get("rows_per_sec")
+            if old and m["rows_per_sec"]:
+                print(f"  ingest {table}: {old:,.0f} -> {m['rows_per_sec']:,.0f} linhas/s "
+                      f"({(m['rows_per_sec'] / old - 1) * 100:+.1f}%)")
+        for name, m in b["queries"].items():
+            old = a["queries"].get(name, {}).get("median_ms")
+            if old:
+                print(f"  {name}: {old} -> {m['median_ms']} ms ({(m['median_ms'] / old - 1) * 100:+.1f}%)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark de ingestão/consultas com frota sintética.")
+    ap.add_argument("--scale", action="append", choices=list(SCALES), help="repetível (padrão: 10k)")
+    ap.add_argument("--out", type=Path, default=RESULTS, help="arquivo JSON lines de resultados")
+    ap.add_argument("--repeat", type=int, default=REPEAT, help="execuções por consulta")
+    ap.add_argument("--keep", action="store_true", help="não apaga o banco temporário")
+    ap.add_argument("--compare", action="store_true", help="compara as duas últimas execuções")
+    args = ap.parse_args()
+
+    if args.compare:
+        compare(args.out)
+        return
+    scales = args.scale or ["10k"]
+    if len(scales) == 1:
+        run_scale(scales[0], args.out, args.repeat, args.keep)
+        return
+    for scale in scales:
+        cmd = [sys.executable, "-m", "bench.harness", "--scale", scale,
+               "--out", str(args.out), "--repeat", str(args.repeat)]
+        subprocess.run(cmd + (["--keep"] if args.keep else []), cwd=ROOT, check=True)
+
+
+if __name__ == "__main__":
+    main()
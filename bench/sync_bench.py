@@ -0,0 +1,105 @@
+"""
+Sync ponta a ponta (etl.sync) contra a API falsa (bench.fake_geotab).
+
+    python -m bench.sync_bench --scale 10k
+    python -m bench.sync_bench --scale 10k --latency 0.2 --failure-rate 0.05 --rate-limit 30/60
+
+Consome todos os feeds até a cabeça num banco temporário e grava uma linha
+(kind="sync") em bench/results.jsonl: linhas/s por feed, tamanho de página
+final, estágios do pipeline, chamadas/erros da API e tempo em backoff.
+"""
+import argparse
+import logging
+import shutil
+import time
+from dataclasses import asdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+from bench.fake_geotab import FakeGeotabAPI
+from bench.harness import RESULTS, SCALES, _commit, append_result, workspace
+
+
+def _rate(v: str) -> tuple[int, float]:
+    calls, window = v.split("/")
+    return int(calls), float(window)
+
+
+class _Retries(logging.Handler):
+    """Conta as falhas do catch_up pelos avisos do logger forttis.sync."""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.count, self.backoff = 0, 0.0
+
+    def emit(self, record):
+        if "nova tentativa" in record.msg:
+            self.count += 1
+            self.backoff += float(record.args[-1])
+
+
+def run(scale: str, api_kw: dict, out: Path, keep: bool) -> dict:
+    spec = SCALES[scale]
+    workdir = workspace(scale)
+    try:
+        from etl import sync
+
+        api = FakeGeotabAPI(spec, **api_kw)
+        feeds = {}
+        retries = _Retries()
+        sync.log.addHandler(retries)
+        try:
+            t_all = time.perf_counter()
+            for feed in sync.default_feeds():
+                t0 = time.perf_counter()
+                rows = sync.catch_up(api, feed)
+                secs = time.perf_counter() - t0
+                feeds[feed.entity] = {"rows": rows, "seconds": round(secs, 3),
+                                      "rows_per_sec": round(rows / secs, 1) if secs else None,
+                                      "page_size": feed.page_size, "stages": feed.last_stats}
+                print(f"  {feed.entity}: {rows:,} linhas em {secs:.1f}s (página final {feed.page_size})")
+            total = time.perf_counter() - t_all
+        finally:
+            sync.log.removeHandler(retries)
+
+        result = {
+            "kind": "sync",
+            "run_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _commit(),
+            "scale": scale,
+            "spec": {**asdict(spec), "start": spec.start.isoformat()},
+            "api": api_kw,
+            "feeds": feeds,
+            "seconds": round(total, 3),
+            "retries": retries.count,
+            "backoff_seconds": round(retries.backoff, 3),
+            "api_stats": api.stats(),
+        }
+    finally:
+        if not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    append_result(out, result)
+    print(f"  total {result['seconds']:.1f}s, {result['retries']} falhas, backoff {result['backoff_seconds']:.0f}s, "
+          f"API {result['api_stats']}")
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark do sync (GetFeed) com API Geotab falsa.")
+    ap.add_argument("--scale", choices=list(SCALES), default="10k")
+    ap.add_argument("--latency", type=float, default=0.0, help="atraso por chamada (s)")
+    ap.add_argument("--jitter", type=float, default=0.0, help="atraso extra aleatório (s)")
+    ap.add_argument("--latency-per-item", type=float, default=0.0, help="atraso por item devolvido (s)")
+    ap.add_argument("--failure-rate", type=float, default=0.0, help="fração de chamadas com falha")
+    ap.add_argument("--rate-limit", type=_rate, default=None, help="chamadas/janela_s, ex.: 30/60")
+    ap.add_argument("--out", type=Path, default=RESULTS)
+    ap.add_argument("--keep", action="store_true", help="não apaga o banco temporário")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(message)s")
+    api_kw = {"latency": args.latency, "jitter": args.jitter, "latency_per_item": args.latency_per_item,
+              "failure_rate": args.failure_rate, "rate_limit": args.rate_limit}
+    run(args.scale, api_kw, args.out, args.keep)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Frota sintética determinística no formato da API Geotab.
+
+Gera Device, LogRecord, StatusData (odômetro) e ExceptionEvent como os dicts
+que o mygeotab devolve, para N devices x M dias. Mesma FleetSpec (e seed)
+=> mesmos dados, em qualquer máquina.
+
+    from bench.synth import FleetSpec, devices, generate
+    spec = FleetSpec(devices=50, days=20, points_per_day=1000)
+    for dd in generate(spec):
+        save_logrecords(dd.logrecords)
+
+A geração é por device-dia (iterador), então 50M pontos não ficam na memória.
+Trajetos: passeio aleatório com velocidade/direção suaves entre 06h e 18h
+(SP); o odômetro (metros, como na Geotab) acumula a distância percorrida.
+"""
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+
+ODOMETER_DIAGNOSTIC_ID = "DiagnosticOdometerAdjustmentId"
+# catálogo de Diagnostic: os que o ETL ingere + volume de enchimento (os reais têm dezenas de milhares)
+_DIAGNOSTICS = [
+    (ODOMETER_DIAGNOSTIC_ID, "Odometer adjustment", "UnitOfMeasureMetersId"),
+    ("DiagnosticOdometerId", "Odometer", "UnitOfMeasureMetersId"),
+    ("DiagnosticEngineHoursAdjustmentId", "Engine hours adjustment", "UnitOfMeasureSecondsId"),
+    ("DiagnosticDeviceTotalFuelId", "Total fuel used (since telematics device install)", "UnitOfMeasureLitersId"),
+]
+CATALOG_FILLER = 2000
+
+# (id da regra na Geotab, nome usado pelo dashboard)
+RULES = [
+    ("RuleHarshBrakingId", "Harsh Braking"),
+    ("RuleJackrabbitStartsId", "Harsh Acceleration"),
+    ("RuleHarshCorneringId", "Harsh Cornering"),
+    ("RuleAccidentId", "Possible Collision"),
+    ("RulePostedSpeedingId", "Speeding"),
+]
+SEVERITIES = ["Low", "Medium", "High", "Critical"]
+_SEVERITY_P = [0.4, 0.3, 0.2, 0.1]
+
+_BASE_LAT, _BASE_LON = -23.55, -46.63   # São Paulo
+_DAY_START_UTC = timedelta(hours=9)     # 06h em SP
+_DRIVING = timedelta(hours=12)
+
+
+@dataclass
+class FleetSpec:
+    devices: int = 10
+    days: int = 7
+    start: date = date(2025, 1, 1)
+    points_per_day: int = 1000        # LogRecords por device por dia
+    odometer_every: int = 10          # 1 StatusData de odômetro a cada N LogRecords
+    incidents_per_day: float = 2.0    # média (Poisson) por device por dia
+    seed: int = 42
+
+    @property
+    def logrecords(self) -> int:
+        return self.devices * self.days * self.points_per_day
+
+    @property
+    def status_data(self) -> int:
+        per_day = -(-self.points_per_day // self.odometer_every)
+        return self.devices * self.days * per_day
+
+
+@dataclass
+class DeviceDay:
+    device_id: str
+    day: date
+    logrecords: list[dict] = field(default_factory=list)
+    status_data: list[dict] = field(default_factory=list)
+    exception_events: list[dict] = field(default_factory=list)
+
+
+def device_id(i: int) -> str:
+    return f"b{i + 1:X}"
+
+
+def devices(spec: FleetSpec) -> list[dict]:
+    return [
+        {"id": device_id(i), "name": f"Veículo {i + 1:03d}", "serialNumber": f"G9SYN{i + 1:07d}"}
+        for i in range(spec.devices)
+    ]
+
+
+def rules() -> list[dict]:
+    """Catálogo de Rule (Get/GetFeed "Rule" da API falsa)."""
+    return [{"id": rid, "name": name, "baseType": "Stock", "version": f"{i + 1:016x}"}
+            for i, (rid, name) in enumerate(RULES)]
+
+
+def diagnostics() -> list[dict]:
+    """Catálogo de Diagnostic (Get/GetFeed "Diagnostic" da API falsa)."""
+    items = [(i, n, u) for i, n, u in _DIAGNOSTICS] + [
+        (f"aDiag{k:05d}", f"Synthetic diagnostic {k:05d}", "UnitOfMeasureNoneId") for k in range(CATALOG_FILLER)]
+    return [{"id": did, "name": name, "code": k, "diagnosticType": "GoDiagnostic",
+             "unitOfMeasure": {"id": unit}, "version": f"{k + 1:016x}"}
+            for k, (did, name, unit) in enumerate(items)]
+
+
+def _ts(dt: datetime) -> datetime:
+    return dt.replace(microsecond=(dt.microsecond // 1000) * 1000)
+
+
+def _device_day(spec: FleetSpec, rng: np.random.Generator, i: int, day: date, state: dict) -> DeviceDay:
+    did = device_id(i)
+    dd = DeviceDay(did, day)
+    n = spec.points_per_day
+    t0 = datetime(day.year, day.month, day.day, tzinfo=timezone.utc) + _DAY_START_UTC
+    step_s = _DRIVING.total_seconds() / n
+    secs = np.arange(n) * step_s
+
+    # velocidade (km/h) e direção suaves; parado ~15% do tempo
+    speed = np.clip(50 + np.cumsum(rng.normal(0, 4, n)), 0, 110)
+    speed[rng.random(n) < 0.15] = 0.0
+    heading = state["heading"] + np.cumsum(rng.normal(0, 0.15, n))
+    km = speed * step_s / 3600
+    lat = state["lat"] + np.cumsum(km * np.cos(heading)) / 111.0
+    lon = state["lon"] + np.cumsum(km * np.sin(heading)) / (111.0 * np.cos(np.radians(_BASE_LAT)))
+    odo_m = state["odo_m"] + np.cumsum(km) * 1000
+    # longe de casa (>~100 km): o dia seguinte começa voltando
+    home_lat, home_lon = state["home"]
+    next_heading = float(heading[-1])
+    if np.hypot(lat[-1] - home_lat, lon[-1] - home_lon) > 1.0:
+        next_heading = float(np.arctan2(home_lon - lon[-1], home_lat - lat[-1]))
+    state.update(lat=float(lat[-1]), lon=float(lon[-1]), heading=next_heading, odo_m=float(odo_m[-1]))
+
+    times = [_ts(t0 + timedelta(seconds=float(s))) for s in secs]
+    dev = {"id": did}
+    for k in range(n):
+        dd.logrecords.append({
+            "id": f"l{did}{day:%Y%m%d}{k:06d}",
+            "device": dev,
+            "dateTime": times[k],
+            "latitude": round(float(lat[k]), 7),
+            "longitude": round(float(lon[k]), 7),
+            "speed": round(float(speed[k]), 1),
+        })
+    for k in range(0, n, spec.odometer_every):
+        dd.status_data.append({
+            "id": f"a{did}{day:%Y%m%d}{k:06d}",
+            "device": dev,
+            "diagnostic": {"id": ODOMETER_DIAGNOSTIC_ID},
+            "dateTime": times[k],
+            "data": round(float(odo_m[k]), 1),
+        })
+    for k in np.sort(rng.choice(n, size=min(int(rng.poisson(spec.incidents_per_day)), n), replace=False)):
+        rule_id, rule_name = RULES[int(rng.integers(len(RULES)))]
+        dd.exception_events.append({
+            "id": f"ae{did}{day:%Y%m%d}{int(k):06d}",
+            "device": dev,
+            "rule": {"id": rule_id, "name": rule_name},
+            "activeFrom": times[k],
+            "activeTo": times[k] + timedelta(seconds=2),
+            "duration": "00:00:02",
+            "severity": str(rng.choice(SEVERITIES, p=_SEVERITY_P)),
+        })
+    return dd
+
+
+def generate(spec: FleetSpec):
+    """Itera DeviceDay em ordem (dia, device)."""
+    rng = np.random.default_rng(spec.seed)
+    states = []
+    for _ in range(spec.devices):
+        home = (_BASE_LAT + rng.normal(0, 0.2), _BASE_LON + rng.normal(0, 0.2))
+        states.append({"home": home, "lat": home[0], "lon": home[1],
+                       "heading": rng.uniform(0, 2 * np.pi), "odo_m": rng.uniform(10_000, 500_000) * 1000})
+    for d in range(spec.days):
+        day = spec.start + timedelta(days=d)
+        for i in range(spec.devices):
+            yield _device_day(spec, rng, i, day, states[i])
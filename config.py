@@ -1,6 +1,15 @@
+import json
 import os
+import threading
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 import mygeotab
+from mygeotab.exceptions import AuthenticationException
+
+ROOT = Path(__file__).resolve().parent
+# sessão Geotab reaproveitada entre processos (dashboard, ETL, scripts); não versionar
+SESSION_FILE = Path(os.getenv("FORTTIS_SESSION_FILE") or ROOT / ".geotab_session.json")
+SESSION_TTL = timedelta(hours=float(os.getenv("FORTTIS_SESSION_TTL_H") or 24 * 7))
 
 # 1) tenta .env (se existir)
 def _load_from_env():
@@ -10,10 +19,10 @@ def _load_from_env():
         load_dotenv(dotenv_path=ENV_PATH, override=True, encoding="utf-8")
     except Exception:
         pass
-    user   = (os.getenv("tecnica1@forttis.com.br") or "").strip()
-    pwd    = (os.getenv("costa514300") or "").strip()
-    db     = (os.getenv("demo_demoforttis") or "").strip()
-    server = (os.getenv("my23.geotab.com") or "").strip()
+    user   = (os.getenv("MYGEOTAB_USERNAME") or "").strip()
+    pwd    = (os.getenv("MYGEOTAB_PASSWORD") or "").strip()
+    db     = (os.getenv("MYGEOTAB_DB") or "").strip()
+    server = (os.getenv("MYGEOTAB_SERVER") or "").strip()
     return user, pwd, db, server
 
 # 2) tenta config_local.py (que você acabou de criar)
@@ -61,7 +70,87 @@ def _load_creds():
     user, pwd, db, server = _load_interactive(user, pwd, db, server)
     return user, pwd, db, server
 
+# ===== sessão em cache =====
+def _load_session(user, db):
+    """Sessão gravada para este usuário/banco, se ainda não expirou."""
+    try:
+        data = json.loads(SESSION_FILE.read_text(encoding="utf-8"))
+        expires = datetime.fromisoformat(data["expires_at"])
+    except Exception:
+        return None
+    if data.get("username") != user or (db and data.get("database") != db):
+        return None
+    if expires <= datetime.now(timezone.utc) or not data.get("session_id"):
+        return None
+    return data
+
+def _save_session(creds):
+    data = {
+        "username": creds.username,
+        "database": creds.database,
+        "server": creds.server,
+        "session_id": creds.session_id,
+        "expires_at": (datetime.now(timezone.utc) + SESSION_TTL).isoformat(timespec="seconds"),
+    }
+    tmp = SESSION_FILE.with_suffix(".tmp")
+    try:
+        tmp.write_text(json.dumps(data), encoding="utf-8")
+        os.chmod(tmp, 0o600)
+        os.replace(tmp, SESSION_FILE)
+    except OSError:
+        pass  # sem cache (ex.: disco somente leitura): só perde o reaproveitamento entre processos
+
+def clear_session():
+    SESSION_FILE.unlink(missing_ok=True)
+
+class GeotabSession(mygeotab.API):
+    """
+    mygeotab.API que reaproveita a sessão em cache e sobrevive à expiração:
+    guarda a senha (o mygeotab a descarta após autenticar), re-autentica uma
+    vez quando a sessão é recusada (InvalidUserException) e grava a nova
+    sessão em SESSION_FILE. Compartilhável entre threads.
+    """
+    def __init__(self, username, password, database=None, server=None, session_id=None):
+        super().__init__(username, password=None if session_id else password, database=database,
+                         session_id=session_id, server=server or "my.geotab.com")
+        self._password = password
+        self._auth_lock = threading.Lock()
+
+    def authenticate(self):
+        with self._auth_lock:
+            self.credentials.password = self._password
+            creds = super().authenticate()
+            _save_session(creds)
+            return creds
+
+    def call(self, method, **parameters):
+        session_id = self.credentials.session_id
+        try:
+            return super().call(method, **parameters)
+        except AuthenticationException:
+            if not self._password or session_id is None:
+                raise  # falhou o próprio login: credenciais erradas
+            with self._auth_lock:
+                renewed = self.credentials.session_id != session_id  # outra thread já renovou
+            if not renewed:
+                self.authenticate()
+            return super().call(method, **parameters)
+
+_api = None
+_api_lock = threading.Lock()
+
 def get_api():
+    """
+    API Geotab do processo (uma por processo, compartilhada). Usa a sessão do
+    cache quando válida; só autentica se não houver uma ou se ela for recusada.
+    """
+    global _api
+    with _api_lock:
+        if _api is None:
+            _api = _connect()
+        return _api
+
+def _connect():
     user, pwd, db, server = _load_creds()
 
     # diagnóstico mínimo (sem senha)
@@ -69,6 +158,9 @@ def get_api():
 
     if not (user and pwd):
         raise ValueError("Credenciais ausentes. Defina no .env ou config_local.py, ou informe interativamente.")
-    api = mygeotab.API(username=user, password=pwd, database=db, server=server)
+    cached = _load_session(user, db)
+    if cached:
+        return GeotabSession(user, pwd, cached["database"], cached["server"], cached["session_id"])
+    api = GeotabSession(user, pwd, db, server)
     api.authenticate()
-    return api
\ No newline at end of file
+    return api
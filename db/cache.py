@@ -0,0 +1,186 @@
+"""
+Cache de consultas do dashboard, válido até os dados mudarem (db.versions).
+
+Cada resultado fica guardado com o escopo que ele lê: devices (None = frota
+toda) e faixa de dias locais (None = todos). Não expira por tempo: antes de
+cada consulta (no máximo uma vez a cada CHECK_S) o cache pergunta a
+data_versions o que mudou desde a última versão vista e descarta só as
+entradas cujo escopo cruza os (device, dia) que o ETL tocou.
+
+Memória limitada (FORTTIS_CACHE_MB): passando do limite, saem as entradas
+usadas há mais tempo (LRU). Um cache por processo, compartilhado entre as
+sessões (st.cache_resource no dashboard). DataFrames saem como cópia rasa:
+colunas que quem chamou acrescenta não voltam para o cache.
+"""
+import functools
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from db import versions
+import perf
+
+MAX_BYTES = int(float(os.getenv("FORTTIS_CACHE_MB", "256")) * 2**20)
+CHECK_S = 1.0  # intervalo mínimo entre consultas a data_versions
+
+
+class Scope(NamedTuple):
+    """O que um resultado lê: devices (None = todos) x dias locais 'YYYY-MM-DD' (None = todos)."""
+    devices: frozenset | None = None
+    day_from: str | None = None
+    day_to: str | None = None
+
+
+EVERYTHING = Scope()
+DEVICE_REGISTRY = Scope(None, "", "")  # só o cadastro (dia '' em data_versions)
+
+
+def scope(devices=None, day_from=None, day_to=None) -> Scope:
+    """devices: um id, vários ou None; dias: date ou 'YYYY-MM-DD'."""
+    if isinstance(devices, str):
+        devices = (devices,)
+    return Scope(frozenset(devices) if devices is not None else None,
+                 str(day_from) if day_from is not None else None,
+                 str(day_to) if day_to is not None else None)
+
+
+class _Entry(NamedTuple):
+    value: object
+    nbytes: int
+    scope: Scope
+
+
+def _nbytes(value) -> int:
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(_nbytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def _view(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=False)
+    if isinstance(value, tuple):
+        return tuple(_view(v) for v in value)
+    return value
+
+
+def _touched(s: Scope, by_device: dict[str, list[str]], all_days: list[str]) -> bool:
+    """O escopo cruza algum (device, dia) alterado? Listas de dias ordenadas."""
+    if s.devices is None:
+        lists = [all_days]
+    else:
+        lists = [by_device[d] for d in s.devices if d in by_device]
+    for days in lists:
+        if s.day_from is None:
+            if days:
+                return True
+            continue
+        i = bisect_left(days, s.day_from)
+        if i < len(days) and days[i] <= s.day_to:
+            return True
+    return False
+
+
+class QueryCache:
+    def __init__(self, max_bytes: int = MAX_BYTES, bind=None):
+        self.max_bytes = max_bytes
+        self._bind = bind
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._version = versions.current(bind)  # o que entrar daqui em diante está nesta versão
+        self._checked = time.monotonic()
+        self.hits = self.misses = self.evicted = self.dropped = 0
+
+    def refresh(self) -> int:
+        """Descarta as entradas tocadas pelo ETL desde a última versão vista. Retorna quantas."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked < CHECK_S:
+                return 0
+            self._checked, seen = now, self._version
+        version, changed = versions.changed_since(seen, self._bind)
+        if not changed:
+            return 0
+        by_device: dict[str, list[str]] = {}
+        for d, day in changed:
+            by_device.setdefault(d, []).append(day)
+        for days in by_device.values():
+            days.sort()
+        all_days = sorted({day for _, day in changed})
+        with self._lock:
+            stale = [k for k, e in self._entries.items() if _touched(e.scope, by_device, all_days)]
+            for k in stale:
+                self._bytes -= self._entries.pop(k).nbytes
+            self._version = max(self._version, version)
+            self.dropped += len(stale)
+        perf.count("cache.dropped", len(stale))
+        return len(stale)
+
+    def get(self, key: tuple, scope: Scope, load):
+        """Resultado guardado para `key`, ou load() (guardado se couber e os dados não mudaram no meio)."""
+        self.refresh()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            seen = self._version
+        if entry is not None:
+            perf.count("cache.hit")
+            return _view(entry.value)
+        self.misses += 1
+        perf.count("cache.miss")
+        value = load()
+        self._put(key, scope, value, seen)
+        return _view(value)
+
+    def _put(self, key: tuple, scope: Scope, value, seen: int) -> None:
+        nbytes = _nbytes(value)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if self._version != seen:
+                return  # o ETL gravou durante a leitura: a próxima chamada lê de novo
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = _Entry(value, nbytes, scope)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                _, e = self._entries.popitem(last=False)
+                self._bytes -= e.nbytes
+                self.evicted += 1
+
+    def cached(self, scope=None, key=None):
+        """
+        Decorador: fn(*args) guardado sob (nome, key(*args) ou args), com o
+        escopo scope(*args) (padrão: tudo, descartado a qualquer gravação).
+        """
+        def deco(fn):
+            @functools.wraps(fn)
+            def wrapper(*args):
+                k = (fn.__qualname__,) + tuple(key(*args) if key else args)
+                return self.get(k, scope(*args) if scope else EVERYTHING, lambda: fn(*args))
+            return wrapper
+        return deco
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evicted": self.evicted, "dropped": self.dropped}
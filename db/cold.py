@@ -0,0 +1,118 @@
+"""
+Camada fria (Parquet) para telemetria histórica.
+
+Dias fechados de log_records/odometer_samples são movidos pelo etl.archive
+para arquivos Parquet particionados por dia (UTC) e device:
+
+    archive/<tabela>/day=YYYY-MM-DD/device_id=<id>/part-0.parquet
+
+As leituras filtram por partição (dia/device) e só leem as colunas pedidas.
+pyarrow é opcional: sem ele (ou sem arquivo), tudo vem só do SQLite.
+"""
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # camada fria desativada
+    pa = ds = pq = None
+
+ARCHIVE_DIR = Path(os.getenv("FORTTIS_ARCHIVE") or Path(__file__).resolve().parents[1] / "archive")
+
+# colunas guardadas por tabela (device_id vem da partição)
+COLUMNS = {
+    "log_records": ["ts_ms", "latitude", "longitude", "speed", "delta_km"],
+    "odometer_samples": ["ts_ms", "odometer_km", "delta_km"],
+}
+
+DAY_MS = 86_400_000
+_MAX_MS = 253_402_300_799_000  # 9999-12-31: janelas "abertas" continuam válidas
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def day_of(ms: int) -> str:
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def day_start_ms(day: str) -> int:
+    return int(datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _table_dir(table: str) -> Path:
+    return ARCHIVE_DIR / table
+
+
+def _partition_path(table: str, day: str, device_id: str) -> Path:
+    return _table_dir(table) / f"day={day}" / f"device_id={device_id}" / "part-0.parquet"
+
+
+def _partitioning():
+    return ds.partitioning(pa.schema([("day", pa.string()), ("device_id", pa.string())]), flavor="hive")
+
+
+def _files(table: str, ms_from: int, ms_to: int, device_ids=None) -> list[str]:
+    """Arquivos das partições da janela (poda por dia/device antes de abrir o dataset)."""
+    root = _table_dir(table)
+    if not root.exists():
+        return []
+    lo = f"day={day_of(max(ms_from, 0))}"
+    hi = f"day={day_of(min(ms_to, _MAX_MS))}"
+    files = []
+    for entry in os.scandir(root):
+        if not (entry.is_dir() and lo <= entry.name <= hi):
+            continue
+        day_dir = Path(entry.path)
+        if device_ids is None:
+            files.extend(str(p) for p in day_dir.glob("device_id=*/part-0.parquet"))
+        else:
+            files.extend(str(p) for d in device_ids
+                         if (p := day_dir / f"device_id={d}" / "part-0.parquet").exists())
+    return files
+
+
+def read_partition(table: str, day: str, device_id: str) -> pd.DataFrame | None:
+    p = _partition_path(table, day, device_id)
+    return pq.read_table(p).to_pandas() if p.exists() else None
+
+
+def write_partition(table: str, day: str, device_id: str, df: pd.DataFrame) -> None:
+    """Grava (sobrescreve) a partição dia/device, ordenada por ts_ms."""
+    p = _partition_path(table, day, device_id)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    df = df[COLUMNS[table]].sort_values("ts_ms")
+    tmp = p.with_suffix(".tmp")
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp, compression="zstd")
+    os.replace(tmp, p)
+
+
+def scan(table: str, columns: list[str], ms_from: int, ms_to: int, device_ids=None) -> pd.DataFrame | None:
+    """Linhas arquivadas na janela (só partições/colunas necessárias). None se nada arquivado."""
+    if pa is None:
+        return None
+    files = _files(table, ms_from, ms_to, device_ids)
+    if not files:
+        return None
+    dset = ds.dataset(files, format="parquet", partitioning=_partitioning(),
+                      partition_base_dir=str(_table_dir(table)))
+    f = (ds.field("ts_ms") >= ms_from) & (ds.field("ts_ms") <= ms_to)
+    # partições antigas podem não ter colunas novas (ex.: delta_km): vêm nulas
+    have = [c for c in columns if c in dset.schema.names]
+    df = dset.to_table(columns=have, filter=f).to_pandas()
+    return df.assign(**{c: float("nan") for c in columns if c not in have})[columns]
+
+
+def partitions(table: str) -> list[tuple[str, str]]:
+    """(dia UTC, device_id) de cada partição gravada de `table`."""
+    root = _table_dir(table)
+    if not root.exists():
+        return []
+    return [(p.parent.parent.name.split("=", 1)[1], p.parent.name.split("=", 1)[1])
+            for p in root.glob("day=*/device_id=*/part-0.parquet")]
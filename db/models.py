@@ -1,41 +1,87 @@
+import os
+from datetime import datetime, timezone
 from sqlalchemy import (
-    Column, String, Float, DateTime, Integer, ForeignKey, create_engine
+    Column, String, Float, DateTime, Integer, BigInteger, ForeignKey, Index, DDL, create_engine, event
 )
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
 from pathlib import Path
 
+import perf
+
 # ===== Base única =====
 Base = declarative_base()
 
+# ===== Tempo =====
+# Colunas ts_ms: instante UTC em epoch-milissegundos (INTEGER). É o que as
+# consultas filtram/ordenam; date_time fica só como valor legível.
+def to_epoch_ms(dt: datetime) -> int:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return round(dt.timestamp() * 1000)
+
 # ===== Models =====
 class Device(Base):
     __tablename__ = "devices"
     id = Column(String, primary_key=True)
     name = Column(String)
     serial_number = Column(String, nullable=True)
+    key = Column(Integer)  # chave inteira interna (telemetria), atribuída por etl.devices.device_keys
 
+    __table_args__ = (Index("ux_devices_key", "key", unique=True),)
+
+# Telemetria: chave (device_key, ts_ms) em tabela WITHOUT ROWID — os pontos de um
+# device ficam contíguos e em ordem de tempo no próprio B-tree da tabela, sem
+# id texto nem device_id repetido em cada linha e em cada índice. O ETL e as
+# consultas traduzem devices.id <-> devices.key na borda.
 class LogRecord(Base):
     __tablename__ = "log_records"
-    # PK: usamos string estável "deviceId|dateTime" OU o id nativo, conforme seu ETL
-    id = Column(String, primary_key=True)
-    device_id = Column(String, ForeignKey("devices.id"), index=True, nullable=False)
-    date_time = Column(DateTime(timezone=True), index=True)
+    device_key = Column(Integer, ForeignKey("devices.key"), primary_key=True)
+    ts_ms = Column(BigInteger, primary_key=True)
     latitude = Column(Float)
     longitude = Column(Float)
     speed = Column(Float)
+    delta_km = Column(Float)  # km (haversine) desde o ponto anterior do device, ver etl.distance
 
-    device = relationship("Device", backref="log_records")
+    __table_args__ = (
+        Index("ix_log_records_ts", "ts_ms"),
+        {"sqlite_with_rowid": False},
+    )
+
+# índice espacial dos pontos (R*Tree do SQLite, ver db.spatial): criado junto com log_records
+LOG_RECORDS_RTREE = "log_records_rtree"
+LOG_RECORDS_RTREE_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {LOG_RECORDS_RTREE} "
+    "USING rtree_i32(id, lat0, lat1, lon0, lon1, t0, t1, +device_key, +ts_ms)"
+)
+event.listen(LogRecord.__table__, "after_create", DDL(LOG_RECORDS_RTREE_DDL))
 
 class ExceptionEvent(Base):
     __tablename__ = "exception_events"
     id = Column(String, primary_key=True)  # id do evento na Geotab
-    device_id = Column(String, ForeignKey("devices.id"), index=True, nullable=False)
+    device_id = Column(String, ForeignKey("devices.id"), nullable=False)
     rule_name = Column(String, index=True)     # ex.: Harsh Braking
     severity  = Column(String, index=True)     # ex.: High, Critical
-    date_time = Column(DateTime(timezone=True), index=True)
+    date_time = Column(DateTime(timezone=True))
+    ts_ms = Column(BigInteger)
+    # posição do ponto GPS mais próximo (±5 min), resolvida na ingestão
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
 
     device = relationship("Device", backref="exception_events")
 
+    __table_args__ = (
+        Index("ix_exception_events_device_ts", "device_id", "ts_ms"),
+        Index("ix_exception_events_ts", "ts_ms", "rule_name", "severity", "device_id"),
+    )
+
+# dicionário de regras da Geotab (o ExceptionEvent só traz o id), ver etl.rules
+class Rule(Base):
+    __tablename__ = "rules"
+    id = Column(String, primary_key=True)      # ex.: RuleHarshBrakingId
+    name = Column(String)                      # ex.: Harsh Braking
+    base_type = Column(String)                 # Stock, Custom, ...
+    version = Column(String)                   # versão da regra na Geotab
+
 class SyncState(Base):
     __tablename__ = "sync_state"
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -44,16 +90,180 @@ class SyncState(Base):
 
 class OdometerSample(Base):
     __tablename__ = "odometer_samples"
-    id = Column(String, primary_key=True)            # pk estável: f"{device_id}|{date_time_iso}"
-    device_id = Column(String, ForeignKey("devices.id"), index=True, nullable=False)
-    date_time = Column(DateTime(timezone=True), index=True, nullable=False)
+    device_key = Column(Integer, ForeignKey("devices.key"), primary_key=True)
+    ts_ms = Column(BigInteger, primary_key=True)
     odometer_km = Column(Float, nullable=False)      # valor absoluto de hodômetro (km)
+    delta_km = Column(Float)                         # km desde a leitura anterior (0 em reset/salto)
+
+    __table_args__ = (
+        Index("ix_odometer_samples_ts", "ts_ms"),
+        {"sqlite_with_rowid": False},
+    )
+
+# demais StatusData ingeridos (etl.diagnostics.DIAGNOSTICS: horas de motor, combustível),
+# valor cru na unidade do diagnóstico (diagnostics.unit)
+class StatusSample(Base):
+    __tablename__ = "status_samples"
+    device_key = Column(Integer, ForeignKey("devices.key"), primary_key=True)
+    kind = Column(String, primary_key=True)          # chave em DIAGNOSTICS: engine_hours, fuel
+    ts_ms = Column(BigInteger, primary_key=True)
+    value = Column(Float, nullable=False)
+
+    __table_args__ = ({"sqlite_with_rowid": False},)
+
+# catálogo local de Diagnostic da Geotab (dezenas de milhares), ver etl.diagnostics
+class Diagnostic(Base):
+    __tablename__ = "diagnostics"
+    id = Column(String, primary_key=True)            # ex.: DiagnosticOdometerAdjustmentId
+    name = Column(String(collation="NOCASE"))        # busca por prefixo usa o índice (LIKE 'odo%')
+    code = Column(Integer)
+    diagnostic_type = Column(String)                 # GoDiagnostic, ObdDiagnostic, ...
+    unit = Column(String)                            # id do unitOfMeasure
+    version = Column(String)
+
+    __table_args__ = (Index("ix_diagnostics_name", "name"),)
+
+# ===== Rollups diários (mantidos pelo ETL, ver etl.rollups) =====
+# Um registro por device por dia local (America/Sao_Paulo): KPIs e rankings do
+# dashboard somam dias em vez de varrer a telemetria bruta.
+class DailyDeviceStats(Base):
+    __tablename__ = "daily_device_stats"
+    device_id = Column(String, ForeignKey("devices.id"), primary_key=True)
+    day = Column(String, primary_key=True)           # 'YYYY-MM-DD' (dia local)
+    points = Column(Integer, nullable=False, default=0)
+    first_ms = Column(BigInteger)
+    last_ms = Column(BigInteger)
+    odo_min = Column(Float)                          # hodômetro mín/máx do dia (km)
+    odo_max = Column(Float)
+    km = Column(Float, nullable=False, default=0.0)  # SUM(delta_km) do hodômetro; GPS se não houver
+
+    __table_args__ = (Index("ix_daily_device_stats_day", "day"),)
+
+class DailyIncidentStats(Base):
+    __tablename__ = "daily_incident_stats"
+    device_id = Column(String, ForeignKey("devices.id"), primary_key=True)
+    day = Column(String, primary_key=True)
+    rule_name = Column(String, primary_key=True)
+    severity = Column(String, primary_key=True)      # '' quando o evento não tem severidade
+    n = Column(Integer, nullable=False)
 
-    device = relationship("Device", backref="odometer_samples")
+    __table_args__ = (Index("ix_daily_incident_stats_day", "day"),)
+
+# pontos por célula da grade (analytics.grid, nível base) por device e dia local:
+# mapa de calor da frota agrega dias/células em vez de varrer log_records
+class DailyGridCells(Base):
+    __tablename__ = "daily_grid_cells"
+    device_id = Column(String, ForeignKey("devices.id"), primary_key=True)
+    day = Column(String, primary_key=True)
+    cy = Column(Integer, primary_key=True)
+    cx = Column(Integer, primary_key=True)
+    n = Column(Integer, nullable=False)
+
+    __table_args__ = (Index("ix_daily_grid_cells_day", "day", "cy", "cx", "n"),)
+
+# versão dos dados por device e dia local, incrementada pelo ETL a cada gravação
+# (ver db.versions): o cache do dashboard (db.cache) descarta só o que foi tocado
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+    device_id = Column(String, primary_key=True)
+    day = Column(String, primary_key=True)           # 'YYYY-MM-DD' (dia local); '' = cadastro do device
+    version = Column(BigInteger, nullable=False)     # sequência global: maior = mais recente
+
+    __table_args__ = (
+        Index("ix_data_versions_version", "version"),
+        {"sqlite_with_rowid": False},
+    )
+
+# ===== Viagens (segmentadas dos log_records pelo ETL, ver etl.trips) =====
+class Trip(Base):
+    __tablename__ = "trips"
+    device_id = Column(String, ForeignKey("devices.id"), primary_key=True)
+    start_ms = Column(BigInteger, primary_key=True)  # saída (último ponto parado antes de andar)
+    end_ms = Column(BigInteger, nullable=False)      # chegada (primeiro ponto parado)
+    duration_ms = Column(BigInteger, nullable=False)
+    points = Column(Integer, nullable=False)
+    km = Column(Float, nullable=False)               # SUM(delta_km) dos pontos da viagem
+    max_kmh = Column(Float)
+    avg_kmh = Column(Float)                          # km / duração
+    lat_min = Column(Float)
+    lat_max = Column(Float)
+    lon_min = Column(Float)
+    lon_max = Column(Float)
+
+    __table_args__ = (Index("ix_trips_start", "start_ms"),)
+
+# marca d'água por device: a segmentação recomeça daqui quando chegam pontos novos
+class TripState(Base):
+    __tablename__ = "trip_state"
+    device_id = Column(String, ForeignKey("devices.id"), primary_key=True)
+    resume_ms = Column(BigInteger, nullable=False)   # início da viagem em aberto ou último ponto visto
+    updated_at = Column(DateTime(timezone=True))
+
+# ===== Checkpoint de backfill (ver etl.backfill) =====
+class BackfillState(Base):
+    __tablename__ = "backfill_state"
+    job = Column(String, primary_key=True)            # ex.: "LogRecord:b1"
+    from_ms = Column(BigInteger, nullable=False)      # período do job: [from_ms, to_ms)
+    to_ms = Column(BigInteger, nullable=False)
+    cursor_ms = Column(BigInteger, nullable=False)    # tudo antes disso já foi gravado
+    rows = Column(Integer, nullable=False, default=0)
+    slice_ms = Column(BigInteger)                     # tamanho da última fatia (retoma com ele)
+    updated_at = Column(DateTime(timezone=True))
+
+# shards (tipo x device x fatia de tempo) concluídos pelo backfill da frota (etl.fleet_backfill)
+class BackfillShard(Base):
+    __tablename__ = "backfill_shards"
+    type_name = Column(String, primary_key=True)      # LogRecord, StatusData, ExceptionEvent
+    device_id = Column(String, primary_key=True)
+    start_ms = Column(BigInteger, primary_key=True)
+    end_ms = Column(BigInteger, nullable=False)
+    rows = Column(Integer, nullable=False, default=0)
+    finished_at = Column(DateTime(timezone=True))
 
 # ===== Engine & Session =====
-DB_PATH = Path(__file__).resolve().parents[1] / "forttis.db"
-engine = create_engine(f"sqlite:///{DB_PATH}", future=True)
+# Todo acesso ao SQLite passa por aqui (dashboard, ETL, sync e scripts).
+# WAL: leitores não bloqueiam o writer do sync e vice-versa.
+DB_PATH = Path(os.getenv("FORTTIS_DB") or Path(__file__).resolve().parents[1] / "forttis.db")
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",       # persistente no arquivo; leitores concorrentes com 1 writer
+    "synchronous": "NORMAL",     # seguro em WAL; fsync só no checkpoint
+    "cache_size": -64_000,       # ~64 MB de page cache por conexão
+    "mmap_size": 268_435_456,    # 256 MB mapeados em memória
+    "busy_timeout": 10_000,      # espera até 10 s por lock em vez de falhar
+    "temp_store": "MEMORY",
+}
+
+def _set_pragmas(dbapi_con, readonly: bool) -> None:
+    cur = dbapi_con.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        if readonly and name == "journal_mode":
+            continue  # conexão somente leitura não troca o modo de journal
+        cur.execute(f"PRAGMA {name}={value}")
+    if readonly:
+        cur.execute("PRAGMA query_only=1")
+    cur.close()
+
+def make_engine(readonly: bool = False, **kwargs):
+    """
+    Engine SQLite com os pragmas acima.
+    readonly=True abre o arquivo com mode=ro (conexões do dashboard).
+    """
+    if readonly:
+        url = f"sqlite:///file:{DB_PATH.as_posix()}?mode=ro&uri=true"
+    else:
+        url = f"sqlite:///{DB_PATH}"
+    eng = create_engine(url, future=True, **kwargs)
+
+    @event.listens_for(eng, "connect")
+    def _on_connect(dbapi_con, _record):
+        _set_pragmas(dbapi_con, readonly)
+
+    perf.instrument_engine(eng)  # tempo por statement (só com FORTTIS_PERF=1)
+    return eng
+
+engine = make_engine()                                           # writer (ETL/sync/scripts)
+read_engine = make_engine(readonly=True, pool_size=8, max_overflow=8)  # leitores (dashboard)
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
@@ -61,4 +271,4 @@ def get_session():
     return SessionLocal()
 
 def create_all():
-    Base.metadata.create_all(engine)
\ No newline at end of file
+    Base.metadata.create_all(engine)
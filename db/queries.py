@@ -0,0 +1,263 @@
+"""
+Consultas de leitura do dashboard (sem Streamlit, para poder medir/reusar).
+
+Janelas de tempo em epoch-ms UTC (colunas ts_ms), sempre pela chave
+primária (device_key, ts_ms) das tabelas de telemetria (WITHOUT ROWID): o
+id texto da Geotab vira devices.key na própria consulta (_DEVICE_KEY).
+Telemetria arquivada (db.cold) entra por baixo: a parte da janela que está
+em Parquet é lida de lá e somada à cauda quente do SQLite.
+
+KPIs e rankings leem os rollups diários (etl.rollups), por dia local
+'YYYY-MM-DD': o custo depende do número de dias, não de linhas.
+"""
+import pandas as pd
+from sqlalchemy import text
+
+from analytics import grid
+from analytics.geo import merge_windows, in_polygon, INCIDENT_TOLERANCE_MS
+from db import cold, spatial
+from db.models import read_engine, LOG_RECORDS_RTREE
+import perf
+
+INCIDENT_RULES = ("Harsh Braking", "Harsh Acceleration", "Harsh Cornering", "Possible Collision")
+SEVERE = ("Critical", "High")
+
+_OR_BATCH = 200  # intervalos por consulta em load_points_near
+
+# telemetria (log_records) é chaveada por devices.key: tradução id -> key no próprio SQL
+_DEVICE_KEY = "(SELECT key FROM devices WHERE id = :did)"
+
+_RULES_SQL = ", ".join(f"'{r}'" for r in INCIDENT_RULES)
+_SEVERE_SQL = ", ".join(f"'{s}'" for s in SEVERE)
+
+
+def _with_dt(df: pd.DataFrame) -> pd.DataFrame:
+    """Acrescenta dt_utc (Timestamp UTC) a partir de ts_ms."""
+    df["dt_utc"] = pd.to_datetime(df["ts_ms"], unit="ms", utc=True)
+    return df
+
+
+@perf.timed()
+def load_devices(bind=None) -> pd.DataFrame:
+    return pd.read_sql("SELECT id, name FROM devices ORDER BY name", bind or read_engine)
+
+
+@perf.timed()
+def load_points(device_id: str, ms_from: int, ms_to: int, bind=None) -> pd.DataFrame:
+    """Pontos de um veículo na janela (faixa contígua da chave (device_key, ts_ms))."""
+    q = text(f"""
+        SELECT ts_ms, latitude, longitude, speed
+        FROM log_records
+        WHERE device_key = {_DEVICE_KEY}
+          AND ts_ms BETWEEN :ms_from AND :ms_to
+        ORDER BY ts_ms ASC
+    """)
+    df = pd.read_sql(q, bind or read_engine, params={"did": device_id, "ms_from": ms_from, "ms_to": ms_to})
+    arch = cold.scan("log_records", ["ts_ms", "latitude", "longitude", "speed"], ms_from, ms_to, [device_id])
+    if arch is not None and not arch.empty:
+        df = (pd.concat([arch, df], ignore_index=True)
+                .drop_duplicates("ts_ms", keep="last")
+                .sort_values("ts_ms", ignore_index=True))
+    df.insert(0, "device_id", device_id)
+    return _with_dt(df)
+
+
+@perf.timed()
+def load_points_near(events: pd.DataFrame, pad_ms: int = INCIDENT_TOLERANCE_MS, bind=None) -> pd.DataFrame:
+    """
+    Pontos só dos devices/intervalos que têm eventos (device_id, ts_ms):
+    janelas ±pad_ms unidas por device, uma consulta por device com os
+    intervalos em OR (cada um é uma busca na chave (device_key, ts_ms)).
+    """
+    cols = ["device_id", "ts_ms", "latitude", "longitude"]
+    frames = []
+    with (bind or read_engine).connect() as con:
+        for device_id, g in events.groupby("device_id"):
+            wins = merge_windows(g["ts_ms"], pad_ms)
+            for i in range(0, len(wins), _OR_BATCH):
+                part = wins[i:i + _OR_BATCH]
+                cond = " OR ".join(f"ts_ms BETWEEN :a{j} AND :b{j}" for j in range(len(part)))
+                params = {"did": device_id}
+                for j, (a, b) in enumerate(part):
+                    params[f"a{j}"], params[f"b{j}"] = a, b
+                frames.append(pd.read_sql(
+                    text(f"SELECT :did AS device_id, ts_ms, latitude, longitude FROM log_records "
+                         f"WHERE device_key = {_DEVICE_KEY} AND ({cond})"),
+                    con, params=params))
+            arch = cold.scan("log_records", ["ts_ms", "latitude", "longitude"],
+                             wins[0][0], wins[-1][1], [device_id])
+            if arch is not None and not arch.empty:
+                frames.append(arch.assign(device_id=device_id)[cols])
+    if not frames:
+        return pd.DataFrame(columns=cols)
+    return pd.concat(frames, ignore_index=True)
+
+
+@perf.timed()
+def load_km_period(day_from: str, day_to: str, only_device_id: str | None, bind=None):
+    """
+    Km rodados por veículo entre os dias locais day_from..day_to ('YYYY-MM-DD'):
+    soma dos km diários do rollup (trechos do hodômetro, ou GPS sem hodômetro).
+    Se only_device_id=None, agrega por veículo e também retorna total da frota.
+    """
+    base = """
+        SELECT device_id, SUM(km) AS km_periodo
+        FROM daily_device_stats
+        WHERE day BETWEEN :d0 AND :d1
+    """
+    params = {"d0": day_from, "d1": day_to}
+    if only_device_id:
+        base += " AND device_id = :did"
+        params["did"] = only_device_id
+    base += " GROUP BY device_id HAVING SUM(km) > 0"
+    df = pd.read_sql(text(base), bind or read_engine, params=params)
+    return df, (float(df["km_periodo"].sum()) if not df.empty else 0.0)
+
+
+@perf.timed()
+def load_severe_by_device(day_from: str, day_to: str, only_device_id: str | None, bind=None) -> pd.DataFrame:
+    """Incidentes graves (regras de INCIDENT_RULES, High/Critical) por veículo, do rollup diário."""
+    base = f"""
+        SELECT device_id, SUM(n) AS graves
+        FROM daily_incident_stats
+        WHERE day BETWEEN :d0 AND :d1
+          AND rule_name IN ({_RULES_SQL})
+          AND severity IN ({_SEVERE_SQL})
+    """
+    params = {"d0": day_from, "d1": day_to}
+    if only_device_id:
+        base += " AND device_id = :did"
+        params["did"] = only_device_id
+    base += " GROUP BY device_id"
+    return pd.read_sql(text(base), bind or read_engine, params=params)
+
+
+@perf.timed()
+def load_incidents(ms_from: int, ms_to: int, only_device_id: str | None, bind=None) -> pd.DataFrame:
+    base_sql = f"""
+        SELECT e.id, e.device_id, e.rule_name, e.severity, e.ts_ms, e.latitude, e.longitude,
+               d.name AS device_name
+        FROM exception_events e
+        JOIN devices d ON d.id = e.device_id
+        WHERE e.ts_ms BETWEEN :ms_from AND :ms_to
+          AND e.rule_name IN ({_RULES_SQL})
+    """
+    params = {"ms_from": ms_from, "ms_to": ms_to}
+    if only_device_id:
+        base_sql += " AND e.device_id = :did"
+        params["did"] = only_device_id
+    base_sql += " ORDER BY e.ts_ms ASC"
+    return _with_dt(pd.read_sql(text(base_sql), bind or read_engine, params=params))
+
+
+@perf.timed()
+def load_incident_ranking(day_from: str, day_to: str, limit: int = 10, bind=None) -> pd.DataFrame:
+    """Veículos com menos incidentes graves entre os dias locais (rollup diário)."""
+    q = text(f"""
+        SELECT d.name,
+               SUM(CASE WHEN s.severity IN ({_SEVERE_SQL}) THEN s.n ELSE 0 END) AS graves
+        FROM daily_incident_stats s
+        JOIN devices d ON d.id = s.device_id
+        WHERE s.day BETWEEN :d0 AND :d1
+          AND s.rule_name IN ({_RULES_SQL})
+        GROUP BY d.id
+        ORDER BY graves ASC, d.name ASC
+        LIMIT :lim
+    """)
+    return pd.read_sql(q, bind or read_engine, params={"d0": day_from, "d1": day_to, "lim": limit})
+
+
+@perf.timed()
+def load_points_ranking(limit: int = 5, bind=None) -> pd.DataFrame:
+    """Veículos com mais pontos coletados (todo o histórico, incluindo o arquivado)."""
+    q = text("""
+        SELECT d.name, SUM(s.points) AS pontos
+        FROM daily_device_stats s
+        JOIN devices d ON d.id = s.device_id
+        GROUP BY d.id
+        ORDER BY pontos DESC
+        LIMIT :lim
+    """)
+    return pd.read_sql(q, bind or read_engine, params={"lim": limit})
+
+
+@perf.timed()
+def load_grid_cells(day_from: str, day_to: str, k: int = 1, bind=None) -> pd.DataFrame:
+    """
+    Pontos da frota por célula do nível k da grade (analytics.grid) entre os
+    dias locais day_from..day_to, somando o cache diário daily_grid_cells.
+    """
+    q = text("""
+        SELECT cy / :k AS cy, cx / :k AS cx, SUM(n) AS n
+        FROM daily_grid_cells
+        WHERE day BETWEEN :d0 AND :d1
+        GROUP BY 1, 2
+    """)
+    return pd.read_sql(q, bind or read_engine, params={"d0": day_from, "d1": day_to, "k": int(k)})
+
+
+@perf.timed()
+def load_trips(device_id: str, ms_from: int, ms_to: int, bind=None) -> pd.DataFrame:
+    """
+    Viagens do veículo iniciadas na janela (tabela trips, mantida pelo ETL),
+    com a parada antes de cada uma (stop_before_ms; nula na primeira).
+    """
+    q = text("""
+        SELECT start_ms, end_ms, duration_ms, points, km, max_kmh, avg_kmh,
+               lat_min, lat_max, lon_min, lon_max,
+               start_ms - LAG(end_ms) OVER (ORDER BY start_ms) AS stop_before_ms
+        FROM trips
+        WHERE device_id = :did
+          AND start_ms BETWEEN :ms_from AND :ms_to
+        ORDER BY start_ms ASC
+    """)
+    return pd.read_sql(q, bind or read_engine, params={"did": device_id, "ms_from": ms_from, "ms_to": ms_to})
+
+
+@perf.timed()
+def load_points_in_area(area: list[tuple[float, float]], ms_from: int, ms_to: int, bind=None) -> pd.DataFrame:
+    """
+    Pontos da frota dentro da área na janela: `area` com 2 vértices (lat, lon)
+    = retângulo pelos cantos, 3+ = polígono. Parte quente pelo R*Tree
+    (db.spatial) no retângulo envolvente, sem ler log_records; parte
+    arquivada só nas partições dos devices que têm células da grade
+    (daily_grid_cells) no retângulo. O polígono é aplicado no final.
+    """
+    lats = [float(a) for a, _ in area]
+    lons = [float(b) for _, b in area]
+    box = (min(lats), max(lats), min(lons), max(lons))
+    q = text(f"""
+        SELECT d.id AS device_id, r.ts_ms, r.lat0 AS latitude, r.lon0 AS longitude
+        FROM {LOG_RECORDS_RTREE} r
+        JOIN devices d ON d.key = r.device_key
+        WHERE r.lat0 >= :lat0 AND r.lat1 <= :lat1 AND r.lon0 >= :lon0 AND r.lon1 <= :lon1
+          AND r.t0 >= :t0 AND r.t1 <= :t1
+          AND r.ts_ms BETWEEN :ms0 AND :ms1
+    """)
+    df = pd.read_sql(q, bind or read_engine, params=spatial.bbox_params(*box, ms_from, ms_to))
+    df[["latitude", "longitude"]] = df[["latitude", "longitude"]] / spatial.SCALE
+
+    # dias locais (daily_grid_cells) que cobrem a janela em UTC: o anterior entra por garantia
+    (cy0, cy1), (cx0, cx1) = grid.cells([box[0], box[1]], [box[2], box[3]])
+    with (bind or read_engine).connect() as con:
+        devs = con.execute(text("""
+            SELECT DISTINCT device_id FROM daily_grid_cells
+            WHERE day BETWEEN :d0 AND :d1 AND cy BETWEEN :cy0 AND :cy1 AND cx BETWEEN :cx0 AND :cx1
+        """), {"d0": cold.day_of(ms_from - cold.DAY_MS), "d1": cold.day_of(ms_to),
+               "cy0": int(cy0), "cy1": int(cy1), "cx0": int(cx0), "cx1": int(cx1)}).scalars().all()
+    arch = cold.scan("log_records", ["ts_ms", "latitude", "longitude", "device_id"],
+                     ms_from, ms_to, devs) if devs else None
+    if arch is not None and not arch.empty:
+        arch = arch[arch["latitude"].between(box[0], box[1]) & arch["longitude"].between(box[2], box[3])]
+        df = (pd.concat([arch[df.columns], df], ignore_index=True)
+                .drop_duplicates(["device_id", "ts_ms"], keep="last"))
+
+    if len(area) > 2 and not df.empty:
+        df = df[in_polygon(df["latitude"], df["longitude"], area)]
+    return _with_dt(df.sort_values(["device_id", "ts_ms"], ignore_index=True))
+
+
+@perf.timed()
+def load_last_point_ms(bind=None) -> int | None:
+    with (bind or read_engine).connect() as con:
+        return con.execute(text("SELECT MAX(ts_ms) FROM log_records")).scalar()
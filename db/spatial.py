@@ -0,0 +1,92 @@
+"""
+Índice espacial dos pontos GPS: tabela virtual R*Tree do SQLite (log_records_rtree).
+
+Cada ponto de log_records com posição é uma caixa degenerada (lat, lon, minuto)
+em coordenadas inteiras (rtree_i32: graus x 1e7, minutos desde a época), com
+device_key e ts_ms como colunas auxiliares — a busca por área + janela de tempo
+responde só com o índice, sem tocar log_records.
+
+O id no índice é a própria chave do ponto, (device_key, ts_ms) num inteiro de
+64 bits. Mantido pelo saver (etl.pipeline) e pelo arquivamento (etl.archive,
+que tira do índice o que vai para o Parquet).
+
+    python -m db.spatial          # reconstrói o índice a partir de log_records
+"""
+import math
+
+from sqlalchemy import text
+
+from db.models import engine, LOG_RECORDS_RTREE, LOG_RECORDS_RTREE_DDL
+
+SCALE = 10_000_000          # graus -> inteiro (7 casas, como a Geotab)
+MINUTE_MS = 60_000
+_TS_BITS = 42               # ts_ms < 2^42 (até ~2109); device_key nos bits de cima
+_BATCH = 5000
+
+_UPSERT = f"INSERT OR REPLACE INTO {LOG_RECORDS_RTREE} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+_DELETE = f"DELETE FROM {LOG_RECORDS_RTREE} WHERE id = ?"
+
+
+def key(device_key: int, ts_ms: int) -> int:
+    """Chave do ponto -> id inteiro no R*Tree."""
+    return (device_key << _TS_BITS) | ts_ms
+
+
+def _entry(r: dict) -> tuple:
+    lat = round(r["latitude"] * SCALE)
+    lon = round(r["longitude"] * SCALE)
+    t = r["ts_ms"] // MINUTE_MS
+    return (key(r["device_key"], r["ts_ms"]), lat, lat, lon, lon, t, t, r["device_key"], r["ts_ms"])
+
+
+def _located(r: dict) -> bool:
+    return (r.get("latitude") is not None and r.get("longitude") is not None
+            and math.isfinite(r["latitude"]) and math.isfinite(r["longitude"]))
+
+
+def index_rows(rows: list[dict]) -> int:
+    """Atualiza o índice com linhas de log_records com device_key (sem posição = fora do índice)."""
+    located = [r for r in rows if _located(r)]
+    missing = [(key(r["device_key"], r["ts_ms"]),) for r in rows if not _located(r)]
+    with engine.begin() as con:
+        for i in range(0, len(located), _BATCH):
+            con.exec_driver_sql(_UPSERT, [_entry(r) for r in located[i:i + _BATCH]])
+        if missing:
+            con.exec_driver_sql(_DELETE, missing)
+    return len(located)
+
+
+def unindex(con, points: list[tuple[int, int]]) -> None:
+    """Remove pontos (device_key, ts_ms) do índice (na transação `con` de quem apaga de log_records)."""
+    for i in range(0, len(points), _BATCH):
+        con.exec_driver_sql(_DELETE, [(key(k, t),) for k, t in points[i:i + _BATCH]])
+
+
+def bbox_params(lat_min: float, lat_max: float, lon_min: float, lon_max: float,
+                ms_from: int, ms_to: int) -> dict:
+    """Parâmetros da busca no R*Tree (inteiros que cobrem a caixa pedida)."""
+    return {
+        "lat0": math.floor(lat_min * SCALE), "lat1": math.ceil(lat_max * SCALE),
+        "lon0": math.floor(lon_min * SCALE), "lon1": math.ceil(lon_max * SCALE),
+        "t0": ms_from // MINUTE_MS, "t1": ms_to // MINUTE_MS,
+        "ms0": ms_from, "ms1": ms_to,
+    }
+
+
+def rebuild() -> int:
+    """Recria o índice com todos os pontos do SQLite (ex.: migração 009)."""
+    with engine.begin() as con:
+        con.exec_driver_sql(f"DROP TABLE IF EXISTS {LOG_RECORDS_RTREE}")
+        con.exec_driver_sql(LOG_RECORDS_RTREE_DDL)
+    n = 0
+    with engine.connect() as src:
+        res = src.execute(text(
+            "SELECT device_key, ts_ms, latitude, longitude FROM log_records "
+            "WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND ts_ms IS NOT NULL"))
+        while batch := res.fetchmany(_BATCH):
+            n += index_rows([dict(r._mapping) for r in batch])
+    return n
+
+
+if __name__ == "__main__":
+    print(f"{LOG_RECORDS_RTREE}: {rebuild()} pontos indexados.")
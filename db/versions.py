@@ -0,0 +1,66 @@
+"""
+Versão dos dados por (device, dia local), tabela 'data_versions'.
+
+O ETL chama bump() depois de gravar: cada (device_id, dia) tocado recebe o
+próximo número de uma sequência global (MAX(version) + 1, calculado dentro
+do próprio INSERT, que já segura a escrita do SQLite). Quem guarda resultados
+(db.cache) só precisa de:
+
+    current()            # MAX(version): mudou alguma coisa?
+    changed_since(v)     # quais (device, dia) mudaram depois de v
+
+O bump vem sempre depois da gravação dos dados (ou na mesma transação): uma
+leitura feita no meio é descartada quando o bump aparece. Dia '' é o
+cadastro do device (nome), sem dia.
+
+A tabela é criada no primeiro bump (banco que ainda não rodou a migração
+014); até lá a leitura vê versão 0 e nenhuma mudança.
+"""
+from contextlib import nullcontext
+
+from sqlalchemy import text
+
+from db.models import engine, read_engine, DataVersion
+
+_BUMP = text("""
+    INSERT INTO data_versions (device_id, day, version)
+    VALUES (:d, :day, (SELECT COALESCE(MAX(version), 0) + 1 FROM data_versions))
+    ON CONFLICT (device_id, day) DO UPDATE SET version = excluded.version
+""")
+_EXISTS = text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'data_versions'")
+
+_ready = False  # tabela já vista/criada neste processo
+
+
+def _exists(con) -> bool:
+    global _ready
+    _ready = _ready or con.execute(_EXISTS).first() is not None
+    return _ready
+
+
+def bump(pairs, con=None) -> int:
+    """Nova versão para os pares (device_id, dia). `con`: transação de quem gravou. Retorna pares."""
+    params = [{"d": d, "day": day} for d, day in sorted(pairs) if d is not None]
+    if params:
+        with nullcontext(con) if con is not None else engine.begin() as c:
+            if not _exists(c):
+                DataVersion.__table__.create(c, checkfirst=True)  # na transação de quem gravou
+            c.execute(_BUMP, params)
+    return len(params)
+
+
+def current(bind=None) -> int:
+    with (bind or read_engine).connect() as con:
+        if not _exists(con):
+            return 0
+        return con.execute(text("SELECT COALESCE(MAX(version), 0) FROM data_versions")).scalar()
+
+
+def changed_since(version: int, bind=None) -> tuple[int, set[tuple[str, str]]]:
+    """(versão atual, pares (device_id, dia) com versão > `version`)."""
+    with (bind or read_engine).connect() as con:
+        if not _exists(con):
+            return version, set()
+        rows = con.execute(text("SELECT device_id, day, version FROM data_versions WHERE version > :v"),
+                           {"v": version}).all()
+    return max((r.version for r in rows), default=version), {(r.device_id, r.day) for r in rows}
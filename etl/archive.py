@@ -0,0 +1,99 @@
+"""
+Arquivamento de dias fechados de telemetria em Parquet (camada fria, ver db.cold).
+
+    python -m etl.archive                    # dias (UTC) com mais de 30 dias
+    python -m etl.archive --keep-days 7 --vacuum
+
+Para cada dia antes do corte que ainda tem linhas no SQLite:
+  1) lê as linhas do dia, agrupa por device e grava/mescla a partição Parquet;
+  2) apaga do SQLite exatamente os pontos (device_key, ts_ms) gravados.
+As consultas (db.queries) leem Parquet + SQLite juntos, então linhas que
+chegarem atrasadas para um dia já arquivado continuam visíveis e são
+varridas para o Parquet na próxima execução.
+"""
+import argparse
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+from sqlalchemy import text
+
+from db import cold, spatial
+from db.models import engine
+
+KEEP_DAYS = 30
+TABLES = ["log_records", "odometer_samples"]
+_DELETE_BATCH = 500
+
+
+def _next_day(table: str, from_ms: int, cutoff_ms: int) -> str | None:
+    """Próximo dia com linhas em [from_ms, cutoff_ms) — busca pelo índice de ts_ms."""
+    with engine.connect() as con:
+        ms = con.execute(
+            text(f"SELECT MIN(ts_ms) FROM {table} WHERE ts_ms >= :a AND ts_ms < :b"),
+            {"a": from_ms, "b": cutoff_ms},
+        ).scalar()
+    return cold.day_of(ms) if ms is not None else None
+
+
+def archive_day(table: str, day: str) -> int:
+    """Move um dia (UTC) de `table` para Parquet. Retorna linhas movidas."""
+    start = cold.day_start_ms(day)
+    # Parquet particionado pelo id da Geotab (devices.key é só do SQLite)
+    cols = ", ".join(["d.id AS device_id", "t.device_key"] + [f"t.{c}" for c in cold.COLUMNS[table]])
+    df = pd.read_sql(
+        text(f"SELECT {cols} FROM {table} t JOIN devices d ON d.key = t.device_key "
+             "WHERE t.ts_ms >= :a AND t.ts_ms < :b"),
+        engine, params={"a": start, "b": start + cold.DAY_MS},
+    )
+    if df.empty:
+        return 0
+
+    for device_id, g in df.groupby("device_id"):
+        old = cold.read_partition(table, day, device_id)
+        if old is not None:
+            g = pd.concat([old, g], ignore_index=True).drop_duplicates("ts_ms", keep="last")
+        cold.write_partition(table, day, device_id, g)
+
+    keys = list(zip(df["device_key"].tolist(), df["ts_ms"].tolist()))
+    with engine.begin() as con:
+        for i in range(0, len(keys), _DELETE_BATCH):
+            con.exec_driver_sql(f"DELETE FROM {table} WHERE device_key = ? AND ts_ms = ?",
+                                keys[i:i + _DELETE_BATCH])
+        if table == "log_records":
+            spatial.unindex(con, keys)  # o que foi para o Parquet sai do R*Tree
+    return len(keys)
+
+
+def run(keep_days: int = KEEP_DAYS, tables: list[str] = TABLES) -> dict[str, int]:
+    if not cold.available():
+        raise SystemExit("pyarrow não instalado: pip install pyarrow")
+    now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+    cutoff_ms = cold.day_start_ms(cold.day_of(now_ms)) - keep_days * cold.DAY_MS
+    moved = {}
+    for table in tables:
+        moved[table] = 0
+        from_ms = 0
+        while (day := _next_day(table, from_ms, cutoff_ms)) is not None:
+            t0 = time.perf_counter()
+            n = archive_day(table, day)
+            moved[table] += n
+            print(f"{table} {day}: {n} linhas -> Parquet ({time.perf_counter() - t0:.2f}s)")
+            from_ms = cold.day_start_ms(day) + cold.DAY_MS
+    return moved
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Arquiva dias fechados de telemetria em Parquet.")
+    ap.add_argument("--keep-days", type=int, default=KEEP_DAYS, help="dias recentes mantidos no SQLite")
+    ap.add_argument("--vacuum", action="store_true", help="VACUUM no SQLite ao final")
+    args = ap.parse_args()
+    moved = run(args.keep_days)
+    print("Arquivado:", moved)
+    if args.vacuum and any(moved.values()):
+        with engine.connect() as con:
+            con.exec_driver_sql("VACUUM")
+
+
+if __name__ == "__main__":
+    main()
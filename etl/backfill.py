@@ -0,0 +1,145 @@
+"""
+Backfill histórico via Get, em fatias de tempo adaptativas (memória constante).
+
+    from etl.backfill import backfill
+    backfill("LogRecord:b1", api, "LogRecord", lambda items: save_logrecords(items, api=api),
+             start, end, search={"deviceSearch": {"id": "b1"}})
+
+O Get da Geotab devolve no máximo `resultsLimit` itens e descarta o resto sem
+avisar. Aqui o período é percorrido em fatias [t, t + fatia): fatia que volta
+cheia é descartada e refeita com metade do tamanho; fatia pouco ocupada faz a
+próxima dobrar; falha (timeout, limite de chamadas) encolhe e tenta de novo
+com backoff. Cada fatia completa vai direto para o saver e é liberada — só
+uma página fica na memória, qualquer que seja o período.
+
+Checkpoint em 'backfill_state' (uma linha por job): depois de gravar cada
+fatia, o cursor avança. Rodar de novo o mesmo job continua de onde parou,
+no período original, até concluir; só então um período novo começa
+(restart=True ignora o checkpoint). Os upserts são idempotentes: repetir a
+fatia interrompida não duplica nada.
+"""
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from db.models import engine, BackfillState, to_epoch_ms
+import perf
+
+log = logging.getLogger("forttis.backfill")
+
+RESULTS_LIMIT = 5000
+INITIAL_SLICE = timedelta(hours=6)
+MIN_SLICE = timedelta(seconds=1)
+MAX_SLICE = timedelta(days=7)
+MAX_RETRIES = 5
+MAX_BACKOFF_SECONDS = 60.0
+PROGRESS_SECONDS = 5.0
+
+
+@dataclass
+class Slice:
+    start: datetime
+    end: datetime
+    size: timedelta       # tamanho da fatia seguinte (já ajustado)
+    items: list[dict]
+
+
+def _from_ms(ms: int) -> datetime:
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+
+
+def _get(api, type_name: str, search: dict | None, start: datetime, end: datetime, limit: int) -> list[dict]:
+    # toDate é inclusivo na Geotab: para 1 ms antes, senão o item da borda vem nas duas fatias
+    params = {**(search or {}), "fromDate": start.isoformat(),
+              "toDate": (end - timedelta(milliseconds=1)).isoformat()}
+    with perf.timer(f"api:Get {type_name}"):
+        return api.get(type_name, search=params, resultsLimit=limit)
+
+
+def slices(api, type_name: str, start: datetime, end: datetime, search: dict | None = None,
+           results_limit: int = RESULTS_LIMIT, size: timedelta = INITIAL_SLICE):
+    """
+    Gera Slice em ordem cobrindo [start, end), cada um abaixo de `results_limit`
+    itens (exceto se nem MIN_SLICE couber no limite: aí o excedente é perdido e logado).
+    """
+    t = start
+    failures = 0
+    while t < end:
+        stop = min(end, t + size)
+        try:
+            items = _get(api, type_name, search, t, stop, results_limit)
+        except Exception as e:
+            failures += 1
+            if failures > MAX_RETRIES:
+                raise
+            size = max(MIN_SLICE, size / 2)
+            delay = min(MAX_BACKOFF_SECONDS, 2.0 ** (failures - 1))
+            log.warning("%s: falha em %s (%s); nova tentativa em %.0fs", type_name, t.isoformat(), e, delay)
+            time.sleep(delay)
+            continue
+        failures = 0
+        if len(items) >= results_limit:
+            if size > MIN_SLICE:
+                size = max(MIN_SLICE, size / 2)  # truncado: refaz a mesma janela menor
+                continue
+            log.warning("%s: %d itens em %s..%s (fatia mínima); excedente descartado pela API",
+                        type_name, len(items), t.isoformat(), stop.isoformat())
+        elif len(items) < results_limit // 4:
+            size = min(MAX_SLICE, size * 2)
+        yield Slice(t, stop, size, items)
+        t = stop
+
+
+def load_state(job: str) -> BackfillState | None:
+    with engine.connect() as conn:
+        row = conn.execute(select(BackfillState).where(BackfillState.job == job)).first()
+    return BackfillState(**row._mapping) if row else None
+
+
+def save_state(job: str, from_ms: int, to_ms: int, cursor_ms: int, rows: int, slice_ms: int) -> None:
+    values = dict(job=job, from_ms=from_ms, to_ms=to_ms, cursor_ms=cursor_ms, rows=rows,
+                  slice_ms=slice_ms, updated_at=datetime.now(timezone.utc))
+    stmt = sqlite_insert(BackfillState.__table__).values(**values)
+    stmt = stmt.on_conflict_do_update(index_elements=["job"], set_=values)
+    with engine.begin() as conn:
+        conn.execute(stmt)
+
+
+def backfill(job: str, api, type_name: str, save: Callable, start: datetime, end: datetime,
+             search: dict | None = None, results_limit: int = RESULTS_LIMIT, restart: bool = False) -> int:
+    """
+    Baixa `type_name` em [start, end) e grava cada fatia com save(items) -> UpsertResult.
+    Retoma o job pelo checkpoint, se houver um inacabado. Retorna linhas gravadas nesta execução.
+    """
+    state = None if restart else load_state(job)
+    if state is not None and state.cursor_ms < state.to_ms:
+        from_ms, to_ms, cursor_ms, total = state.from_ms, state.to_ms, state.cursor_ms, state.rows
+        size = timedelta(milliseconds=state.slice_ms) if state.slice_ms else INITIAL_SLICE
+        log.info("%s: retomando em %s (período %s..%s, %d linhas já gravadas)", job,
+                 _from_ms(cursor_ms).isoformat(), _from_ms(from_ms).isoformat(), _from_ms(to_ms).isoformat(), total)
+    else:
+        from_ms, to_ms, total, size = to_epoch_ms(start), to_epoch_ms(end), 0, INITIAL_SLICE
+        cursor_ms = from_ms
+        save_state(job, from_ms, to_ms, cursor_ms, total, size // timedelta(milliseconds=1))
+
+    rows, t0, last_log = 0, time.perf_counter(), 0.0
+    for sl in slices(api, type_name, _from_ms(cursor_ms), _from_ms(to_ms), search, results_limit, size):
+        n = save(sl.items).total if sl.items else 0
+        rows += n
+        total += n
+        cursor_ms = to_epoch_ms(sl.end)
+        save_state(job, from_ms, to_ms, cursor_ms, total, sl.size // timedelta(milliseconds=1))
+
+        elapsed = time.perf_counter() - t0
+        if elapsed - last_log >= PROGRESS_SECONDS or cursor_ms >= to_ms:
+            last_log = elapsed
+            done = (cursor_ms - from_ms) / max(1, to_ms - from_ms) * 100
+            log.info("%s: até %s (%.0f%%) | %d linhas | %.0f linhas/s | fatia %s", job,
+                     sl.end.isoformat(timespec="seconds"), done, total, rows / elapsed if elapsed else 0.0, sl.size)
+    perf.flush(f"backfill:{job}")
+    return rows
@@ -0,0 +1,111 @@
+"""
+Escrita em lote (bulk upsert) no SQLite.
+
+Em vez de `session.merge()` linha a linha (SELECT por PK + INSERT/UPDATE),
+as linhas são agrupadas em chunks e cada chunk é gravado com um único
+`INSERT ... ON CONFLICT DO UPDATE` via executemany, em uma transação própria.
+"""
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from db.models import engine
+
+DEFAULT_CHUNK_SIZE = 2000
+_IN_BATCH = 500  # chaves por SELECT ... IN (...) (limite de parâmetros do SQLite)
+
+
+@dataclass
+class UpsertResult:
+    """Resumo de uma gravação em lote."""
+    inserted: int = 0
+    updated: int = 0
+    seconds: float = 0.0
+
+    @property
+    def total(self) -> int:
+        return self.inserted + self.updated
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.total / self.seconds if self.seconds > 0 else 0.0
+
+    def __add__(self, other: "UpsertResult") -> "UpsertResult":
+        return UpsertResult(
+            self.inserted + other.inserted,
+            self.updated + other.updated,
+            self.seconds + other.seconds,
+        )
+
+    def __str__(self) -> str:
+        return (f"{self.total} linhas ({self.inserted} novas, {self.updated} atualizadas) "
+                f"em {self.seconds:.2f}s — {self.rows_per_sec:,.0f} linhas/s")
+
+
+def _chunks(rows, size: int):
+    buf = []
+    for r in rows:
+        buf.append(r)
+        if len(buf) >= size:
+            yield buf
+            buf = []
+    if buf:
+        yield buf
+
+
+def _existing_keys(conn, table, key_cols: list[str], keys: list[tuple]) -> set[tuple]:
+    """Quais das chaves do chunk já existem na tabela (para separar inseridos x atualizados)."""
+    cols = [table.c[k] for k in key_cols]
+    # chave composta: o SQLite não usa a PK para (a, b) IN (VALUES ...) e varre
+    # a tabela inteira; agrupado pelo prefixo vira a = ? AND b IN (...), busca na PK
+    groups: dict[tuple, list] = {}
+    for k in keys:
+        groups.setdefault(tuple(k[:-1]), []).append(k[-1])
+    found = set()
+    for prefix, last in groups.items():
+        for i in range(0, len(last), _IN_BATCH):
+            q = select(*cols).where(cols[-1].in_(last[i:i + _IN_BATCH]),
+                                    *(c == v for c, v in zip(cols, prefix)))
+            found.update(tuple(r) for r in conn.execute(q))
+    return found
+
+
+def bulk_upsert(table, rows, key_cols: list[str], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                bind=None) -> UpsertResult:
+    """
+    Grava `rows` (iterável de dicts com as colunas de `table`) em chunks.
+    - Linhas repetidas dentro do chunk: vale a última.
+    - Conflito em `key_cols`: atualiza as demais colunas.
+    Cada chunk é uma transação; retorna contagem de novos/atualizados e tempo total.
+    """
+    bind = bind if bind is not None else engine
+    result = UpsertResult()
+    t0 = time.perf_counter()
+
+    for chunk in _chunks(rows, max(1, chunk_size)):
+        staged = {tuple(r[k] for k in key_cols): r for r in chunk}
+        if not staged:
+            continue
+        values = list(staged.values())
+        update_cols = [c for c in values[0] if c not in key_cols]
+
+        stmt = sqlite_insert(table)
+        if update_cols:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=key_cols,
+                set_={c: stmt.excluded[c] for c in update_cols},
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=key_cols)
+
+        with bind.begin() as conn:
+            existing = _existing_keys(conn, table, key_cols, list(staged))
+            conn.execute(stmt, values)
+
+        result.updated += len(existing)
+        result.inserted += len(staged) - len(existing)
+
+    result.seconds = time.perf_counter() - t0
+    return result
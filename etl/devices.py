@@ -0,0 +1,147 @@
+"""
+Catálogo de devices com cache.
+
+Os savers precisam garantir que todo device_id referenciado exista em 'devices'.
+Ordem de resolução:
+  1) cache em memória do processo;
+  2) tabela local 'devices';
+  3) só os ids ainda desconhecidos vão para a API, em ExecuteMultiCall de
+     até _MULTICALL_BATCH Gets. Lote recusado pelo servidor (erro da API que
+     não é de sessão, cota ou indisponibilidade) cai num Get de Device sem
+     filtro, feito uma vez e filtrado localmente; erros de autenticação,
+     timeout e rede sobem para quem chamou.
+
+A telemetria referencia o device pela chave inteira devices.key
+(device_keys): o id da Geotab fica só na tabela 'devices'.
+"""
+import logging
+
+from mygeotab.exceptions import MyGeotabException
+from sqlalchemy import select, text
+
+from config import get_api
+from db import versions
+from db.models import engine, Device
+from etl.bulk import bulk_upsert
+import perf
+
+log = logging.getLogger("forttis.devices")
+
+_MULTICALL_BATCH = 100  # Gets por ExecuteMultiCall
+_IN_BATCH = 500
+# erros da API que não dizem nada sobre o ExecuteMultiCall: o Get sem filtro falharia igual
+_NO_FALLBACK = {"InvalidUserException", "OverLimitException", "DbUnavailableException"}
+
+_known: set[str] = set()     # ids presentes na tabela 'devices'
+_not_found: set[str] = set()  # ids que a API não devolveu (não pergunta de novo)
+_keys: dict[str, int] = {}    # id -> devices.key (nunca muda depois de atribuída)
+
+
+def _local_ids(ids: set[str]) -> set[str]:
+    found = set()
+    ids = list(ids)
+    with engine.connect() as conn:
+        for i in range(0, len(ids), _IN_BATCH):
+            q = select(Device.id).where(Device.id.in_(ids[i:i + _IN_BATCH]))
+            found.update(conn.execute(q).scalars())
+    return found
+
+
+@perf.timed("api:Device")
+def fetch_devices(api, ids: set[str]) -> list[dict]:
+    """Busca os devices `ids` na API em lotes de ExecuteMultiCall."""
+    ids = sorted(ids)
+    out = []
+    everything = None  # Get de Device sem filtro, só se algum lote for recusado
+    for i in range(0, len(ids), _MULTICALL_BATCH):
+        batch = ids[i:i + _MULTICALL_BATCH]
+        calls = [("Get", {"typeName": "Device", "search": {"id": did}}) for did in batch]
+        try:
+            results = api.multi_call(calls) or []
+        except MyGeotabException as e:
+            if e.name in _NO_FALLBACK:
+                raise
+            log.warning("Device: ExecuteMultiCall recusado (%s: %s); %d ids pelo Get sem filtro",
+                        e.name, e.message, len(batch))
+            if everything is None:
+                everything = api.get("Device") or []
+            wanted = set(batch)
+            out.extend(d for d in everything if d.get("id") in wanted)
+            continue
+        for res in results:
+            out.extend(res or [])
+    return out
+
+
+def _device_row(d: dict) -> dict:
+    return {"id": d["id"], "name": d.get("name"), "serial_number": d.get("serialNumber")}
+
+
+def normalize_devices(devs: list[dict]) -> list[dict]:
+    return [_device_row(d) for d in devs if d.get("id")]
+
+
+def write_devices(rows: list[dict]) -> None:
+    if rows:
+        bulk_upsert(Device.__table__, rows, ["id"])
+        versions.bump((r["id"], "") for r in rows)  # nome/cadastro: lista de veículos do dashboard
+        _known.update(r["id"] for r in rows)
+        _not_found.difference_update(r["id"] for r in rows)
+
+
+def save_devices(devs: list[dict]) -> None:
+    """Grava/atualiza devices vindos da API (Get ou GetFeed)."""
+    write_devices(normalize_devices(devs))
+
+
+def ensure_devices(device_ids: set[str], api=None) -> int:
+    """
+    Garante os devices em 'devices'. Só autentica/chama a API se houver id
+    desconhecido. Retorna quantos devices foram buscados na API.
+    """
+    missing = {d for d in device_ids if d} - _known - _not_found
+    if not missing:
+        return 0
+    local = _local_ids(missing)
+    _known.update(local)
+    missing -= local
+    if not missing:
+        return 0
+
+    api = api or get_api()
+    devs = fetch_devices(api, missing)
+    save_devices(devs)
+    _not_found.update(missing - {d.get("id") for d in devs})
+    return len(devs)
+
+
+def assign_keys(con) -> None:
+    """Dá devices.key (sequencial) aos devices que ainda não têm, na transação `con`."""
+    ids = con.execute(text("SELECT id FROM devices WHERE key IS NULL ORDER BY rowid")).scalars().all()
+    if ids:
+        last = con.execute(text("SELECT COALESCE(MAX(key), 0) FROM devices")).scalar()
+        con.execute(text("UPDATE devices SET key = :k WHERE id = :id"),
+                    [{"k": last + i, "id": did} for i, did in enumerate(ids, 1)])
+
+
+def device_keys(device_ids: set[str]) -> dict[str, int]:
+    """
+    id -> devices.key. Id sem linha em 'devices' (a API não o devolveu) entra
+    só com o id, para a telemetria não se perder; o nome vem num sync futuro.
+    """
+    missing = [d for d in device_ids if d and d not in _keys]
+    if missing:
+        with engine.begin() as conn:
+            conn.execute(text("INSERT OR IGNORE INTO devices (id) VALUES (:id)"), [{"id": d} for d in missing])
+            assign_keys(conn)
+            for i in range(0, len(missing), _IN_BATCH):
+                q = select(Device.id, Device.key).where(Device.id.in_(missing[i:i + _IN_BATCH]))
+                _keys.update((did, key) for did, key in conn.execute(q))
+        _known.update(missing)
+    return {d: _keys[d] for d in device_ids if d in _keys}
+
+
+def clear_cache() -> None:
+    _known.clear()
+    _not_found.clear()
+    _keys.clear()
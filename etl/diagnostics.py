@@ -0,0 +1,95 @@
+"""
+Catálogo local de Diagnostic e os StatusData que o ETL ingere.
+
+O catálogo de Diagnostic da Geotab tem dezenas de milhares de itens: baixar
+e varrer tudo a cada execução só para achar um id é caro. Aqui ele fica na
+tabela 'diagnostics', mantida pelo feed "Diagnostic" do etl.sync (GetFeed
+com versão própria em sync_state: depois da primeira carga, só o que mudou),
+e a busca por nome usa o índice (name NOCASE, por prefixo).
+
+DIAGNOSTICS fixa os ids do que é ingerido (configuráveis por variável de
+ambiente); cada um vira um GetFeed de StatusData com diagnosticSearch
+próprio, sem consultar o catálogo na partida.
+
+    python -m etl.diagnostics odometer            # busca no catálogo local
+    python -m etl.diagnostics --refresh fuel      # alcança o feed antes
+"""
+import argparse
+import os
+
+from sqlalchemy import select
+
+from db.models import engine, Diagnostic
+from etl.bulk import bulk_upsert
+
+DIAGNOSTICS = {
+    "odometer": os.getenv("FORTTIS_ODOMETER_DIAGNOSTIC", "DiagnosticOdometerAdjustmentId"),
+    "engine_hours": os.getenv("FORTTIS_ENGINE_HOURS_DIAGNOSTIC", "DiagnosticEngineHoursAdjustmentId"),
+    "fuel": os.getenv("FORTTIS_FUEL_DIAGNOSTIC", "DiagnosticDeviceTotalFuelId"),
+}
+# odômetro tem tabela própria (odometer_samples); os demais vão para status_samples
+STATUS_KINDS = {diag_id: kind for kind, diag_id in DIAGNOSTICS.items() if kind != "odometer"}
+
+
+def _ref_id(v):
+    return v.get("id") if isinstance(v, dict) else v
+
+
+def _diagnostic_row(d: dict) -> dict:
+    return {"id": d["id"], "name": d.get("name"), "code": d.get("code"),
+            "diagnostic_type": d.get("diagnosticType"), "unit": _ref_id(d.get("unitOfMeasure")),
+            "version": d.get("version")}
+
+
+def normalize_diagnostics(diags: list[dict]) -> list[dict]:
+    return [_diagnostic_row(d) for d in diags if d.get("id")]
+
+
+def write_diagnostics(rows: list[dict]) -> None:
+    if rows:
+        bulk_upsert(Diagnostic.__table__, rows, ["id"])
+
+
+def find(term: str, limit: int = 20) -> list[dict]:
+    """
+    Diagnósticos do catálogo local pelo nome: primeiro os que começam com
+    `term` (índice), depois os que só o contêm. Sem distinguir maiúsculas;
+    `%` e `_` no termo valem como texto (ex.: "Fuel level (%)").
+    """
+    term = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    cols = (Diagnostic.id, Diagnostic.name, Diagnostic.unit)
+    with engine.connect() as conn:
+        found = conn.execute(select(*cols).where(Diagnostic.name.like(f"{term}%", escape="\\"))
+                             .order_by(Diagnostic.name).limit(limit)).all()
+        if len(found) < limit:
+            seen = {r.id for r in found}
+            found += [r for r in conn.execute(select(*cols).where(Diagnostic.name.like(f"%{term}%", escape="\\"))
+                                              .order_by(Diagnostic.name).limit(limit)) if r.id not in seen]
+    return [dict(r._mapping) for r in found[:limit]]
+
+
+def get(diag_id: str) -> dict | None:
+    """Linha do catálogo local (None se o feed ainda não trouxe esse id)."""
+    with engine.connect() as conn:
+        row = conn.execute(select(Diagnostic).where(Diagnostic.id == diag_id)).first()
+    return dict(row._mapping) if row else None
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Busca no catálogo local de Diagnostic.")
+    ap.add_argument("term", help="trecho do nome (ex.: odometer)")
+    ap.add_argument("--refresh", action="store_true", help="alcança o feed Diagnostic antes de buscar")
+    args = ap.parse_args()
+    if args.refresh:
+        from config import get_api
+        from etl import sync  # sync monta os feeds a partir deste módulo
+        feed = next(f for f in sync.default_feeds() if f.entity == "Diagnostic")
+        print(f"Diagnostic: {sync.catch_up(get_api(), feed)} itens novos/alterados.")
+    for kind, diag_id in DIAGNOSTICS.items():
+        print(f"{kind:>12}: {diag_id}")
+    for r in find(args.term):
+        print(f"{r['id']}\t{r['name']}\t{r['unit'] or ''}")
+
+
+if __name__ == "__main__":
+    main()
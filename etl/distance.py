@@ -0,0 +1,88 @@
+"""
+Distância por amostra (coluna delta_km) mantida na ingestão.
+
+    odometer_samples.delta_km: km desde a leitura anterior do hodômetro
+    log_records.delta_km:      km (haversine) desde o ponto GPS anterior
+
+Depois de cada gravação, por device tocado, recalcula o trecho do ponto
+anterior ao lote até o ponto seguinte a ele (amostras fora de ordem mudam
+o delta do vizinho). Distância de uma janela = SUM(delta_km), feito pelos
+rollups diários (etl.rollups).
+
+Os vizinhos são buscados no SQLite; amostras atrasadas para um dia já
+arquivado em Parquet começam um trecho novo (delta 0).
+"""
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from analytics.distance import odometer_deltas, gps_deltas
+from db.models import engine
+
+TABLES = {
+    "odometer_samples": ["odometer_km"],
+    "log_records": ["latitude", "longitude"],
+}
+
+
+def deltas(table: str, df: pd.DataFrame) -> np.ndarray:
+    """delta_km de `df` (um device, ordenado por ts_ms)."""
+    if table == "odometer_samples":
+        return odometer_deltas(df["ts_ms"], df["odometer_km"])
+    # pontos sem coordenada não entram no trajeto (delta 0)
+    out = np.zeros(len(df))
+    ok = (df["latitude"].notna() & df["longitude"].notna()).to_numpy()
+    g = df[ok]
+    out[ok] = gps_deltas(g["ts_ms"], g["latitude"], g["longitude"])
+    return out
+
+
+def _segment(con, table: str, device_key: int, a: int, b: int) -> pd.DataFrame:
+    p = {"k": device_key, "a": a, "b": b}
+    prev = con.execute(text(f"SELECT MAX(ts_ms) FROM {table} WHERE device_key = :k AND ts_ms < :a"), p).scalar()
+    nxt = con.execute(text(f"SELECT MIN(ts_ms) FROM {table} WHERE device_key = :k AND ts_ms > :b"), p).scalar()
+    cols = ", ".join(["ts_ms"] + TABLES[table])
+    df = pd.read_sql(text(f"SELECT {cols} FROM {table} WHERE device_key = :k AND ts_ms BETWEEN :lo AND :hi "
+                          "ORDER BY ts_ms"),
+                     con, params={"k": device_key, "lo": a if prev is None else prev, "hi": b if nxt is None else nxt})
+    df.attrs["has_prev"] = prev is not None
+    return df
+
+
+def update(table: str, rows: list[dict]) -> list[dict]:
+    """
+    Recalcula delta_km em volta das linhas gravadas (normalizadas, com
+    device_id/device_key/ts_ms). Retorna device_id/ts_ms das linhas
+    atualizadas, p/ os rollups saberem quais dias mudaram.
+    """
+    if not rows:
+        return []
+    span: dict[tuple[str, int], list[int]] = {}
+    for r in rows:
+        s = span.setdefault((r["device_id"], r["device_key"]), [r["ts_ms"], r["ts_ms"]])
+        s[0], s[1] = min(s[0], r["ts_ms"]), max(s[1], r["ts_ms"])
+
+    touched = []
+    with engine.begin() as con:
+        for (device_id, device_key), (a, b) in span.items():
+            df = _segment(con, table, device_key, a, b)
+            if df.empty:
+                continue
+            df["delta_km"] = deltas(table, df)
+            if df.attrs["has_prev"]:
+                df = df.iloc[1:]  # o ponto anterior mantém o próprio delta
+            con.exec_driver_sql(f"UPDATE {table} SET delta_km = ? WHERE device_key = ? AND ts_ms = ?",
+                                [(float(d), device_key, int(t)) for t, d in zip(df["ts_ms"], df["delta_km"])])
+            touched.extend({"device_id": device_id, "ts_ms": int(t)} for t in df["ts_ms"])
+    return touched
+
+
+def rebuild(table: str) -> int:
+    """Recalcula delta_km de toda a tabela (um device por vez)."""
+    with engine.connect() as con:
+        devices = con.execute(text(f"SELECT DISTINCT d.id, d.key FROM {table} t JOIN devices d ON d.key = t.device_key")).all()
+    n = 0
+    for device_id, device_key in devices:
+        n += len(update(table, [{"device_id": device_id, "device_key": device_key, "ts_ms": t}
+                                for t in (-2**62, 2**62)]))
+    return n
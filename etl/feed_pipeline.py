@@ -0,0 +1,184 @@
+"""
+Pipeline em estágios para ingestão de GetFeed.
+
+    fetch (GetFeed) --q--> transform (normalização) --q--> write (SQLite)
+
+Cada estágio roda em sua thread, ligados por filas limitadas: enquanto uma
+página é gravada, a seguinte já está sendo normalizada e a outra baixada.
+Há um único writer (o SQLite aceita um escritor por vez), e o toVersion só
+é persistido depois que a página correspondente foi gravada.
+
+`FeedPipeline.stats()` expõe vazão e tempo ocupado por estágio e a
+profundidade das filas, para identificar o gargalo em catch-ups longos.
+"""
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+
+from etl.bulk import UpsertResult
+
+log = logging.getLogger("forttis.sync")
+
+_DONE = object()
+
+
+@dataclass
+class StageStats:
+    name: str
+    pages: int = 0
+    rows: int = 0
+    busy_seconds: float = 0.0
+    depth_sum: int = 0       # profundidade da fila de entrada, somada a cada página
+    depth_max: int = 0
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.busy_seconds if self.busy_seconds > 0 else 0.0
+
+    @property
+    def avg_depth(self) -> float:
+        return self.depth_sum / self.pages if self.pages else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "stage": self.name, "pages": self.pages, "rows": self.rows,
+            "busy_s": round(self.busy_seconds, 3), "rows_per_s": round(self.rows_per_sec, 1),
+            "queue_avg": round(self.avg_depth, 2), "queue_max": self.depth_max,
+        }
+
+
+class FeedPipeline:
+    """
+    Executa um catch-up de GetFeed em estágios sobrepostos.
+
+    - fetch(from_version) -> (items, to_version, has_more)
+    - normalize(items) -> rows
+    - write(rows)            (chamado só na thread de escrita; se devolver um
+                              UpsertResult, conta o que foi gravado — o writer
+                              pode descartar linhas, ex.: regras fora do conjunto)
+    - commit(to_version)     (persiste o cursor após a gravação)
+    """
+
+    def __init__(self, fetch, normalize, write, commit, from_version=None, queue_size: int = 2):
+        self._fetch = fetch
+        self._normalize = normalize
+        self._write = write
+        self._commit = commit
+        self._from_version = from_version
+        self._q_raw = queue.Queue(maxsize=queue_size)
+        self._q_rows = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._errors: list[BaseException] = []
+        self.fetch_stats = StageStats("fetch")
+        self.transform_stats = StageStats("transform")
+        self.write_stats = StageStats("write")
+
+    # ---- utilitários de fila que respeitam o sinal de parada ----
+    def _put(self, q, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q, stats: StageStats):
+        depth = q.qsize()
+        while not self._stop.is_set():
+            try:
+                item = q.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            if item is not _DONE:
+                stats.depth_sum += depth
+                stats.depth_max = max(stats.depth_max, depth)
+            return item
+        return _DONE
+
+    def _fail(self, e: BaseException) -> None:
+        self._errors.append(e)
+        self._stop.set()
+
+    # ---- estágios ----
+    def _fetch_stage(self):
+        version = self._from_version
+        try:
+            while not self._stop.is_set():
+                t0 = time.perf_counter()
+                items, to_version, has_more = self._fetch(version)
+                self.fetch_stats.busy_seconds += time.perf_counter() - t0
+                self.fetch_stats.pages += 1
+                self.fetch_stats.rows += len(items)
+                if not self._put(self._q_raw, (items, to_version)):
+                    return
+                version = to_version or version
+                if not has_more:
+                    break
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._put(self._q_raw, _DONE)
+
+    def _transform_stage(self):
+        try:
+            while True:
+                msg = self._get(self._q_raw, self.transform_stats)
+                if msg is _DONE:
+                    break
+                items, to_version = msg
+                t0 = time.perf_counter()
+                rows = self._normalize(items) if items else []
+                self.transform_stats.busy_seconds += time.perf_counter() - t0
+                self.transform_stats.pages += 1
+                self.transform_stats.rows += len(rows)
+                if not self._put(self._q_rows, (rows, to_version)):
+                    return
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._put(self._q_rows, _DONE)
+
+    def _write_stage(self):
+        while True:
+            msg = self._get(self._q_rows, self.write_stats)
+            if msg is _DONE:
+                break
+            rows, to_version = msg
+            t0 = time.perf_counter()
+            written = self._write(rows) if rows else None
+            if to_version:
+                self._commit(to_version)
+            self.write_stats.busy_seconds += time.perf_counter() - t0
+            self.write_stats.pages += 1
+            self.write_stats.rows += written.total if isinstance(written, UpsertResult) else len(rows)
+
+    def run(self) -> int:
+        """Roda até o fetch alcançar a cabeça. Retorna linhas gravadas; relança erros de estágio."""
+        threads = [
+            threading.Thread(target=self._fetch_stage, name="feed-fetch", daemon=True),
+            threading.Thread(target=self._transform_stage, name="feed-transform", daemon=True),
+        ]
+        for t in threads:
+            t.start()
+        try:
+            self._write_stage()
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._stop.set()
+            for t in threads:
+                t.join()
+        if self._errors:
+            raise self._errors[0]
+        return self.write_stats.rows
+
+    def stats(self) -> list[dict]:
+        return [s.as_dict() for s in (self.fetch_stats, self.transform_stats, self.write_stats)]
+
+    def bottleneck(self) -> str:
+        """Estágio com mais tempo ocupado (o que limita a vazão)."""
+        return max((self.fetch_stats, self.transform_stats, self.write_stats),
+                   key=lambda s: s.busy_seconds).name
@@ -0,0 +1,258 @@
+"""
+Backfill histórico da frota inteira em paralelo.
+
+    python -m etl.fleet_backfill --days 90                   # todos os devices, feeds de TYPES
+    python -m etl.fleet_backfill --days 30 --type LogRecord --device b1 --device b2
+    python -m etl.fleet_backfill --days 90 --workers 16 --rate 20
+
+O período é dividido em shards (feed x device x SHARD_DAYS dias UTC). Um pool
+limitado de workers baixa os shards (Get em fatias adaptativas, etl.backfill)
+e normaliza as linhas; todas as chamadas passam por um limitador global de
+taxa (token bucket), abaixo da cota da Geotab. A gravação fica numa única
+thread (a principal), que recebe as páginas por uma fila limitada — o
+SQLite aceita um escritor por vez e a fila segura a memória.
+
+Shard gravado por completo vira uma linha em 'backfill_shards'; rodar de novo
+pula os concluídos (os dias são alinhados em UTC, então o mesmo --days
+encontra os mesmos shards). Shard que falha fica de fora e é refeito na
+próxima execução; os upserts são idempotentes.
+"""
+import argparse
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from config import get_api
+from db.models import engine, BackfillShard, Device, to_epoch_ms
+from etl.backfill import RESULTS_LIMIT, slices
+from etl.bulk import UpsertResult
+from etl.devices import save_devices
+from etl.sync import Feed, default_feeds
+import perf
+
+log = logging.getLogger("forttis.backfill")
+
+TYPES = ["LogRecord", "StatusData", "ExceptionEvent"]  # telemetria; catálogos (Device, Rule, ...) só pelo sync
+WORKERS = 8
+RATE = 10.0            # chamadas/s somando todos os workers
+SHARD_DAYS = 1
+PROGRESS_SECONDS = 5.0
+
+_DONE = object()
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class RateLimiter:
+    """Token bucket compartilhado entre threads: até `rate` chamadas/s, rajadas de até `burst`."""
+
+    def __init__(self, rate: float, burst: float | None = None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self._t = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self._t) * self.rate)
+                self._t = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class _LimitedAPI:
+    """Repassa get/call/multi_call à API depois de passar pelo limitador."""
+
+    def __init__(self, api, limiter: RateLimiter):
+        self._api = api
+        self._limiter = limiter
+
+    def get(self, type_name, **parameters):
+        self._limiter.acquire()
+        return self._api.get(type_name, **parameters)
+
+    def call(self, method, **parameters):
+        self._limiter.acquire()
+        return self._api.call(method, **parameters)
+
+    def multi_call(self, calls):
+        self._limiter.acquire()
+        return self._api.multi_call(calls)
+
+
+@dataclass(frozen=True)
+class Shard:
+    type_name: str        # Feed.entity (ex.: "StatusData:fuel"); typeName da API vem do feed
+    device_id: str
+    start: datetime
+    end: datetime
+
+
+def plan(feeds: list[Feed], device_ids: list[str], start: datetime, end: datetime,
+         shard_days: int = SHARD_DAYS) -> list[Shard]:
+    """
+    Shards cobrindo [start, end), com fronteiras em múltiplos de shard_days a
+    partir de 00:00 UTC (de 1970): o primeiro começa na fronteira anterior a
+    `start`, não em `start` — assim `now - days` de outra execução cai nos
+    mesmos shards (mesmo start_ms em backfill_shards). Só o último é cortado
+    em `end`, e por isso é refeito enquanto não estiver completo.
+    """
+    step = timedelta(days=shard_days)
+    t = _EPOCH + (start - _EPOCH) // step * step
+    bounds = []
+    while t < end:
+        bounds.append((t, min(t + step, end)))
+        t += step
+    # ordem: fatia de tempo mais antiga primeiro, intercalando devices
+    return [Shard(f.entity, did, a, b) for a, b in bounds for f in feeds for did in device_ids]
+
+
+def done_shards(type_names: list[str]) -> dict[tuple, int]:
+    """(type_name, device_id, start_ms) -> end_ms dos shards concluídos."""
+    t = BackfillShard.__table__
+    with engine.connect() as conn:
+        rows = conn.execute(select(t.c.type_name, t.c.device_id, t.c.start_ms, t.c.end_ms)
+                            .where(t.c.type_name.in_(type_names))).all()
+    return {(r.type_name, r.device_id, r.start_ms): r.end_ms for r in rows}
+
+
+def mark_done(shard: Shard, rows: int) -> None:
+    values = dict(type_name=shard.type_name, device_id=shard.device_id, start_ms=to_epoch_ms(shard.start),
+                  end_ms=to_epoch_ms(shard.end), rows=rows, finished_at=datetime.now(timezone.utc))
+    stmt = sqlite_insert(BackfillShard.__table__).values(**values)
+    stmt = stmt.on_conflict_do_update(index_elements=["type_name", "device_id", "start_ms"], set_=values)
+    with engine.begin() as conn:
+        conn.execute(stmt)
+
+
+def _pending(shards: list[Shard]) -> list[Shard]:
+    done = done_shards(sorted({s.type_name for s in shards}))
+    return [s for s in shards
+            if done.get((s.type_name, s.device_id, to_epoch_ms(s.start)), -1) < to_epoch_ms(s.end)]
+
+
+def _device_ids(api, only: list[str] | None) -> list[str]:
+    """Devices da frota (atualiza a tabela 'devices' com um Get de Device)."""
+    save_devices(api.get("Device"))
+    if only:
+        return list(only)
+    with engine.connect() as conn:
+        return list(conn.execute(select(Device.id).order_by(Device.id)).scalars())
+
+
+def run(api, start: datetime, end: datetime, feeds: list[Feed] | None = None,
+        device_ids: list[str] | None = None, workers: int = WORKERS, rate: float = RATE,
+        shard_days: int = SHARD_DAYS, results_limit: int = RESULTS_LIMIT, restart: bool = False) -> dict:
+    """
+    Baixa e grava os shards pendentes de [start, end). Retorna um resumo
+    (shards feitos/falhos, linhas, segundos).
+    """
+    feeds = feeds or [f for f in default_feeds() if f.type_name in TYPES]
+    by_type = {f.entity: f for f in feeds}
+    limited = _LimitedAPI(api, RateLimiter(rate))
+    ids = _device_ids(limited, device_ids)
+    shards = plan(feeds, ids, start, end, shard_days)
+    todo = shards if restart else _pending(shards)
+    log.info("%d shards (%d devices x %d tipos), %d pendentes; %d workers, %.1f chamadas/s",
+             len(shards), len(ids), len(feeds), len(todo), workers, rate)
+
+    q: queue.Queue = queue.Queue(maxsize=workers * 2)
+    stop = threading.Event()
+
+    def put(msg) -> None:
+        while not stop.is_set():
+            try:
+                q.put(msg, timeout=0.2)
+                return
+            except queue.Full:
+                continue
+
+    def work(shard: Shard) -> None:
+        feed = by_type[shard.type_name]
+        search = {**(feed.search or {}), "deviceSearch": {"id": shard.device_id}}
+        if stop.is_set():
+            return
+        try:
+            for sl in slices(limited, feed.type_name, shard.start, shard.end, search,
+                             results_limit, shard.end - shard.start):
+                if stop.is_set():
+                    return
+                if sl.items:
+                    put((shard, feed.normalize(sl.items)))
+            put((shard, _DONE))
+        except Exception as e:
+            put((shard, e))
+
+    stats = {"shards": len(todo), "done": 0, "failed": 0, "rows": 0}
+    per_shard: dict[Shard, int] = {}
+    t0 = last_log = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backfill") as pool:
+        for shard in todo:
+            pool.submit(work, shard)
+        try:
+            remaining = len(todo)
+            while remaining:
+                shard, msg = q.get()
+                if msg is _DONE:
+                    mark_done(shard, per_shard.pop(shard, 0))
+                    stats["done"] += 1
+                    remaining -= 1
+                elif isinstance(msg, Exception):
+                    log.warning("%s %s %s: falhou (%s); fica para a próxima execução", shard.type_name,
+                                shard.device_id, shard.start.date(), msg)
+                    per_shard.pop(shard, None)
+                    stats["failed"] += 1
+                    remaining -= 1
+                else:
+                    res = by_type[shard.type_name].write(msg, limited)
+                    n = res.total if isinstance(res, UpsertResult) else len(msg)  # gravadas, depois dos filtros
+                    per_shard[shard] = per_shard.get(shard, 0) + n
+                    stats["rows"] += n
+
+                now = time.perf_counter()
+                if now - last_log >= PROGRESS_SECONDS or not remaining:
+                    last_log = now
+                    log.info("shards %d/%d (%d falhas) | %d linhas | %.0f linhas/s", stats["done"],
+                             len(todo), stats["failed"], stats["rows"], stats["rows"] / (now - t0))
+        finally:
+            stop.set()  # libera workers presos na fila se a gravação falhar
+            pool.shutdown(wait=False, cancel_futures=True)
+    stats["seconds"] = round(time.perf_counter() - t0, 1)
+    perf.flush("backfill:fleet")
+    return stats
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Backfill histórico da frota (paralelo, retomável).")
+    ap.add_argument("--days", type=int, default=30, help="dias para trás a partir de agora")
+    ap.add_argument("--type", action="append", choices=TYPES,
+                    help="repetível (padrão: os três)")
+    ap.add_argument("--device", action="append", help="repetível (padrão: todos)")
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    ap.add_argument("--rate", type=float, default=RATE, help="chamadas/s à API (todos os workers)")
+    ap.add_argument("--shard-days", type=int, default=SHARD_DAYS)
+    ap.add_argument("--restart", action="store_true", help="refaz também os shards já concluídos")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    feeds = [f for f in default_feeds() if f.type_name in (args.type or TYPES)]
+    end = datetime.now(timezone.utc)
+    stats = run(get_api(), end - timedelta(days=args.days), end, feeds, args.device, args.workers,
+                args.rate, args.shard_days, restart=args.restart)
+    print(stats)
+
+
+if __name__ == "__main__":
+    main()
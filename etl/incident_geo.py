@@ -0,0 +1,74 @@
+"""
+Geolocalização de incidentes na ingestão.
+
+Cada ExceptionEvent recebe latitude/longitude do LogRecord mais próximo no
+tempo (±5 min, mesmo device), via merge_asof (analytics.geo.locate_events).
+Roda em dois momentos:
+  - ao gravar eventos: posiciona os eventos recém-gravados;
+  - ao gravar pontos: posiciona eventos pendentes (sem posição) que caem na
+    janela dos pontos novos, p/ quando o GPS chega depois do evento.
+Assim o mapa de incidentes do dashboard é um SELECT simples.
+"""
+import pandas as pd
+from sqlalchemy import text
+
+from analytics.geo import locate_events, INCIDENT_TOLERANCE_MS
+from db import queries, versions
+from db.models import engine
+from etl.rollups import pairs_from_rows
+
+_IN_BATCH = 500
+
+
+def _update(located: pd.DataFrame) -> int:
+    found = located.dropna(subset=["latitude", "longitude"])
+    if found.empty:
+        return 0
+    params = [{"id": r.id, "lat": float(r.latitude), "lon": float(r.longitude)}
+              for r in found.itertuples(index=False)]
+    with engine.begin() as con:
+        con.execute(text("UPDATE exception_events SET latitude = :lat, longitude = :lon WHERE id = :id"), params)
+        versions.bump(pairs_from_rows(found[["device_id", "ts_ms"]].to_dict("records")), con)
+    return len(params)
+
+
+def locate(events: pd.DataFrame) -> int:
+    """Posiciona `events` (id, device_id, ts_ms) e grava. Retorna quantos foram posicionados."""
+    if events.empty:
+        return 0
+    pts = queries.load_points_near(events, INCIDENT_TOLERANCE_MS, bind=engine)
+    return _update(locate_events(events, pts))
+
+
+def locate_rows(rows: list[dict]) -> int:
+    """Após gravar eventos (linhas normalizadas de exception_events)."""
+    return locate(pd.DataFrame([{k: r[k] for k in ("id", "device_id", "ts_ms")} for r in rows]))
+
+
+def resolve_pending(device_ids=None, ms_from: int | None = None, ms_to: int | None = None) -> int:
+    """Eventos ainda sem posição (opcionalmente só de `device_ids`/janela)."""
+    sql = "SELECT id, device_id, ts_ms FROM exception_events WHERE latitude IS NULL AND ts_ms IS NOT NULL"
+    params = {}
+    if ms_from is not None and ms_to is not None:
+        sql += " AND ts_ms BETWEEN :a AND :b"
+        params.update(a=ms_from - INCIDENT_TOLERANCE_MS, b=ms_to + INCIDENT_TOLERANCE_MS)
+    if device_ids is None:
+        pending = pd.read_sql(text(sql), engine, params=params)
+    else:
+        ids = sorted(device_ids)
+        frames = []
+        for i in range(0, len(ids), _IN_BATCH):
+            part = ids[i:i + _IN_BATCH]
+            marks = ", ".join(f":d{j}" for j in range(len(part)))
+            frames.append(pd.read_sql(text(sql + f" AND device_id IN ({marks})"), engine,
+                                      params={**params, **{f"d{j}": d for j, d in enumerate(part)}}))
+        pending = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    return locate(pending)
+
+
+def resolve_for_points(rows: list[dict]) -> int:
+    """Após gravar pontos (linhas normalizadas de log_records)."""
+    if not rows:
+        return 0
+    ts = [r["ts_ms"] for r in rows]
+    return resolve_pending({r["device_id"] for r in rows}, min(ts), max(ts))
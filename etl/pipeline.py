@@ -1,34 +1,11 @@
 from datetime import datetime
-from sqlalchemy.exc import IntegrityError
-from db.models import get_session, Device, LogRecord, ExceptionEvent
-from config import get_api
-from db.models import get_session, Device, LogRecord, ExceptionEvent, OdometerSample
-from config import get_api
-
-def _upsert_devices(session, api, device_ids: set[str]) -> None:
-    """Garante que os devices existem na tabela 'devices' (busca 1 a 1 para evitar erros)."""
-    if not device_ids:
-        return
-    for did in device_ids:
-        if not did:
-            continue
-        try:
-            res = api.get("Device", search={"id": did})
-        except Exception:
-            continue
-        if not res:
-            continue
-        d = res[0]
-        obj = session.get(Device, d["id"]) or Device(id=d["id"])
-        obj.name = d.get("name")
-        # Se você tiver a coluna no banco:
-        if hasattr(obj, "serial_number"):
-            obj.serial_number = d.get("serialNumber")
-        session.merge(obj)
-    try:
-        session.commit()
-    except IntegrityError:
-        session.rollback()
+from db.models import LogRecord, OdometerSample, StatusSample, ExceptionEvent, to_epoch_ms
+from db import spatial, versions
+from etl.bulk import bulk_upsert, UpsertResult, DEFAULT_CHUNK_SIZE
+from etl.devices import ensure_devices, device_keys
+from etl.diagnostics import STATUS_KINDS
+from etl import distance, incident_geo, rollups, rules, trips
+import perf
 
 def _parse_dt(dtval):
     if isinstance(dtval, datetime):
@@ -37,47 +14,62 @@ def _parse_dt(dtval):
         return datetime.fromisoformat(dtval.replace("Z", "+00:00"))
     return None
 
-def save_logrecords(items: list[dict]) -> int:
-    """
-    Salva uma lista de LogRecord vindos da API.
-    - Garante devices na tabela 'devices'
-    - Normaliza datetime/lat/lon/speed
-    - Usa PK estável: f"{device_id}|{date_time_iso}"
-    Retorna quantidade de registros gravados/atualizados.
-    """
-    s = get_session()
+def _device_id(raw: dict):
+    dev = raw.get("device")
+    return dev.get("id") if isinstance(dev, dict) else dev
 
+def _ensure_devices(rows: list[dict], api=None) -> None:
+    """Garante devices das linhas normalizadas via catálogo em cache (API só para ids desconhecidos)."""
+    ensure_devices({r["device_id"] for r in rows}, api=api)
 
-def _parse_dt_iso(dtval):
-    from datetime import datetime
-    if isinstance(dtval, datetime):
-        return dtval
-    if isinstance(dtval, str):
-        return datetime.fromisoformat(dtval.replace("Z", "+00:00"))
-    return None
+def _attach_keys(rows: list[dict]) -> None:
+    """Telemetria: acrescenta device_key (devices.key) a cada linha normalizada."""
+    keys = device_keys({r["device_id"] for r in rows})
+    for r in rows:
+        r["device_key"] = keys[r["device_id"]]
 
-def save_odometer_samples(items: list[dict]) -> int:
-    """
-    Salva samples de odômetro (em km) a partir de StatusData.
-    Espera itens com campos: device, dateTime, data (numérico), diagnostic (opcional).
-    """
-    s = get_session()
-    # garantir devices
-    dev_ids = set()
-    for r in items:
-        dev = r.get("device")
-        dev_ids.add(dev.get("id") if isinstance(dev, dict) else dev)
-    dev_ids.discard(None)
-    if dev_ids:
-        _upsert_devices(s, get_api(), dev_ids)
-
-    saved = 0
+def _table_rows(table, rows: list[dict]) -> list[dict]:
+    """Só as colunas de `table` (as linhas levam device_id para as etapas seguintes)."""
+    cols = [c for c in table.c.keys() if c in rows[0]] if rows else []
+    return [{c: r[c] for c in cols} for r in rows]
+
+def _logrecord_rows(items: list[dict]):
+    """Normaliza LogRecords da API em linhas da tabela 'log_records'."""
+    for raw in items:
+        device_id = _device_id(raw)
+        if not device_id:
+            continue
+
+        dt_utc = _parse_dt(raw.get("dateTime") or raw.get("DateTime"))
+        if not dt_utc:
+            continue
+
+        lat = raw.get("latitude") or raw.get("Latitude")
+        lon = raw.get("longitude") or raw.get("Longitude")
+        spd = raw.get("speed") or raw.get("Speed")
+        try:
+            lat = float(lat) if lat is not None else None
+            lon = float(lon) if lon is not None else None
+            spd = float(spd) if spd is not None else None
+        except Exception:
+            continue
+
+        yield {
+            # chave (device, ts_ms): o mesmo ponto recebido de novo atualiza a linha
+            "device_id": device_id,
+            "ts_ms": to_epoch_ms(dt_utc),
+            "latitude": lat,
+            "longitude": lon,
+            "speed": spd,
+        }
+
+def _odometer_rows(items: list[dict]):
+    """Normaliza StatusData de odômetro em linhas da tabela 'odometer_samples'."""
     for raw in items:
-        dev = raw.get("device")
-        device_id = dev.get("id") if isinstance(dev, dict) else dev
+        device_id = _device_id(raw)
         if not device_id:
             continue
-        dt = _parse_dt_iso(raw.get("dateTime") or raw.get("DateTime"))
+        dt = _parse_dt(raw.get("dateTime") or raw.get("DateTime"))
         if not dt:
             continue
 
@@ -96,57 +88,182 @@ def save_odometer_samples(items: list[dict]) -> int:
         else:
             odo_km = v
 
-        pk = f"{device_id}|{dt.isoformat()}"
-        s.merge(OdometerSample(id=pk, device_id=device_id, date_time=dt, odometer_km=odo_km))
-        saved += 1
-
-    s.commit()
-    return saved    
-
-    # 1) garantir devices
-    dev_ids = set()
-    for r in items:
-        dev = r.get("device")
-        dev_ids.add(dev.get("id") if isinstance(dev, dict) else dev)
-    dev_ids.discard(None)
-    if dev_ids:
-        _upsert_devices(s, get_api(), dev_ids)
+        yield {
+            "device_id": device_id,
+            "ts_ms": to_epoch_ms(dt),
+            "odometer_km": odo_km,
+        }
 
-    # 2) salvar logrecords
-    saved = 0
+def _status_rows(items: list[dict]):
+    """Normaliza StatusData dos demais diagnósticos configurados em linhas de 'status_samples'."""
     for raw in items:
-        dev = raw.get("device")
-        device_id = dev.get("id") if isinstance(dev, dict) else dev
-        if not device_id:
+        device_id = _device_id(raw)
+        diag = raw.get("diagnostic")
+        kind = STATUS_KINDS.get(diag.get("id") if isinstance(diag, dict) else diag)
+        if not device_id or kind is None:
             continue
-
-        dt_utc = _parse_dt(raw.get("dateTime") or raw.get("DateTime"))
-        if not dt_utc:
+        dt = _parse_dt(raw.get("dateTime") or raw.get("DateTime"))
+        if not dt:
             continue
-
-        lat = raw.get("latitude") or raw.get("Latitude")
-        lon = raw.get("longitude") or raw.get("Longitude")
-        spd = raw.get("speed") or raw.get("Speed")
         try:
-            lat = float(lat) if lat is not None else None
-            lon = float(lon) if lon is not None else None
-            spd = float(spd) if spd is not None else None
+            v = float(raw.get("data"))
         except Exception:
             continue
+        yield {
+            "device_id": device_id,
+            "kind": kind,
+            "ts_ms": to_epoch_ms(dt),
+            "value": v,
+        }
+
+def _exception_rows(items: list[dict]):
+    """Normaliza ExceptionEvents da API em linhas da tabela 'exception_events'."""
+    for raw in items:
+        ev_id = raw.get("id")
+        device_id = _device_id(raw)
+        if not ev_id or not device_id:
+            continue
+        dt = _parse_dt(raw.get("activeFrom") or raw.get("dateTime"))
+        if not dt:
+            continue
+        # a Geotab manda só o id da regra: o nome vem do dicionário (etl.rules) na gravação
+        rule = raw.get("rule")
+        if isinstance(rule, dict):
+            rule_id, rule_name = rule.get("id"), rule.get("name")
+        else:
+            rule_id, rule_name = rule, None
+        yield {
+            "id": ev_id,
+            "device_id": device_id,
+            "rule_id": rule_id,
+            "rule_name": rule_name,
+            "severity": raw.get("severity"),
+            "date_time": dt,
+            "ts_ms": to_epoch_ms(dt),
+        }
+
+# ===== normalização (CPU, sem I/O) e gravação (SQLite) =====
+# Separadas para o pipeline em estágios (etl.feed_pipeline) poder normalizar
+# a página seguinte enquanto a anterior é gravada.
+
+# cada etapa medida como "etl:<tabela>.<etapa>" (perf, só com FORTTIS_PERF=1)
+
+@perf.timed("etl:log_records.normalize")
+def normalize_logrecords(items: list[dict]) -> list[dict]:
+    return list(_logrecord_rows(items))
+
+@perf.timed("etl:odometer_samples.normalize")
+def normalize_odometer_samples(items: list[dict]) -> list[dict]:
+    return list(_odometer_rows(items))
+
+@perf.timed("etl:status_samples.normalize")
+def normalize_status_samples(items: list[dict]) -> list[dict]:
+    return list(_status_rows(items))
 
-        # PK estável por device_id+date_time
-        pk = f"{device_id}|{dt_utc.isoformat()}"
-
-        rec = LogRecord(
-            id=pk,
-            device_id=device_id,
-            date_time=dt_utc,
-            latitude=lat,
-            longitude=lon,
-            speed=spd,
-        )
-        s.merge(rec)
-        saved += 1
-
-    s.commit()
-    return saved
\ No newline at end of file
+@perf.timed("etl:exception_events.normalize")
+def normalize_exception_events(items: list[dict]) -> list[dict]:
+    return list(_exception_rows(items))
+
+def write_logrecords(rows: list[dict], chunk_size: int = DEFAULT_CHUNK_SIZE, api=None) -> UpsertResult:
+    with perf.timer("etl:log_records.devices"):
+        _ensure_devices(rows, api)
+        _attach_keys(rows)
+    with perf.timer("etl:log_records.upsert"):
+        res = bulk_upsert(LogRecord.__table__, _table_rows(LogRecord.__table__, rows),
+                          ["device_key", "ts_ms"], chunk_size=chunk_size)
+    with perf.timer("etl:log_records.incident_geo"):
+        incident_geo.resolve_for_points(rows)  # incidentes que esperavam por estes pontos
+    with perf.timer("etl:log_records.distance"):
+        touched = distance.update("log_records", rows)
+    with perf.timer("etl:log_records.rollups"):
+        pairs = rollups.pairs_from_rows(rows + touched)
+        rollups.refresh_devices(pairs)
+    with perf.timer("etl:log_records.grid"):
+        rollups.refresh_cells(rollups.pairs_from_rows(rows))
+    with perf.timer("etl:log_records.spatial"):
+        spatial.index_rows(rows)
+    with perf.timer("etl:log_records.trips"):
+        trips.update(rows)  # depois do distance: km da viagem = SUM(delta_km)
+    with perf.timer("etl:log_records.versions"):
+        versions.bump(pairs)  # por último: dias que o cache do dashboard descarta
+    perf.count("etl:log_records.rows", len(rows))
+    return res
+
+def write_odometer_samples(rows: list[dict], chunk_size: int = DEFAULT_CHUNK_SIZE, api=None) -> UpsertResult:
+    with perf.timer("etl:odometer_samples.devices"):
+        _ensure_devices(rows, api)
+        _attach_keys(rows)
+    with perf.timer("etl:odometer_samples.upsert"):
+        res = bulk_upsert(OdometerSample.__table__, _table_rows(OdometerSample.__table__, rows),
+                          ["device_key", "ts_ms"], chunk_size=chunk_size)
+    with perf.timer("etl:odometer_samples.distance"):
+        touched = distance.update("odometer_samples", rows)
+    with perf.timer("etl:odometer_samples.rollups"):
+        pairs = rollups.pairs_from_rows(rows + touched)
+        rollups.refresh_devices(pairs)
+    with perf.timer("etl:odometer_samples.versions"):
+        versions.bump(pairs)
+    perf.count("etl:odometer_samples.rows", len(rows))
+    return res
+
+def write_status_samples(rows: list[dict], chunk_size: int = DEFAULT_CHUNK_SIZE, api=None) -> UpsertResult:
+    with perf.timer("etl:status_samples.devices"):
+        _ensure_devices(rows, api)
+        _attach_keys(rows)
+    with perf.timer("etl:status_samples.upsert"):
+        res = bulk_upsert(StatusSample.__table__, _table_rows(StatusSample.__table__, rows),
+                          ["device_key", "kind", "ts_ms"], chunk_size=chunk_size)
+    perf.count("etl:status_samples.rows", len(rows))
+    return res
+
+def write_exception_events(rows: list[dict], chunk_size: int = DEFAULT_CHUNK_SIZE, api=None) -> UpsertResult:
+    with perf.timer("etl:exception_events.rules"):
+        rows = rules.apply(rows, api)  # nome da regra, só o conjunto configurado, severidade normalizada
+    with perf.timer("etl:exception_events.devices"):
+        _ensure_devices(rows, api)
+    with perf.timer("etl:exception_events.upsert"):
+        res = bulk_upsert(ExceptionEvent.__table__, _table_rows(ExceptionEvent.__table__, rows), ["id"],
+                          chunk_size=chunk_size)
+    with perf.timer("etl:exception_events.incident_geo"):
+        incident_geo.locate_rows(rows)  # posição do incidente resolvida uma vez, na ingestão
+    with perf.timer("etl:exception_events.rollups"):
+        rollups.refresh_incidents(rollups.pairs_from_rows(rows))
+    with perf.timer("etl:exception_events.versions"):
+        versions.bump(rollups.pairs_from_rows(rows))
+    perf.count("etl:exception_events.rows", len(rows))
+    return res
+
+def save_logrecords(items: list[dict], chunk_size: int = DEFAULT_CHUNK_SIZE, api=None) -> UpsertResult:
+    """
+    Salva uma lista de LogRecord vindos da API.
+    - Garante devices na tabela 'devices' (`api` opcional, só usada p/ devices desconhecidos)
+    - Normaliza datetime/lat/lon/speed
+    - Chave (device_key, ts_ms): devices.key no lugar do id texto da Geotab
+    - Grava em lote (INSERT ... ON CONFLICT DO UPDATE), `chunk_size` linhas por transação
+    Retorna UpsertResult (novos x atualizados, linhas/s).
+    """
+    return write_logrecords(normalize_logrecords(items), chunk_size, api)
+
+def save_odometer_samples(items: list[dict], chunk_size: int = DEFAULT_CHUNK_SIZE, api=None) -> UpsertResult:
+    """
+    Salva samples de odômetro (em km) a partir de StatusData.
+    Espera itens com campos: device, dateTime, data (numérico), diagnostic (opcional).
+    Grava em lote, `chunk_size` linhas por transação. Retorna UpsertResult.
+    """
+    return write_odometer_samples(normalize_odometer_samples(items), chunk_size, api)
+
+def save_status_samples(items: list[dict], chunk_size: int = DEFAULT_CHUNK_SIZE, api=None) -> UpsertResult:
+    """
+    Salva StatusData de horas de motor/combustível (etl.diagnostics.DIAGNOSTICS)
+    em 'status_samples', valor cru. Itens de outros diagnósticos são ignorados.
+    """
+    return write_status_samples(normalize_status_samples(items), chunk_size, api)
+
+def save_exception_events(items: list[dict], chunk_size: int = DEFAULT_CHUNK_SIZE, api=None) -> UpsertResult:
+    """
+    Salva ExceptionEvents (Get ou GetFeed) em 'exception_events'.
+    - Nome da regra pelo dicionário em cache (etl.rules; `api` só para regra desconhecida)
+    - Só as regras de FORTTIS_RULES; severidade normalizada
+    PK: id nativo do evento na Geotab. Retorna UpsertResult.
+    """
+    return write_exception_events(normalize_exception_events(items), chunk_size, api)
@@ -0,0 +1,209 @@
+"""
+Rollups diários por device (dia local America/Sao_Paulo).
+
+    daily_device_stats:   pontos, primeiro/último ts_ms, hodômetro mín/máx e km do dia
+                          (soma dos delta_km, ver etl.distance)
+    daily_incident_stats: contagem de incidentes por regra/severidade
+    daily_grid_cells:     pontos por célula da grade (analytics.grid), p/ o mapa de calor
+
+Mantidos pelos savers (etl.pipeline): depois de cada gravação, só os pares
+(device, dia) tocados são recalculados a partir da telemetria (SQLite +
+Parquet). Recalcular o dia inteiro, em vez de somar deltas, mantém o rollup
+correto com upserts repetidos e dados atrasados.
+
+    python -m etl.rollups          # reconstrói tudo (ex.: depois da migração 004)
+"""
+import numpy as np
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytz
+from sqlalchemy import text
+
+from analytics import grid
+from db import cold, versions
+from db.models import engine
+
+LOCAL_TZ = pytz.timezone("America/Sao_Paulo")
+
+# telemetria é chaveada por devices.key; os rollups seguem pelo id da Geotab
+_DEVICE_KEY = "(SELECT key FROM devices WHERE id = :d)"
+
+
+def local_day(ts_ms: int) -> str:
+    return datetime.fromtimestamp(ts_ms / 1000, tz=LOCAL_TZ).strftime("%Y-%m-%d")
+
+
+def day_bounds_ms(day: str) -> tuple[int, int]:
+    """[início, fim) do dia local em epoch-ms UTC."""
+    d = datetime.strptime(day, "%Y-%m-%d")
+    a = LOCAL_TZ.localize(d)
+    b = LOCAL_TZ.localize(d + timedelta(days=1))
+    return int(a.timestamp() * 1000), int(b.timestamp() * 1000)
+
+
+def pairs_from_rows(rows: list[dict]) -> set[tuple[str, str]]:
+    """(device_id, dia local) das linhas normalizadas (vetorizado)."""
+    if not rows:
+        return set()
+    df = pd.DataFrame({"device_id": [r["device_id"] for r in rows], "ts_ms": [r["ts_ms"] for r in rows]})
+    df = df.dropna().drop_duplicates()
+    days = (pd.to_datetime(df["ts_ms"].astype("int64"), unit="ms", utc=True)
+              .dt.tz_convert(LOCAL_TZ).dt.strftime("%Y-%m-%d"))
+    return set(zip(df["device_id"].astype(str), days))
+
+
+def _device_day(con, device_id: str, day: str) -> dict | None:
+    a, b = day_bounds_ms(day)
+    p = {"d": device_id, "a": a, "b": b}
+    n, first, last, gps_km = con.execute(text(
+        "SELECT COUNT(*), MIN(ts_ms), MAX(ts_ms), TOTAL(delta_km) FROM log_records "
+        f"WHERE device_key = {_DEVICE_KEY} AND ts_ms >= :a AND ts_ms < :b"), p).one()
+    n_odo, lo, hi, odo_km = con.execute(text(
+        "SELECT COUNT(*), MIN(odometer_km), MAX(odometer_km), TOTAL(delta_km) FROM odometer_samples "
+        f"WHERE device_key = {_DEVICE_KEY} AND ts_ms >= :a AND ts_ms < :b"), p).one()
+
+    # parte arquivada do dia (Parquet); pontos do SQLite e do Parquet não se repetem
+    arch = cold.scan("log_records", ["ts_ms", "delta_km"], a, b - 1, [device_id])
+    if arch is not None and not arch.empty:
+        n += len(arch)
+        first = min(v for v in (first, int(arch["ts_ms"].min())) if v is not None)
+        last = max(v for v in (last, int(arch["ts_ms"].max())) if v is not None)
+        gps_km += float(arch["delta_km"].sum())
+    arch = cold.scan("odometer_samples", ["odometer_km", "delta_km"], a, b - 1, [device_id])
+    if arch is not None and not arch.empty:
+        n_odo += len(arch)
+        lo = min(v for v in (lo, float(arch["odometer_km"].min())) if v is not None)
+        hi = max(v for v in (hi, float(arch["odometer_km"].max())) if v is not None)
+        odo_km += float(arch["delta_km"].sum())
+
+    if not n and not n_odo:
+        return None
+    return {
+        "device_id": device_id, "day": day, "points": n, "first_ms": first, "last_ms": last,
+        "odo_min": lo, "odo_max": hi,
+        # hodômetro quando o device tem; senão o trajeto GPS
+        "km": odo_km if n_odo else gps_km,
+    }
+
+
+def refresh_devices(pairs) -> int:
+    """Recalcula daily_device_stats dos pares (device_id, dia). Retorna pares gravados."""
+    written = 0
+    with engine.begin() as con:
+        for device_id, day in sorted(pairs):
+            row = _device_day(con, device_id, day)
+            if row is None:
+                con.execute(text("DELETE FROM daily_device_stats WHERE device_id = :d AND day = :day"),
+                            {"d": device_id, "day": day})
+                continue
+            con.execute(text("""
+                INSERT INTO daily_device_stats (device_id, day, points, first_ms, last_ms, odo_min, odo_max, km)
+                VALUES (:device_id, :day, :points, :first_ms, :last_ms, :odo_min, :odo_max, :km)
+                ON CONFLICT (device_id, day) DO UPDATE SET
+                    points = excluded.points, first_ms = excluded.first_ms, last_ms = excluded.last_ms,
+                    odo_min = excluded.odo_min, odo_max = excluded.odo_max, km = excluded.km
+            """), row)
+            written += 1
+    return written
+
+
+def refresh_incidents(pairs) -> int:
+    """Recalcula daily_incident_stats dos pares (device_id, dia)."""
+    written = 0
+    with engine.begin() as con:
+        for device_id, day in sorted(pairs):
+            a, b = day_bounds_ms(day)
+            p = {"d": device_id, "day": day}
+            con.execute(text("DELETE FROM daily_incident_stats WHERE device_id = :d AND day = :day"), p)
+            res = con.execute(text("""
+                INSERT INTO daily_incident_stats (device_id, day, rule_name, severity, n)
+                SELECT device_id, :day, COALESCE(rule_name, ''), COALESCE(severity, ''), COUNT(*)
+                FROM exception_events
+                WHERE device_id = :d AND ts_ms >= :a AND ts_ms < :b
+                GROUP BY COALESCE(rule_name, ''), COALESCE(severity, '')
+            """), {**p, "a": a, "b": b})
+            written += res.rowcount or 0
+    return written
+
+
+def refresh_cells(pairs) -> int:
+    """Recalcula daily_grid_cells dos pares (device_id, dia). Retorna células gravadas."""
+    written = 0
+    with engine.begin() as con:
+        for device_id, day in sorted(pairs):
+            a, b = day_bounds_ms(day)
+            p = {"d": device_id, "day": day}
+            con.execute(text("DELETE FROM daily_grid_cells WHERE device_id = :d AND day = :day"), p)
+            pts = con.exec_driver_sql(
+                "SELECT latitude, longitude FROM log_records "
+                "WHERE device_key = (SELECT key FROM devices WHERE id = ?) "
+                "AND ts_ms >= ? AND ts_ms < ? AND latitude IS NOT NULL",
+                (device_id, a, b)).fetchall()
+            ll = np.array([tuple(r) for r in pts], dtype=float).reshape(-1, 2)
+            lat, lon = ll[:, 0], ll[:, 1]
+            arch = cold.scan("log_records", ["latitude", "longitude"], a, b - 1, [device_id])
+            if arch is not None and not arch.empty:
+                lat = np.concatenate([lat, arch["latitude"].to_numpy(dtype=float, na_value=np.nan)])
+                lon = np.concatenate([lon, arch["longitude"].to_numpy(dtype=float, na_value=np.nan)])
+            cy, cx, n = grid.aggregate(lat, lon)
+            if len(n):
+                con.exec_driver_sql(
+                    "INSERT INTO daily_grid_cells (device_id, day, cy, cx, n) VALUES (?, ?, ?, ?, ?)",
+                    [(device_id, day, y, x, k) for y, x, k in zip(cy.tolist(), cx.tolist(), n.tolist())])
+                written += len(n)
+    return written
+
+
+def days_between(ms_from: int, ms_to: int) -> list[str]:
+    """Dias locais de ms_from a ms_to (inclusive)."""
+    days, ms = [], ms_from
+    last = local_day(ms_to)
+    while (day := local_day(ms)) <= last:
+        days.append(day)
+        ms = day_bounds_ms(day)[1]
+    return days
+
+
+def _all_pairs(table: str) -> set[tuple[str, str]]:
+    """Todos os (device, dia local) com linhas em `table` (SQLite + Parquet)."""
+    dev = "device_id" if table == "exception_events" else "device_key"
+    with engine.connect() as con:
+        spans = con.execute(text(
+            f"SELECT {dev}, MIN(ts_ms), MAX(ts_ms) FROM {table} WHERE ts_ms IS NOT NULL GROUP BY {dev}")).all()
+        if dev == "device_key":
+            ids = dict(con.execute(text("SELECT key, id FROM devices WHERE key IS NOT NULL")).all())
+            spans = [(ids[k], a, b) for k, a, b in spans]
+    pairs = {(d, day) for d, a, b in spans for day in days_between(a, b)}
+    for utc_day, device_id in cold.partitions(table):
+        a = cold.day_start_ms(utc_day)
+        pairs.update((device_id, day) for day in days_between(a, a + cold.DAY_MS - 1))
+    return pairs
+
+
+def rebuild() -> tuple[int, int]:
+    """Reconstrói os rollups do zero (dias sem dados são removidos pelos refresh)."""
+    with engine.begin() as con:
+        con.execute(text("DELETE FROM daily_device_stats"))
+        con.execute(text("DELETE FROM daily_incident_stats"))
+    dev_pairs = _all_pairs("log_records") | _all_pairs("odometer_samples")
+    inc_pairs = _all_pairs("exception_events")
+    dev = refresh_devices(dev_pairs)
+    inc = refresh_incidents(inc_pairs)
+    versions.bump(dev_pairs | inc_pairs)
+    return dev, inc
+
+
+def rebuild_cells() -> int:
+    with engine.begin() as con:
+        con.execute(text("DELETE FROM daily_grid_cells"))
+    pairs = _all_pairs("log_records")
+    cells = refresh_cells(pairs)
+    versions.bump(pairs)
+    return cells
+
+
+if __name__ == "__main__":
+    dev, inc = rebuild()
+    cells = rebuild_cells()
+    print(f"daily_device_stats: {dev} dias | daily_incident_stats: {inc} linhas | daily_grid_cells: {cells} células")
@@ -0,0 +1,119 @@
+"""
+Dicionário de regras (Rule) com cache, para os ExceptionEvents.
+
+O ExceptionEvent da Geotab traz só o id da regra ({"id": "RuleHarshBrakingId"});
+o dashboard filtra e agrupa pelo nome. Ordem de resolução, como no catálogo
+de devices (etl.devices):
+  1) cache em memória do processo;
+  2) tabela local 'rules', mantida pelo feed "Rule" do etl.sync (GetFeed por
+     versão: só regras criadas/alteradas desde o último toVersion);
+  3) id ainda desconhecido (regra criada depois da última passada do feed):
+     um único Get de Rule com o catálogo inteiro — nunca uma chamada por evento.
+Evento que já traz rule.name usa esse nome se o id não estiver no dicionário.
+
+Na gravação ficam só os eventos do conjunto de regras configurado
+(FORTTIS_RULES: nomes ou ids separados por vírgula; padrão: as regras do
+dashboard) e a severidade vira um dos SEVERITIES. Os ExceptionEvents da
+Geotab em geral não trazem severidade: vale então a padrão da regra.
+"""
+import os
+
+from sqlalchemy import select
+
+from config import get_api
+from db.models import engine, Rule
+from db.queries import INCIDENT_RULES
+from etl.bulk import bulk_upsert
+import perf
+
+_IN_BATCH = 500
+
+SEVERITIES = ("Low", "Medium", "High", "Critical")
+RULE_SEVERITY = {  # severidade do evento que não traz uma (por nome de regra)
+    "Possible Collision": "Critical",
+    "Harsh Braking": "High",
+    "Harsh Acceleration": "Medium",
+    "Harsh Cornering": "Medium",
+}
+RULE_SET = frozenset(r.strip() for r in os.getenv("FORTTIS_RULES", "").split(",") if r.strip()) \
+    or frozenset(INCIDENT_RULES)
+
+_SEVERITY = {s.lower(): s for s in SEVERITIES}
+
+_names: dict[str, str] = {}    # id -> nome
+_not_found: set[str] = set()   # ids que nem o Get de Rule devolveu (não pergunta de novo)
+
+
+def _rule_row(r: dict) -> dict:
+    return {"id": r["id"], "name": r.get("name"), "base_type": r.get("baseType"), "version": r.get("version")}
+
+
+def normalize_rules(rules: list[dict]) -> list[dict]:
+    return [_rule_row(r) for r in rules if r.get("id")]
+
+
+def write_rules(rows: list[dict]) -> None:
+    if rows:
+        bulk_upsert(Rule.__table__, rows, ["id"])
+        _names.update((r["id"], r["name"]) for r in rows if r["name"])
+        _not_found.difference_update(r["id"] for r in rows if r["name"])
+
+
+def save_rules(rules: list[dict]) -> None:
+    """Grava/atualiza regras vindas da API (Get ou GetFeed)."""
+    write_rules(normalize_rules(rules))
+
+
+@perf.timed("api:Rule")
+def fetch_rules(api) -> list[dict]:
+    """Catálogo inteiro de regras (dezenas a centenas: uma chamada)."""
+    return api.get("Rule") or []
+
+
+def _local_names(ids: set[str]) -> dict[str, str]:
+    found = {}
+    ids = list(ids)
+    with engine.connect() as conn:
+        for i in range(0, len(ids), _IN_BATCH):
+            q = select(Rule.id, Rule.name).where(Rule.id.in_(ids[i:i + _IN_BATCH]), Rule.name.isnot(None))
+            found.update(conn.execute(q).all())
+    return found
+
+
+def rule_names(rule_ids: set[str], api=None) -> dict[str, str]:
+    """id -> nome. Só chama a API (um Get de Rule) se houver id desconhecido."""
+    missing = {r for r in rule_ids if r} - _names.keys() - _not_found
+    if missing:
+        _names.update(_local_names(missing))
+        missing -= _names.keys()
+    if missing:
+        save_rules(fetch_rules(api or get_api()))
+        _not_found.update(missing - _names.keys())
+    return {r: _names[r] for r in rule_ids if r in _names}
+
+
+def normalize_severity(value) -> str | None:
+    """'high', ' HIGH ' -> 'High'; fora de SEVERITIES -> None."""
+    return _SEVERITY.get(str(value).strip().lower()) if value is not None else None
+
+
+def apply(rows: list[dict], api=None) -> list[dict]:
+    """
+    Linhas normalizadas de exception_events (com rule_id) -> só as do
+    RULE_SET, com rule_name do dicionário e severidade normalizada.
+    """
+    rule_names({r["rule_id"] for r in rows if r["rule_id"] and not r["rule_name"]}, api)
+    out = []
+    for r in rows:
+        name = _names.get(r["rule_id"]) or r["rule_name"] or r["rule_id"]
+        if name not in RULE_SET and r["rule_id"] not in RULE_SET:
+            continue
+        r["rule_name"] = name
+        r["severity"] = normalize_severity(r["severity"]) or RULE_SEVERITY.get(name)
+        out.append(r)
+    return out
+
+
+def clear_cache() -> None:
+    _names.clear()
+    _not_found.clear()
@@ -0,0 +1,224 @@
+"""
+Sincronização contínua via GetFeed (processo de longa duração).
+
+    python -m etl.sync              # alcança a cabeça dos feeds e segue em polling
+    python -m etl.sync --once       # só alcança a cabeça e sai
+
+Para cada entidade (Device, Rule, Diagnostic, LogRecord, StatusData de cada
+diagnóstico de etl.diagnostics.DIAGNOSTICS, ExceptionEvent):
+  - lê o fromVersion em 'sync_state';
+  - busca páginas de GetFeed até alcançar a cabeça (página incompleta), com
+    download, normalização e gravação sobrepostos (etl.feed_pipeline);
+  - grava a página e persiste o toVersion logo após o commit dos dados;
+  - ajusta o tamanho de página (cresce com páginas cheias, encolhe com lentidão/erro)
+    e faz backoff exponencial em falhas transitórias (rede, timeout, cota de
+    chamadas, banco da Geotab indisponível), até MAX_RETRIES seguidas; aí o
+    feed fica para a próxima rodada e os seguintes continuam. Qualquer outra
+    falha (credencial, bug de normalização/gravação) sobe na hora.
+Depois disso, repete em intervalo fixo. O dashboard só lê o SQLite.
+
+Os upserts são idempotentes: se o processo cair entre gravar a página e
+persistir o toVersion, a página é simplesmente regravada na próxima execução.
+"""
+import argparse
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+import requests
+from mygeotab.exceptions import MyGeotabException, TimeoutException
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from config import get_api
+from db.models import engine, SyncState
+from etl.devices import normalize_devices, write_devices
+from etl.diagnostics import DIAGNOSTICS, normalize_diagnostics, write_diagnostics
+from etl.rules import normalize_rules, write_rules
+from etl.feed_pipeline import FeedPipeline
+from etl.pipeline import (
+    normalize_logrecords, write_logrecords,
+    normalize_odometer_samples, write_odometer_samples,
+    normalize_status_samples, write_status_samples,
+    normalize_exception_events, write_exception_events,
+)
+import perf
+
+log = logging.getLogger("forttis.sync")
+
+ODOMETER_DIAGNOSTIC_ID = DIAGNOSTICS["odometer"]
+
+MIN_PAGE = 500
+MAX_PAGE = 50_000          # limite do GetFeed na Geotab
+SLOW_PAGE_SECONDS = 20.0   # página mais lenta que isso -> encolhe
+POLL_SECONDS = 15.0
+MAX_BACKOFF_SECONDS = 300.0
+MAX_RETRIES = 8            # falhas transitórias seguidas num catch-up antes de pular o feed
+
+_TRANSIENT_API = {"OverLimitException", "DbUnavailableException"}
+
+
+def fetch_feed(api, type_name: str, from_version: str | None = None, results_limit: int = 1000,
+               search: dict | None = None):
+    """Wrapper compatível para GetFeed em qualquer versão do SDK."""
+    params = {"typeName": type_name, "resultsLimit": results_limit}
+    if from_version:
+        params["fromVersion"] = from_version
+    if search:
+        params["search"] = search
+    return api.call("GetFeed", **params)
+
+
+def get_version(entity: str) -> str | None:
+    with engine.connect() as conn:
+        return conn.execute(
+            select(SyncState.to_version).where(SyncState.entity == entity)
+        ).scalar_one_or_none()
+
+
+def set_version(entity: str, to_version: str) -> None:
+    stmt = sqlite_insert(SyncState.__table__).values(entity=entity, to_version=to_version)
+    stmt = stmt.on_conflict_do_update(index_elements=["entity"], set_={"to_version": to_version})
+    with engine.begin() as conn:
+        conn.execute(stmt)
+
+
+@dataclass
+class Feed:
+    """Uma entidade sincronizada via GetFeed."""
+    entity: str                       # chave em sync_state
+    type_name: str                    # typeName do GetFeed
+    normalize: Callable               # normalize(items) -> linhas
+    write: Callable                   # write(linhas, api) -> gravação
+    search: dict | None = None
+    page_size: int = 5000
+    backoff: float = 0.0
+    rows: int = 0                     # total gravado neste processo
+    last_stats: list | None = None    # estágios do último catch-up (FeedPipeline.stats())
+
+
+def default_feeds() -> list[Feed]:
+    return [
+        Feed("Device", "Device", normalize_devices, lambda rows, api: write_devices(rows),
+             page_size=MIN_PAGE),
+        # dicionário de regras antes dos eventos: nomes resolvidos sem Get por página
+        Feed("Rule", "Rule", normalize_rules, lambda rows, api: write_rules(rows),
+             page_size=MIN_PAGE),
+        Feed("Diagnostic", "Diagnostic", normalize_diagnostics, lambda rows, api: write_diagnostics(rows),
+             page_size=MAX_PAGE),
+        Feed("LogRecord", "LogRecord", normalize_logrecords,
+             lambda rows, api: write_logrecords(rows, api=api)),
+        # um GetFeed de StatusData por diagnóstico (odômetro mantém a entidade "StatusData" de antes)
+        Feed("StatusData", "StatusData", normalize_odometer_samples,
+             lambda rows, api: write_odometer_samples(rows, api=api),
+             search={"diagnosticSearch": {"id": ODOMETER_DIAGNOSTIC_ID}}),
+        *(Feed(f"StatusData:{kind}", "StatusData", normalize_status_samples,
+               lambda rows, api: write_status_samples(rows, api=api),
+               search={"diagnosticSearch": {"id": diag_id}})
+          for kind, diag_id in DIAGNOSTICS.items() if kind != "odometer"),
+        Feed("ExceptionEvent", "ExceptionEvent", normalize_exception_events,
+             lambda rows, api: write_exception_events(rows, api=api)),
+    ]
+
+
+def _adapt(feed: Feed, n: int, seconds: float) -> None:
+    if seconds > SLOW_PAGE_SECONDS:
+        feed.page_size = max(MIN_PAGE, feed.page_size // 2)
+    elif n >= feed.page_size:
+        feed.page_size = min(MAX_PAGE, feed.page_size * 2)
+
+
+def _fetcher(api, feed: Feed):
+    """fetch(version) para o FeedPipeline: uma página, com ajuste adaptativo do tamanho."""
+    def fetch(from_version):
+        limit = feed.page_size
+        t0 = time.perf_counter()
+        page = fetch_feed(api, feed.type_name, from_version, results_limit=limit, search=feed.search)
+        data = page.get("data") or []
+        seconds = time.perf_counter() - t0
+        perf.record(f"api:GetFeed {feed.type_name}", seconds * 1000)
+        perf.count(f"api:{feed.type_name}.items", len(data))
+        _adapt(feed, len(data), seconds)
+        log.info("%s: %d itens em %.2fs (página=%d)", feed.entity, len(data), seconds, feed.page_size)
+        return data, page.get("toVersion"), len(data) >= limit
+    return fetch
+
+
+def _transient(e: BaseException) -> bool:
+    """Falha que passa sozinha (rede, timeout, cota, banco da Geotab fora do ar)?"""
+    if isinstance(e, MyGeotabException):
+        return e.name in _TRANSIENT_API
+    return isinstance(e, (TimeoutException, requests.ConnectionError, requests.Timeout))
+
+
+def catch_up(api, feed: Feed) -> int:
+    """
+    Consome o feed até a cabeça. Falha transitória aborta o pipeline, gera
+    backoff, encolhe a página e recomeça do último toVersion persistido (até
+    MAX_RETRIES seguidas); as demais, e a transitória além disso, sobem.
+    """
+    failures = 0
+    while True:
+        pipe = FeedPipeline(
+            fetch=_fetcher(api, feed),
+            normalize=feed.normalize,
+            write=lambda rows: feed.write(rows, api),
+            commit=lambda v: set_version(feed.entity, v),
+            from_version=get_version(feed.entity),
+        )
+        try:
+            rows = pipe.run()
+        except Exception as e:
+            failures += 1
+            if not _transient(e) or failures > MAX_RETRIES:
+                raise
+            feed.backoff = min(MAX_BACKOFF_SECONDS, max(1.0, feed.backoff * 2))
+            feed.page_size = max(MIN_PAGE, feed.page_size // 2)
+            log.warning("%s: falha (%s); nova tentativa em %.0fs", feed.entity, e, feed.backoff)
+            time.sleep(feed.backoff)
+            continue
+        feed.backoff = 0.0
+        feed.rows += rows
+        feed.last_stats = pipe.stats()
+        perf.flush(f"sync:{feed.entity}")
+        if pipe.fetch_stats.pages > 1:
+            for st in feed.last_stats:
+                log.info("%s %s", feed.entity, st)
+            log.info("%s: gargalo = %s", feed.entity, pipe.bottleneck())
+        return rows
+
+
+def run(api=None, feeds: list[Feed] | None = None, once: bool = False,
+        poll_seconds: float = POLL_SECONDS) -> None:
+    api = api or get_api()
+    feeds = feeds or default_feeds()
+    while True:
+        for feed in feeds:
+            try:
+                catch_up(api, feed)
+            except Exception as e:
+                if not _transient(e):
+                    raise
+                feed.backoff = 0.0
+                log.error("%s: %d falhas seguidas (%s); fica para a próxima rodada", feed.entity,
+                          MAX_RETRIES + 1, e)
+        if once:
+            return
+        time.sleep(poll_seconds)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Sincronização contínua Geotab -> SQLite (GetFeed).")
+    ap.add_argument("--once", action="store_true", help="alcança a cabeça dos feeds e sai")
+    ap.add_argument("--poll", type=float, default=POLL_SECONDS, help="intervalo de polling (s)")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        run(once=args.once, poll_seconds=args.poll)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
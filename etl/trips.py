@@ -0,0 +1,89 @@
+"""
+Viagens por device (tabela 'trips'), segmentadas dos log_records na ingestão.
+
+Cada device tem uma marca d'água em 'trip_state' (resume_ms): o início da
+viagem que ainda pode crescer, ou o último ponto visto se a última viagem
+já fechou. Depois de cada gravação, por device tocado, os pontos a partir
+da marca são segmentados de novo (analytics.trips) e as viagens que
+começam ali são regravadas — só a cauda aberta é relida, não o histórico.
+
+Ponto atrasado (antes da marca) recua o recomeço até a primeira viagem que
+pode ter sido afetada (terminada a menos de GAP_MS dele). Os pontos são
+lidos do SQLite; atraso num dia já arquivado em Parquet não muda viagens.
+
+    python -m etl.trips            # reconstrói tudo (ex.: depois da migração 010)
+"""
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy import text
+
+from analytics.trips import segment, FIELDS, GAP_MS
+from db import versions
+from db.models import engine
+from etl.rollups import days_between
+
+_COLS = ", ".join(("device_id",) + FIELDS)
+_INSERT = f"INSERT INTO trips ({_COLS}) VALUES ({', '.join('?' * (len(FIELDS) + 1))})"
+
+
+def _resume_from(con, device_id: str, first_ms: int) -> int:
+    """ts_ms a partir do qual segmentar de novo, dado o ponto gravado mais antigo."""
+    resume = con.execute(text("SELECT resume_ms FROM trip_state WHERE device_id = :d"),
+                         {"d": device_id}).scalar()
+    if resume is not None and first_ms >= resume:
+        return resume
+    # atrasado (ou device novo): volta até a viagem que termina a menos de GAP_MS do ponto
+    start = con.execute(text("SELECT MIN(start_ms) FROM trips WHERE device_id = :d AND end_ms >= :t"),
+                        {"d": device_id, "t": first_ms - GAP_MS}).scalar()
+    return min(v for v in (start, first_ms - GAP_MS, resume) if v is not None)
+
+
+def _resegment(con, device_id: str, from_ms: int) -> int:
+    pts = con.exec_driver_sql(
+        "SELECT ts_ms, speed, latitude, longitude, delta_km FROM log_records "
+        "WHERE device_key = (SELECT key FROM devices WHERE id = ?) AND ts_ms >= ? ORDER BY ts_ms",
+        (device_id, from_ms)).fetchall()
+    a = np.array([tuple(r) for r in pts], dtype=float).reshape(-1, 5)
+    trips, resume = segment(a[:, 0].astype(np.int64), a[:, 1], a[:, 2], a[:, 3], a[:, 4])
+    con.execute(text("DELETE FROM trips WHERE device_id = :d AND start_ms >= :a"), {"d": device_id, "a": from_ms})
+    if trips:
+        con.exec_driver_sql(_INSERT, [(device_id,) + tuple(t[f] for f in FIELDS) for t in trips])
+    con.execute(text(
+        "INSERT INTO trip_state (device_id, resume_ms, updated_at) VALUES (:d, :r, :u) "
+        "ON CONFLICT(device_id) DO UPDATE SET resume_ms = excluded.resume_ms, updated_at = excluded.updated_at"),
+        {"d": device_id, "r": from_ms if resume is None else resume, "u": datetime.now(timezone.utc)})
+    if len(a):  # viagens regravadas começam entre o recomeço e o último ponto
+        versions.bump({(device_id, day) for day in days_between(max(from_ms, int(a[0, 0])), int(a[-1, 0]))}, con)
+    return len(trips)
+
+
+def update(rows: list[dict]) -> int:
+    """Segmenta de novo a cauda dos devices das linhas gravadas. Retorna viagens regravadas."""
+    first: dict[str, int] = {}
+    for r in rows:
+        if r.get("ts_ms") is not None:
+            first[r["device_id"]] = min(first.get(r["device_id"], r["ts_ms"]), r["ts_ms"])
+    written = 0
+    with engine.begin() as con:
+        for device_id, ms in sorted(first.items()):
+            written += _resegment(con, device_id, _resume_from(con, device_id, ms))
+    return written
+
+
+def rebuild() -> int:
+    """Recria todas as viagens a partir dos pontos do SQLite."""
+    with engine.begin() as con:
+        con.execute(text("DELETE FROM trips"))
+        con.execute(text("DELETE FROM trip_state"))
+        ids = con.execute(text(
+            "SELECT id FROM devices WHERE key IN (SELECT DISTINCT device_key FROM log_records)")).scalars().all()
+    written = 0
+    for device_id in ids:
+        with engine.begin() as con:
+            written += _resegment(con, device_id, 0)
+    return written
+
+
+if __name__ == "__main__":
+    print(f"trips: {rebuild()} viagens.")
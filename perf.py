@@ -0,0 +1,220 @@
+"""
+Instrumentação leve: timers e contadores por execução (rerun do dashboard,
+página do sync, ...).
+
+    import perf
+    with perf.timer("chart:rota"):
+        ...
+    @perf.timed()                 # nome = módulo.função
+    def load_points(...): ...
+    perf.count("api:itens", len(data))
+
+Ativada com FORTTIS_PERF=1. Desativada (padrão), timed() devolve a própria
+função, timer() um contexto nulo compartilhado e count() retorna na hora;
+os eventos de SQL nem são registrados.
+
+As medições vão para a execução corrente (start_run/end_run, por contexto
+— cada sessão do Streamlit tem a sua) ou, fora de uma execução (threads do
+ETL), para um acumulado do processo, gravado com flush(). Cada execução
+encerrada vira uma linha JSON em FORTTIS_PERF_FILE (padrão perf_metrics.jsonl).
+"""
+import contextvars
+import functools
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from pathlib import Path
+
+ENABLED = os.getenv("FORTTIS_PERF", "0") not in ("", "0", "false", "False")
+METRICS_FILE = Path(os.getenv("FORTTIS_PERF_FILE") or Path(__file__).resolve().parent / "perf_metrics.jsonl")
+
+_NOOP = nullcontext()
+
+
+class Run:
+    """Medições agregadas por nome: n, total e máximo (ms); contadores."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.started_at = datetime.now(timezone.utc)
+        self._t0 = time.perf_counter()
+        self.total_ms = None
+        self.timings: dict[str, list] = {}   # nome -> [n, total_ms, max_ms]
+        self.counters: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, ms: float) -> None:
+        with self._lock:
+            t = self.timings.get(name)
+            if t is None:
+                self.timings[name] = [1, ms, ms]
+            else:
+                t[0] += 1
+                t[1] += ms
+                t[2] = max(t[2], ms)
+
+    def incr(self, name: str, n: float) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def close(self) -> "Run":
+        self.total_ms = (time.perf_counter() - self._t0) * 1000
+        return self
+
+    def rows(self) -> list[dict]:
+        """Medições ordenadas por tempo total (p/ tabela)."""
+        out = [{"nome": k, "n": n, "total_ms": round(tot, 2), "max_ms": round(mx, 2)}
+               for k, (n, tot, mx) in self.timings.items()]
+        return sorted(out, key=lambda r: r["total_ms"], reverse=True)
+
+    def as_dict(self) -> dict:
+        return {
+            "label": self.label,
+            "started_at": self.started_at.isoformat(timespec="milliseconds"),
+            "total_ms": round(self.total_ms, 2) if self.total_ms is not None else None,
+            "timings": {k: {"n": n, "total_ms": round(tot, 3), "max_ms": round(mx, 3)}
+                        for k, (n, tot, mx) in self.timings.items()},
+            "counters": self.counters,
+        }
+
+
+_current: contextvars.ContextVar[Run | None] = contextvars.ContextVar("perf_run", default=None)
+_process = Run("process")
+_file_lock = threading.Lock()
+
+
+def _run() -> Run:
+    return _current.get() or _process
+
+
+def record(name: str, ms: float) -> None:
+    if ENABLED:
+        _run().add(name, ms)
+
+
+def count(name: str, n: float = 1) -> None:
+    if ENABLED:
+        _run().incr(name, n)
+
+
+@contextmanager
+def _timer(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _run().add(name, (time.perf_counter() - t0) * 1000)
+
+
+def timer(name: str):
+    """Context manager que mede o bloco com `name`."""
+    return _timer(name) if ENABLED else _NOOP
+
+
+def timed(name: str | None = None):
+    """Decorador: mede cada chamada (nome padrão: módulo.função)."""
+    def deco(fn):
+        if not ENABLED:
+            return fn
+        label = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _run().add(label, (time.perf_counter() - t0) * 1000)
+        return wrapper
+    return deco
+
+
+def start_run(label: str) -> Run | None:
+    if not ENABLED:
+        return None
+    run = Run(label)
+    _current.set(run)
+    return run
+
+
+def end_run() -> Run | None:
+    """Fecha a execução corrente e grava no arquivo de métricas."""
+    run = _current.get()
+    if run is None:
+        return None
+    _current.set(None)
+    write(run.close())
+    return run
+
+
+@contextmanager
+def _own_run(label: str):
+    start_run(label)
+    try:
+        yield
+    finally:
+        end_run()
+
+
+def ensure_run(label: str):
+    """
+    Context manager: o bloco vira uma execução própria (`label`) se não houver
+    uma aberta — rerun parcial de um st.fragment do dashboard, que não passa
+    pelo start_run do topo do script. Dentro de uma execução, só acumula nela.
+    """
+    return _own_run(label) if ENABLED and _current.get() is None else _NOOP
+
+
+def flush(label: str) -> Run | None:
+    """Grava e zera o acumulado do processo (medições fora de start_run)."""
+    global _process
+    if not ENABLED or not (_process.timings or _process.counters):
+        return None
+    run, _process = _process, Run("process")
+    run.label = label
+    write(run.close())
+    return run
+
+
+def write(run: Run) -> None:
+    line = json.dumps(run.as_dict(), ensure_ascii=False)
+    with _file_lock, open(METRICS_FILE, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+# ===== SQL (eventos do SQLAlchemy) =====
+_SQL_TARGET = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE|ON)\s+([\w\"]+)", re.IGNORECASE)
+
+
+def _sql_name(statement: str) -> str:
+    """'sql:SELECT log_records' — verbo + primeira tabela (agrupa as variações de parâmetros)."""
+    s = statement.lstrip()
+    verb = s.split(None, 1)[0].upper() if s else "?"
+    m = _SQL_TARGET.search(s)
+    return f"sql:{verb} {m.group(1).strip(chr(34))}" if m else f"sql:{verb}"
+
+
+def instrument_engine(engine) -> None:
+    """Mede cada statement executado em `engine` (no-op se desativado)."""
+    if not ENABLED:
+        return
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("perf_t0", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        t0 = conn.info["perf_t0"].pop()
+        _run().add(_sql_name(statement), (time.perf_counter() - t0) * 1000)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(ctx):
+        stack = ctx.connection.info.get("perf_t0") if ctx.connection is not None else None
+        if stack:
+            stack.pop()
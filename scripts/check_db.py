@@ -1,7 +1,6 @@
-import sqlite3
+from sqlalchemy import text
+from db.models import read_engine
 
-con = sqlite3.connect("forttis.db")
-cur = con.cursor()
-cur.execute("SELECT name FROM sqlite_master WHERE type='table'")
-print(cur.fetchall())
-con.close()
+with read_engine.connect() as con:
+    print(con.execute(text("SELECT name FROM sqlite_master WHERE type='table'")).all())
+    print("journal_mode:", con.execute(text("PRAGMA journal_mode")).scalar())
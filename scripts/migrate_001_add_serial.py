@@ -1,8 +1,5 @@
-from sqlalchemy import create_engine, text
-from pathlib import Path
-
-DB_PATH = Path(__file__).resolve().parents[1] / "forttis.db"
-engine = create_engine(f"sqlite:///{DB_PATH}", future=True)
+from sqlalchemy import text
+from db.models import engine
 
 with engine.begin() as con:
     try:
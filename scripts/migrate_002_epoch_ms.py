@@ -0,0 +1,44 @@
+"""
+Migração 002: colunas ts_ms (epoch UTC em ms) + índices compostos (device_id, ts_ms).
+
+- adiciona ts_ms em log_records, odometer_samples e exception_events;
+- preenche a partir de date_time (texto UTC sem fuso, gravado pelo SQLAlchemy);
+- troca os índices simples de device_id/date_time pelos compostos do models.py.
+Idempotente: pode rodar de novo sem efeito.
+"""
+from sqlalchemy import text, inspect
+from db.models import engine, Base
+
+TABLES = ["log_records", "odometer_samples", "exception_events"]
+
+OLD_INDEXES = [
+    "ix_log_records_device_id", "ix_log_records_date_time",
+    "ix_odometer_samples_device_id", "ix_odometer_samples_date_time",
+    "ix_exception_events_device_id", "ix_exception_events_date_time",
+]
+
+# julianday() entende 'YYYY-MM-DD HH:MM:SS.ffffff'; 2440587.5 = época Unix em dias julianos
+EPOCH_MS_SQL = "CAST(ROUND((julianday(date_time) - 2440587.5) * 86400000.0) AS INTEGER)"
+
+if __name__ == "__main__":
+    insp = inspect(engine)
+    with engine.begin() as con:
+        for t in TABLES:
+            cols = {c["name"] for c in insp.get_columns(t)}
+            if "ts_ms" not in cols:
+                con.execute(text(f"ALTER TABLE {t} ADD COLUMN ts_ms BIGINT"))
+                print(f"OK: coluna 'ts_ms' adicionada em {t}.")
+            n = con.execute(text(
+                f"UPDATE {t} SET ts_ms = {EPOCH_MS_SQL} WHERE ts_ms IS NULL AND date_time IS NOT NULL"
+            )).rowcount
+            print(f"{t}: {n} linhas preenchidas.")
+        for ix in OLD_INDEXES:
+            con.execute(text(f"DROP INDEX IF EXISTS {ix}"))
+        for t in TABLES:
+            cols = {c["name"] for c in inspect(con).get_columns(t)}
+            for ix in Base.metadata.tables[t].indexes:
+                # índices com colunas de migrações posteriores ficam para elas
+                if all(c.name in cols for c in ix.columns):
+                    ix.create(con, checkfirst=True)
+        con.execute(text("ANALYZE"))
+    print("Migração 002 concluída.")
@@ -0,0 +1,22 @@
+"""
+Migração 003: latitude/longitude em exception_events (posição do incidente).
+
+Adiciona as colunas e posiciona os eventos já existentes pelo LogRecord
+mais próximo (±5 min). Antes da migração 011 (telemetria ainda por
+device_id) o posicionamento fica para ela. Idempotente.
+"""
+from sqlalchemy import text, inspect
+from db.models import engine
+from etl.incident_geo import resolve_pending
+
+if __name__ == "__main__":
+    cols = {c["name"] for c in inspect(engine).get_columns("exception_events")}
+    with engine.begin() as con:
+        for col in ("latitude", "longitude"):
+            if col not in cols:
+                con.execute(text(f"ALTER TABLE exception_events ADD COLUMN {col} FLOAT"))
+                print(f"OK: coluna '{col}' adicionada em exception_events.")
+    if "device_key" in {c["name"] for c in inspect(engine).get_columns("log_records")}:
+        print("Incidentes posicionados:", resolve_pending())
+    else:
+        print("Posicionamento dos incidentes fica para a migração 011 (chave device_key).")
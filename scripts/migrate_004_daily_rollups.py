@@ -0,0 +1,13 @@
+"""
+Migração 004: rollups diários (daily_device_stats, daily_incident_stats).
+
+Cria as tabelas. O cálculo a partir da telemetria existente (SQLite +
+Parquet) fica na migração 005, que depende de delta_km; daí em diante o ETL
+mantém os rollups. Idempotente.
+"""
+from db.models import Base, engine, DailyDeviceStats, DailyIncidentStats
+
+if __name__ == "__main__":
+    Base.metadata.create_all(bind=engine, tables=[DailyDeviceStats.__table__, DailyIncidentStats.__table__])
+    print("OK: tabelas daily_device_stats e daily_incident_stats criadas.")
+    print("Rode a migração 005 para calcular os rollups.")
@@ -0,0 +1,49 @@
+"""
+Migração 005: delta_km por amostra (distância incremental, ver etl.distance).
+
+- adiciona delta_km em log_records e odometer_samples;
+- troca o índice antigo ix_<tabela>_device_ts pelos índices do models.py;
+- calcula os deltas das partições Parquet já arquivadas (o primeiro trecho
+  de cada partição fica 0) e os do SQLite;
+- reconstrói os rollups diários (km passa a ser soma de trechos).
+Os deltas do SQLite e os rollups usam a chave (device_key, ts_ms): antes da
+migração 011 ficam para ela, que os recalcula depois de trocar a chave.
+Idempotente.
+"""
+from sqlalchemy import text, inspect
+from db import cold
+from db.models import engine, Base
+from etl import distance, rollups
+
+if __name__ == "__main__":
+    insp = inspect(engine)
+    with engine.begin() as con:
+        for t in distance.TABLES:
+            cols = {c["name"] for c in insp.get_columns(t)}
+            if "delta_km" not in cols:
+                con.execute(text(f"ALTER TABLE {t} ADD COLUMN delta_km FLOAT"))
+                print(f"OK: coluna 'delta_km' adicionada em {t}.")
+            con.execute(text(f"DROP INDEX IF EXISTS ix_{t}_device_ts"))
+            for ix in Base.metadata.tables[t].indexes:
+                ix.create(con, checkfirst=True)
+
+    keyed = "device_key" in {c["name"] for c in inspect(engine).get_columns("log_records")}
+    for t in distance.TABLES:
+        if keyed:
+            print(f"{t}: {distance.rebuild(t)} deltas calculados.")
+        if cold.available():
+            parts = cold.partitions(t)
+            for day, device_id in parts:
+                df = cold.read_partition(t, day, device_id).sort_values("ts_ms", ignore_index=True)
+                df["delta_km"] = distance.deltas(t, df)
+                cold.write_partition(t, day, device_id, df)
+            print(f"{t}: {len(parts)} partições Parquet atualizadas.")
+
+    if keyed:
+        dev, inc = rollups.rebuild()
+        print(f"Rollups: daily_device_stats={dev} dias, daily_incident_stats={inc} linhas.")
+    else:
+        print("Deltas do SQLite e rollups ficam para a migração 011 (chave device_key).")
+    with engine.begin() as con:
+        con.execute(text("ANALYZE"))
+    print("Migração 005 concluída.")
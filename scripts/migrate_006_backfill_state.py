@@ -0,0 +1,10 @@
+"""
+Migração 006: tabela backfill_state (checkpoint do etl.backfill).
+
+Só cria a tabela; os scripts save_* passam a gravar nela. Idempotente.
+"""
+from db.models import Base, engine, BackfillState
+
+if __name__ == "__main__":
+    Base.metadata.create_all(bind=engine, tables=[BackfillState.__table__])
+    print("OK: tabela backfill_state criada.")
@@ -0,0 +1,10 @@
+"""
+Migração 007: tabela backfill_shards (shards concluídos do etl.fleet_backfill).
+
+Só cria a tabela. Idempotente.
+"""
+from db.models import Base, engine, BackfillShard
+
+if __name__ == "__main__":
+    Base.metadata.create_all(bind=engine, tables=[BackfillShard.__table__])
+    print("OK: tabela backfill_shards criada.")
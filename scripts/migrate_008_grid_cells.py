@@ -0,0 +1,21 @@
+"""
+Migração 008: cache de células da grade por device/dia (daily_grid_cells),
+usado pelo mapa de calor da frota.
+
+Cria a tabela e calcula as células a partir da telemetria existente
+(SQLite + Parquet); daí em diante o ETL mantém. Antes da migração 011
+(telemetria ainda por device_id) o cálculo fica para ela. Idempotente.
+"""
+from sqlalchemy import inspect, text
+from db.models import Base, engine, DailyGridCells
+from etl import rollups
+
+if __name__ == "__main__":
+    Base.metadata.create_all(bind=engine, tables=[DailyGridCells.__table__])
+    print("OK: tabela daily_grid_cells criada.")
+    if "device_key" in {c["name"] for c in inspect(engine).get_columns("log_records")}:
+        print(f"daily_grid_cells: {rollups.rebuild_cells()} células.")
+    else:
+        print("Cálculo das células fica para a migração 011 (chave device_key).")
+    with engine.begin() as con:
+        con.execute(text("ANALYZE daily_grid_cells"))
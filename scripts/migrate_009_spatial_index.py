@@ -0,0 +1,19 @@
+"""
+Migração 009: índice espacial dos pontos (log_records_rtree, R*Tree do
+SQLite), usado na busca por área do dashboard.
+
+Cria a tabela virtual e indexa os pontos que estão no SQLite (o que já foi
+para o Parquet é achado pela grade diária); daí em diante o ETL mantém.
+Idempotente: reconstrói o índice do zero. O índice guarda device_key:
+antes da migração 011 (telemetria ainda por device_id) fica para ela.
+"""
+from sqlalchemy import inspect
+
+from db import spatial
+from db.models import engine
+
+if __name__ == "__main__":
+    if "device_key" in {c["name"] for c in inspect(engine).get_columns("log_records")}:
+        print(f"log_records_rtree: {spatial.rebuild()} pontos indexados.")
+    else:
+        print("Índice espacial fica para a migração 011 (chave device_key).")
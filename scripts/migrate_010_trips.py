@@ -0,0 +1,21 @@
+"""
+Migração 010: viagens por device (trips) e marca d'água da segmentação
+(trip_state), usadas na lista de viagens do dashboard.
+
+Cria as tabelas e segmenta os pontos que estão no SQLite; daí em diante o
+ETL mantém. Antes da migração 011 (telemetria ainda por device_id) a
+segmentação fica para ela. Idempotente.
+"""
+from sqlalchemy import inspect, text
+from db.models import Base, engine, Trip, TripState
+from etl import trips
+
+if __name__ == "__main__":
+    Base.metadata.create_all(bind=engine, tables=[Trip.__table__, TripState.__table__])
+    print("OK: tabelas trips e trip_state criadas.")
+    if "device_key" in {c["name"] for c in inspect(engine).get_columns("log_records")}:
+        print(f"trips: {trips.rebuild()} viagens.")
+    else:
+        print("Segmentação das viagens fica para a migração 011 (chave device_key).")
+    with engine.begin() as con:
+        con.execute(text("ANALYZE trips"))
@@ -0,0 +1,108 @@
+"""
+Migração 011: chave inteira dos devices e telemetria compacta.
+
+- devices ganha `key` (inteiro sequencial, índice único ux_devices_key);
+- log_records e odometer_samples passam a ter chave (device_key, ts_ms) em
+  tabela WITHOUT ROWID, sem o id texto "device|data" nem o device_id repetido
+  (e sem date_time: ts_ms já é o instante);
+- o que deriva da telemetria é recalculado com a chave nova: delta_km,
+  posição dos incidentes, rollups diários, células da grade, índice
+  espacial (log_records_rtree) e viagens — as migrações 003, 005, 008,
+  009 e 010, rodadas antes desta, deixam esses cálculos para cá;
+- VACUUM no final, depois das tabelas derivadas, para o espaço das tabelas
+  antigas voltar de fato.
+
+O que encolhe é a telemetria (tabelas + índices, medidos pelo dbstat). O
+arquivo inteiro pode crescer, porque a grade, o índice espacial e as viagens
+são montados aqui pela primeira vez; o relatório mostra os dois tamanhos.
+
+As tabelas antigas são copiadas em ordem de chave e apagadas. Idempotente:
+tabela já no formato novo é pulada. Pare o sync antes de rodar.
+"""
+from sqlalchemy import inspect, text
+
+from db import spatial
+from db.models import Base, engine, DB_PATH, LogRecord, OdometerSample, LOG_RECORDS_RTREE
+from etl import distance, incident_geo, rollups, trips
+from etl.devices import assign_keys
+
+TABLES = {
+    LogRecord.__table__: ["latitude", "longitude", "speed", "delta_km"],
+    OdometerSample.__table__: ["odometer_km", "delta_km"],
+}
+OLD_INDEXES = [
+    "ix_log_records_device_ts", "ix_log_records_ts",
+    "ix_odometer_samples_device_ts", "ix_odometer_samples_ts",
+]
+
+
+def _telemetry_mb() -> float:
+    """Páginas de log_records e odometer_samples, com os índices (dbstat)."""
+    names = ", ".join(f"'{t.name}'" for t in TABLES)
+    with engine.connect() as con:
+        return con.execute(text(f"""
+            SELECT COALESCE(SUM(s.pgsize), 0) FROM dbstat s JOIN sqlite_master m ON m.name = s.name
+            WHERE m.tbl_name IN ({names})
+        """)).scalar() / 1e6
+
+
+def _size_mb() -> float:
+    return sum(p.stat().st_size for p in (DB_PATH, DB_PATH.with_name(DB_PATH.name + "-wal"))
+               if p.exists()) / 1e6
+
+
+if __name__ == "__main__":
+    before, telemetry_before = _size_mb(), _telemetry_mb()
+    insp = inspect(engine)
+    with engine.begin() as con:
+        if "key" not in {c["name"] for c in insp.get_columns("devices")}:
+            con.execute(text("ALTER TABLE devices ADD COLUMN key INTEGER"))
+        # telemetria de devices que nunca vieram da API também ganha chave
+        for table in TABLES:
+            if "device_id" in {c["name"] for c in insp.get_columns(table.name)}:
+                con.execute(text(f"INSERT OR IGNORE INTO devices (id) SELECT DISTINCT device_id FROM {table.name}"))
+        assign_keys(con)
+        con.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ux_devices_key ON devices (key)"))
+    print("OK: devices.key atribuída.")
+
+    pending = [t for t in TABLES if "device_key" not in {c["name"] for c in insp.get_columns(t.name)}]
+    with engine.begin() as con:
+        if pending:
+            con.execute(text(f"DROP TABLE IF EXISTS {LOG_RECORDS_RTREE}"))
+        for name in OLD_INDEXES:
+            if any(name.startswith(f"ix_{t.name}_") for t in pending):
+                con.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        for t in pending:
+            con.execute(text(f"ALTER TABLE {t.name} RENAME TO {t.name}_old"))
+    Base.metadata.create_all(bind=engine, tables=pending)
+
+    for t in pending:
+        cols = TABLES[t]
+        with engine.begin() as con:
+            # mesmo (device, ms) repetido no formato antigo (ids com microssegundos): fica um
+            n = con.execute(text(f"""
+                INSERT OR REPLACE INTO {t.name} (device_key, ts_ms, {', '.join(cols)})
+                SELECT d.key, o.ts_ms, {', '.join(f'o.{c}' for c in cols)}
+                FROM {t.name}_old o JOIN devices d ON d.id = o.device_id
+                WHERE o.ts_ms IS NOT NULL
+                ORDER BY d.key, o.ts_ms
+            """)).rowcount
+            con.execute(text(f"DROP TABLE {t.name}_old"))
+        print(f"{t.name}: {n} linhas copiadas para (device_key, ts_ms) WITHOUT ROWID.")
+
+    if pending:
+        for t in distance.TABLES:
+            print(f"{t}: {distance.rebuild(t)} deltas calculados.")
+        print(f"Incidentes posicionados: {incident_geo.resolve_pending()}")
+        dev, inc = rollups.rebuild()
+        print(f"Rollups: daily_device_stats={dev} dias, daily_incident_stats={inc} linhas.")
+        print(f"daily_grid_cells: {rollups.rebuild_cells()} células.")
+        print(f"{LOG_RECORDS_RTREE}: {spatial.rebuild()} pontos indexados.")
+        print(f"trips: {trips.rebuild()} viagens.")
+    with engine.begin() as con:
+        con.execute(text("ANALYZE"))
+    with engine.connect() as con:
+        con.exec_driver_sql("VACUUM")
+        con.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    print(f"Telemetria (log_records + odometer_samples): {telemetry_before:.1f} MB -> {_telemetry_mb():.1f} MB")
+    print(f"Arquivo: {before:.1f} MB -> {_size_mb():.1f} MB (com as tabelas derivadas recalculadas)")
@@ -0,0 +1,40 @@
+"""
+Migração 012: dicionário de regras (rules) para os ExceptionEvents.
+
+Cria a tabela, baixa o catálogo de Rule da API e corrige os eventos já
+gravados: rule_name que ficou com o id da regra (a Geotab não manda o nome
+no evento) passa a ter o nome, e a severidade é normalizada como na
+ingestão (etl.rules). Refaz os rollups de incidentes no fim. Idempotente.
+Eventos fora de FORTTIS_RULES que já estão no banco não são apagados.
+"""
+from sqlalchemy import text
+
+from config import get_api
+from db.models import Base, engine, Rule
+from etl import rollups, rules
+
+if __name__ == "__main__":
+    Base.metadata.create_all(bind=engine, tables=[Rule.__table__])
+    print("OK: tabela rules criada.")
+    rules.save_rules(rules.fetch_rules(get_api()))
+
+    with engine.begin() as con:
+        n = con.execute(text("""
+            UPDATE exception_events
+            SET rule_name = (SELECT name FROM rules WHERE rules.id = exception_events.rule_name)
+            WHERE rule_name IN (SELECT id FROM rules WHERE name IS NOT NULL)
+        """)).rowcount
+        print(f"exception_events: {n} eventos com o nome da regra.")
+        fixed = 0
+        for sev, name in con.execute(text("SELECT DISTINCT severity, rule_name FROM exception_events")).all():
+            new = rules.normalize_severity(sev) or rules.RULE_SEVERITY.get(name)
+            if new != sev:
+                fixed += con.execute(text(
+                    "UPDATE exception_events SET severity = :new WHERE severity IS :sev AND rule_name IS :name"),
+                    {"new": new, "sev": sev, "name": name}).rowcount
+        print(f"exception_events: {fixed} severidades normalizadas.")
+
+    dev, inc = rollups.rebuild()
+    print(f"Rollups: {dev} dias de device, {inc} linhas de incidentes.")
+    with engine.begin() as con:
+        con.execute(text("ANALYZE rules"))
@@ -0,0 +1,16 @@
+"""
+Migração 013: catálogo local de Diagnostic (diagnostics) e StatusData de
+horas de motor/combustível (status_samples).
+
+Só cria as tabelas. O catálogo é carregado pelo feed "Diagnostic" na próxima
+passada do etl.sync (a primeira traz tudo; as seguintes, só o que mudou) —
+ou já agora com `python -m etl.diagnostics --refresh odometer`. Idempotente.
+"""
+from sqlalchemy import text
+from db.models import Base, engine, Diagnostic, StatusSample
+
+if __name__ == "__main__":
+    Base.metadata.create_all(bind=engine, tables=[Diagnostic.__table__, StatusSample.__table__])
+    print("OK: tabelas diagnostics e status_samples criadas.")
+    with engine.begin() as con:
+        con.execute(text("ANALYZE diagnostics"))
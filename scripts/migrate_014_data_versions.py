@@ -0,0 +1,14 @@
+"""
+Migração 014: versão dos dados por device/dia (data_versions), para o cache
+de consultas do dashboard (db.cache).
+
+Só cria a tabela: sem linha, o par (device, dia) está na versão 0, e o ETL
+passa a incrementar o que gravar daqui em diante (db.versions). O primeiro
+bump do ETL também cria a tabela se esta migração não tiver rodado; até lá
+o dashboard só não vê mudanças. Idempotente.
+"""
+from db.models import Base, engine, DataVersion
+
+if __name__ == "__main__":
+    Base.metadata.create_all(bind=engine, tables=[DataVersion.__table__])
+    print("OK: tabela data_versions criada.")
@@ -1,6 +1,7 @@
 from db.models import get_session, LogRecord, Device
 from sqlalchemy import func
 
+from datetime import datetime, timezone
 from sqlalchemy import select, func
 from db.models import get_session, LogRecord, Device
 
@@ -13,23 +14,25 @@ def main():
     ).scalar_one()
     print(f"Total de LogRecords no banco: {total}")
 
-    # por device: device_id, contagem, primeiro e último ponto
+    # por device: device_id, contagem, primeiro e último ponto (telemetria usa devices.key)
     stmt = (
         select(
-            LogRecord.device_id,
+            Device.id,
+            Device.name,
             func.count().label("n"),
-            func.min(LogRecord.date_time).label("first_dt"),
-            func.max(LogRecord.date_time).label("last_dt"),
+            func.min(LogRecord.ts_ms).label("first_ms"),
+            func.max(LogRecord.ts_ms).label("last_ms"),
         )
-        .group_by(LogRecord.device_id)
+        .join(Device, Device.key == LogRecord.device_key)
+        .group_by(LogRecord.device_key)
         .order_by(func.count().desc())
     )
 
     print("\nPor device:")
-    for device_id, n, first_dt, last_dt in s.execute(stmt):
-        dev = s.get(Device, device_id)  # busca por PK
-        name = dev.name if dev else str(device_id)
-        print(f"- {name} ({device_id}) -> {n} pts | {first_dt} → {last_dt}")
+    for device_id, name, n, first_ms, last_ms in s.execute(stmt):
+        first_dt = datetime.fromtimestamp(first_ms / 1000, tz=timezone.utc)
+        last_dt = datetime.fromtimestamp(last_ms / 1000, tz=timezone.utc)
+        print(f"- {name or device_id} ({device_id}) -> {n} pts | {first_dt} → {last_dt}")
 
 if __name__ == "__main__":
     main()
@@ -1,41 +1,48 @@
 from config import get_api
+from etl.backfill import backfill
 from etl.pipeline import save_logrecords
 from datetime import datetime, timedelta, timezone
-from db.models import get_session, LogRecord
+from db.models import get_session, Device, LogRecord
+from sqlalchemy import func, select
+import logging
 import sys
 
 def main():
-    if len(sys.argv) < 2:
-        print("Uso: python -m scripts.save_device_logs <DEVICE_ID> [dias]")
+    args = [a for a in sys.argv[1:] if a != "--restart"]
+    if len(args) < 1:
+        print("Uso: python -m scripts.save_device_logs <DEVICE_ID> [dias] [--restart]")
         raise SystemExit(1)
 
-    device_id = sys.argv[1]
-    days = int(sys.argv[2]) if len(sys.argv) >= 3 else 30
+    device_id = args[0]
+    days = int(args[1]) if len(args) >= 2 else 30
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 
     api = get_api()
     now = datetime.now(timezone.utc)
     start = now - timedelta(days=days)
 
-    # busca crua na API
-    items = api.get(
-        "LogRecord",
-        search={"device": device_id, "fromDate": start.isoformat(), "toDate": now.isoformat()},
-        resultsLimit=5000,   # aumente se quiser mais
+    # API -> SQLite em fatias de tempo (retoma do checkpoint se a última execução parou no meio)
+    rows = backfill(
+        f"LogRecord:{device_id}", api, "LogRecord",
+        lambda items: save_logrecords(items, api=api),
+        start, now,
+        search={"deviceSearch": {"id": device_id}},
+        restart="--restart" in sys.argv,
     )
-    print(f"API retornou {len(items)} pontos; salvando no SQLite...")
+    print("Gravados nesta execução:", rows)
 
-    # persiste
-    save_logrecords(items)
-
-    # resumo do que ficou
+    # resumo do que ficou (telemetria chaveada por devices.key)
     s = get_session()
-    total = s.query(LogRecord).filter(LogRecord.device_id == device_id).count()
-    first = s.query(LogRecord).filter(LogRecord.device_id == device_id).order_by(LogRecord.date_time.asc()).first()
-    last  = s.query(LogRecord).filter(LogRecord.device_id == device_id).order_by(LogRecord.date_time.desc()).first()
+    key = s.scalar(select(Device.key).where(Device.id == device_id))
+    total, first_ms, last_ms = s.execute(
+        select(func.count(), func.min(LogRecord.ts_ms), func.max(LogRecord.ts_ms))
+        .where(LogRecord.device_key == key)
+    ).one()
 
     print(f"📦 No banco: {total} pontos do device {device_id}.")
-    if first and last:
-        print("⏱️  intervalo UTC:", first.date_time, "→", last.date_time)
+    if first_ms is not None:
+        print("⏱️  intervalo UTC:", datetime.fromtimestamp(first_ms / 1000, tz=timezone.utc), "→",
+              datetime.fromtimestamp(last_ms / 1000, tz=timezone.utc))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
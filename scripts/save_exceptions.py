@@ -1,13 +1,17 @@
 # scripts/save_exceptions.py
+import logging
+import sys
 from config import get_api
+from etl.backfill import backfill
 from etl.pipeline import save_exception_events
 from datetime import datetime, timedelta, timezone
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
     api = get_api()
     now = datetime.now(timezone.utc)
     start = now - timedelta(days=30)
-    items = api.get("ExceptionEvent", search={"fromDate": start.isoformat(), "toDate": now.isoformat()}, resultsLimit=5000)
-    print("ExceptionEvent (API):", len(items))
-    saved = save_exception_events(items)
-    print("Salvos (após filtro):", saved)
\ No newline at end of file
+    saved = backfill("ExceptionEvent", api, "ExceptionEvent",
+                     lambda items: save_exception_events(items, api=api),
+                     start, now, restart="--restart" in sys.argv)
+    print("Salvos nesta execução (após filtro):", saved)
@@ -1,41 +1,26 @@
+import logging
+import sys
 from datetime import datetime, timedelta, timezone
 from config import get_api
+from etl import diagnostics
+from etl.backfill import backfill
 from etl.pipeline import save_odometer_samples
 
-def pick_odometer_diagnostic(api):
-    """
-    Tenta encontrar um diagnóstico de odômetro.
-    Preferências por nome contendo 'Odometer' (case-insensitive).
-    Fallback: o primeiro diagnóstico que tenha 'Odometer' no nome.
-    """
-    diags = api.get("Diagnostic", search={})
-    # ordena para escolher estável:
-    diags = sorted(diags, key=lambda d: d.get("name",""))
-    for d in diags:
-        name = (d.get("name") or "").lower()
-        if "odometer" in name:
-            return d
-    # fallback simples: None
-    return None
-
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
     api = get_api()
     now = datetime.now(timezone.utc)
     start = now - timedelta(days=90)
 
-    diag = pick_odometer_diagnostic(api)
-    if not diag:
-        print("Não encontrei diagnóstico de odômetro; ajuste a função pick_odometer_diagnostic.")
-        raise SystemExit(1)
-
-    print("Usando diagnóstico:", diag.get("name"), diag.get("id"))
-    items = api.get("StatusData", search={
-        "diagnosticSearch": {"id": diag.get("id")},
-        "fromDate": start.isoformat(),
-        "toDate": now.isoformat(),
-    }, resultsLimit=5000)
-
-    print("StatusData (odômetro) recebido:", len(items))
-    saved = save_odometer_samples(items)
-    print("OdometerSample salvos:", saved)
-    print("OK.")
\ No newline at end of file
+    # id configurado (FORTTIS_ODOMETER_DIAGNOSTIC), sem baixar o catálogo de Diagnostic;
+    # para escolher outro: python -m etl.diagnostics odometer
+    diag_id = diagnostics.DIAGNOSTICS["odometer"]
+    diag = diagnostics.get(diag_id)
+    print("Usando diagnóstico:", diag["name"] if diag else "(fora do catálogo local)", diag_id)
+    saved = backfill(f"StatusData:{diag_id}", api, "StatusData",
+                     lambda items: save_odometer_samples(items, api=api),
+                     start, now,
+                     search={"diagnosticSearch": {"id": diag_id}},
+                     restart="--restart" in sys.argv)
+    print("OdometerSample salvos nesta execução:", saved)
+    print("OK.")
@@ -0,0 +1,11 @@
+"""
+Os testes nunca tocam o forttis.db de verdade: banco e arquivo frio vão
+para um diretório temporário antes de qualquer import de db.models.
+"""
+import os
+import tempfile
+from pathlib import Path
+
+_tmp = Path(tempfile.mkdtemp(prefix="forttis-tests-"))
+os.environ["FORTTIS_DB"] = str(_tmp / "test.db")
+os.environ["FORTTIS_ARCHIVE"] = str(_tmp / "archive")
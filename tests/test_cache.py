@@ -0,0 +1,92 @@
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from db import cache, versions
+from db.cache import DEVICE_REGISTRY, EVERYTHING, QueryCache, scope
+
+
+@pytest.fixture
+def qc(monkeypatch):
+    from db.models import engine
+    monkeypatch.setattr(cache, "CHECK_S", 0.0)
+    versions.bump({("seed", "")})  # cria data_versions se preciso
+    with engine.begin() as con:
+        con.execute(text("DELETE FROM data_versions"))
+    return QueryCache(bind=engine)
+
+
+SCOPES = {
+    "all": EVERYTHING,
+    "registry": DEVICE_REGISTRY,
+    "b1_jan1_3": scope("b1", "2025-01-01", "2025-01-03"),
+    "b1_jan5_6": scope("b1", "2025-01-05", "2025-01-06"),
+    "b1_any_day": scope("b1"),
+    "b2_jan1_3": scope(["b2"], "2025-01-01", "2025-01-03"),
+    "fleet_jan2": scope(None, "2025-01-02", "2025-01-02"),
+    "fleet_jan4": scope(None, "2025-01-04", "2025-01-04"),
+}
+
+
+def _fill(qc):
+    for name, s in SCOPES.items():
+        qc.get((name,), s, lambda: name)
+
+
+def _left(qc):
+    return {name for name, s in SCOPES.items() if qc.get((name,), s, lambda: None) == name}
+
+
+def test_scope_helper():
+    assert scope("b1") == scope(["b1"]) == cache.Scope(frozenset({"b1"}))
+    assert scope(None, pd.Timestamp("2025-01-01").date()).day_from == "2025-01-01"
+
+
+def test_day_change_drops_only_crossing_scopes(qc):
+    _fill(qc)
+    versions.bump({("b1", "2025-01-02")})
+    assert qc.refresh() == 4
+    assert _left(qc) == {"registry", "b1_jan5_6", "b2_jan1_3", "fleet_jan4"}
+
+
+def test_range_edges_are_inclusive(qc):
+    _fill(qc)
+    versions.bump({("b2", "2025-01-03")})
+    qc.refresh()
+    assert _left(qc) == set(SCOPES) - {"all", "b2_jan1_3"}
+
+
+def test_registry_change_drops_registry_and_undated_scopes(qc):
+    _fill(qc)
+    versions.bump({("b1", "")})
+    qc.refresh()
+    assert _left(qc) == set(SCOPES) - {"all", "registry", "b1_any_day"}
+
+
+def test_write_during_load_is_dropped_on_next_get(qc):
+    s = scope("b1", "2025-01-01", "2025-01-03")
+
+    def load():
+        versions.bump({("b1", "2025-01-02")})  # o ETL grava enquanto a consulta lê
+        return "stale"
+    assert qc.get(("k",), s, load) == "stale"
+    assert qc.get(("k",), s, lambda: "fresh") == "fresh"
+    assert qc.get(("k",), s, lambda: "again") == "fresh"
+
+
+def test_lru_eviction_and_oversized_values():
+    small = QueryCache(max_bytes=3 * cache._nbytes("x" * 100))
+    for k in "abc":
+        small.get((k,), EVERYTHING, lambda: "x" * 100)
+    small.get(("a",), EVERYTHING, lambda: None)  # "a" vira o mais recente
+    small.get(("d",), EVERYTHING, lambda: "x" * 100)
+    assert small.evicted == 1
+    assert small.get(("b",), EVERYTHING, lambda: "miss") == "miss"
+    small.get(("big",), EVERYTHING, lambda: "x" * 10_000)
+    assert small.get(("big",), EVERYTHING, lambda: "miss") == "miss"
+
+
+def test_dataframe_is_returned_as_shallow_copy(qc):
+    df = qc.get(("df",), EVERYTHING, lambda: pd.DataFrame({"a": [1, 2]}))
+    df["extra"] = 0
+    assert list(qc.get(("df",), EVERYTHING, lambda: None).columns) == ["a"]
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from analytics.distance import GPS_MAX_GAP_MS, haversine_km, gps_deltas, odometer_deltas
+
+MIN = 60_000
+
+
+def test_empty_input():
+    assert len(odometer_deltas([], [])) == 0
+    assert len(gps_deltas([], [], [])) == 0
+
+
+def test_odometer_first_delta_is_zero_and_regular_steps_are_kept():
+    d = odometer_deltas([0, MIN, 2 * MIN], [1000.0, 1001.0, 1002.5])
+    assert d.tolist() == pytest.approx([0.0, 1.0, 1.5])
+
+
+def test_odometer_reset_is_zero_and_counting_resumes():
+    # hodômetro volta a 0 (troca de device/reset): o trecho negativo não conta
+    d = odometer_deltas([0, MIN, 2 * MIN, 3 * MIN], [5000.0, 5001.0, 0.0, 1.0])
+    assert d.tolist() == pytest.approx([0.0, 1.0, 0.0, 1.0])
+
+
+def test_odometer_implausible_jump_is_zero():
+    # 100 km em 1 min = 6000 km/h
+    d = odometer_deltas([0, MIN, 2 * MIN], [100.0, 200.0, 201.0])
+    assert d.tolist() == pytest.approx([0.0, 0.0, 1.0])
+
+
+def test_odometer_long_gap_still_counts():
+    # sem limite de intervalo no hodômetro: 50 km em 2 h é plausível
+    d = odometer_deltas([0, 120 * MIN], [0.0, 50.0])
+    assert d.tolist() == pytest.approx([0.0, 50.0])
+
+
+def test_odometer_nan_is_zero():
+    d = odometer_deltas([0, MIN, 2 * MIN], [10.0, np.nan, 11.0])
+    assert d.tolist() == [0.0, 0.0, 0.0]
+
+
+def test_haversine_one_degree_of_latitude():
+    assert float(haversine_km(0.0, 0.0, 1.0, 0.0)) == pytest.approx(111.195, abs=0.01)
+
+
+def test_gps_gap_longer_than_limit_is_zero():
+    lat = [-23.50, -23.51, -23.52]
+    lon = [-46.60, -46.60, -46.60]
+    d = gps_deltas([0, MIN, MIN + GPS_MAX_GAP_MS + 1], lat, lon)
+    assert d[0] == 0.0
+    assert d[1] == pytest.approx(1.112, abs=0.01)
+    assert d[2] == 0.0
+
+
+def test_gps_implausible_jump_is_zero():
+    # ~111 km em 1 min
+    d = gps_deltas([0, MIN], [0.0, 1.0], [0.0, 0.0])
+    assert d.tolist() == [0.0, 0.0]
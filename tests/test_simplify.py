@@ -0,0 +1,54 @@
+import numpy as np
+
+from analytics.simplify import lttb, simplify_path
+
+
+def _zigzag(n):
+    t = np.arange(n, dtype=float)
+    return t, np.sin(t / 5.0) * 0.01
+
+
+def test_simplify_path_budget_at_least_n_keeps_everything():
+    lon, lat = _zigzag(50)
+    assert simplify_path(lon, lat, budget=50).tolist() == list(range(50))
+    assert simplify_path(lon, lat, budget=500).tolist() == list(range(50))
+
+
+def test_simplify_path_respects_budget_and_endpoints():
+    lon, lat = _zigzag(1000)
+    idx = simplify_path(lon * 1e-3, lat, budget=100)
+    assert len(idx) == 100
+    assert idx[0] == 0 and idx[-1] == 999
+    assert np.all(np.diff(idx) > 0)
+
+
+def test_simplify_path_straight_line_stops_at_tolerance():
+    lon = np.linspace(-46.6, -46.5, 200)
+    lat = np.linspace(-23.6, -23.5, 200)
+    assert simplify_path(lon, lat, budget=50, tolerance=1e-9).tolist() == [0, 199]
+
+
+def test_simplify_path_keeps_the_outlier():
+    lon = np.linspace(0.0, 1.0, 101)
+    lat = np.zeros(101)
+    lat[37] = 0.5
+    assert 37 in simplify_path(lon, lat, budget=3)
+
+
+def test_lttb_n_out_at_least_n_or_below_3_keeps_everything():
+    x, y = _zigzag(20)
+    assert lttb(x, y, 20).tolist() == list(range(20))
+    assert lttb(x, y, 50).tolist() == list(range(20))
+    assert lttb(x, y, 2).tolist() == list(range(20))
+
+
+def test_lttb_keeps_peak_and_endpoints():
+    x = np.arange(10_000, dtype=float)
+    y = np.zeros(10_000)
+    y[4321] = 120.0
+    y[:50] = np.nan  # sem velocidade: tratado como 0
+    idx = lttb(x, y, 100)
+    assert len(idx) == 100
+    assert idx[0] == 0 and idx[-1] == 9_999
+    assert 4321 in idx
+    assert np.all(np.diff(idx) > 0)
@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+from sqlalchemy import text
+
+from analytics.trips import GAP_MS, STOP_MIN_MS, segment
+
+STEP = 30_000
+T0 = 1_735_700_000_000  # 2025-01-01, UTC
+
+
+def _track(*legs, t0=T0):
+    """
+    Pontos de um device a partir de trechos (pontos, km/h), um a cada STEP;
+    ("gap", ms) pula o tempo sem pontos. delta_km = velocidade x STEP.
+    """
+    ts, spd = [], []
+    t = t0
+    for leg in legs:
+        if leg[0] == "gap":
+            t += leg[1] - STEP
+            continue
+        n, kmh = leg
+        for _ in range(n):
+            ts.append(t)
+            spd.append(kmh)
+            t += STEP
+    ts, spd = np.array(ts, dtype=np.int64), np.array(spd, dtype=float)
+    dkm = spd * STEP / 3_600_000
+    lat = -23.5 + np.cumsum(dkm) / 111.0
+    lon = np.full(len(ts), -46.6)
+    return ts, spd, lat, lon, dkm
+
+
+def test_empty_and_never_moving():
+    assert segment([], [], [], [], []) == ([], None)
+    ts, *rest = _track((10, 0.0))
+    assert segment(ts, *rest) == ([], int(ts[-1]))
+
+
+def test_trip_runs_from_last_stopped_to_first_stopped_point():
+    ts, *rest = _track((3, 0.0), (20, 30.0), (12, 0.0))
+    trips, resume = segment(ts, *rest)
+    assert len(trips) == 1
+    t = trips[0]
+    assert (t["start_ms"], t["end_ms"], t["points"]) == (ts[2], ts[23], 22)
+    assert t["km"] == pytest.approx(20 * 30 * STEP / 3_600_000)
+    assert t["max_kmh"] == 30.0
+    assert resume == ts[-1]  # parada longa depois: viagem fechada
+
+
+@pytest.mark.parametrize("stopped, trips", [(STOP_MIN_MS // STEP - 1, 2), (STOP_MIN_MS // STEP - 2, 1)])
+def test_stop_of_stop_min_splits(stopped, trips):
+    # entre o último ponto andando e o próximo: stopped + 1 passos
+    ts, *rest = _track((20, 30.0), (stopped, 0.0), (20, 30.0), (12, 0.0))
+    assert len(segment(ts, *rest)[0]) == trips
+
+
+@pytest.mark.parametrize("gap, trips", [(GAP_MS, 2), (GAP_MS - STEP, 1)])
+def test_gap_without_points_splits(gap, trips):
+    ts, *rest = _track((20, 30.0), ("gap", gap), (20, 30.0), (12, 0.0))
+    assert len(segment(ts, *rest)[0]) == trips
+
+
+def test_short_trips_are_dropped():
+    short_km = _track((3, 0.0), (3, 6.0), (12, 0.0))                       # 0.15 km
+    short_time = _track((12, 0.0), (1, 120.0), ("gap", GAP_MS), (12, 0.0))  # 1 km em 30 s
+    assert segment(*short_km)[0] == []
+    assert segment(*short_time)[0] == []
+
+
+def test_open_trip_keeps_resume_at_its_start():
+    ts, *rest = _track((3, 0.0), (20, 30.0))
+    trips, resume = segment(ts, *rest)
+    assert resume == trips[0]["start_ms"] == ts[2]
+    # parada curta (< STOP_MIN_MS) ainda pode virar a mesma viagem
+    ts, *rest = _track((3, 0.0), (20, 30.0), (5, 0.0))
+    trips, resume = segment(ts, *rest)
+    assert resume == trips[0]["start_ms"]
+
+
+# ---- marca d'água (etl.trips) ----
+
+@pytest.fixture
+def db():
+    from db.models import Base, engine
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as con:
+        for t in ("trips", "trip_state", "log_records", "devices"):
+            con.execute(text(f"DELETE FROM {t}"))
+        con.execute(text("INSERT INTO devices (id, key) VALUES ('b1', 1)"))
+    return engine
+
+
+def _insert(engine, ts, spd, lat, lon, dkm):
+    rows = [{"device_key": 1, "ts_ms": int(t), "speed": float(s), "latitude": float(a),
+             "longitude": float(o), "delta_km": float(d)} for t, s, a, o, d in zip(ts, spd, lat, lon, dkm)]
+    with engine.begin() as con:
+        con.execute(text("INSERT INTO log_records (device_key, ts_ms, speed, latitude, longitude, delta_km) "
+                         "VALUES (:device_key, :ts_ms, :speed, :latitude, :longitude, :delta_km)"), rows)
+    return [{"device_id": "b1", "ts_ms": r["ts_ms"]} for r in rows]
+
+
+def _stored(engine):
+    with engine.connect() as con:
+        return [tuple(r) for r in con.execute(text(
+            "SELECT start_ms, end_ms, points FROM trips WHERE device_id = 'b1' ORDER BY start_ms"))]
+
+
+def test_resume_from_rewinds_for_late_points(db):
+    from etl.trips import _resume_from
+    with db.begin() as con:
+        con.execute(text("INSERT INTO trips (device_id, start_ms, end_ms, duration_ms, points, km) VALUES "
+                         "('b1', 1000000, 2000000, 1000000, 10, 1.0), ('b1', 3500000, 4500000, 1000000, 10, 1.0)"))
+        con.execute(text("INSERT INTO trip_state (device_id, resume_ms) VALUES ('b1', 10000000)"))
+        assert _resume_from(con, "b1", 10_000_500) == 10_000_000          # depois da marca
+        assert _resume_from(con, "b1", 5_000_000) == 3_500_000            # volta à viagem a < GAP_MS
+        assert _resume_from(con, "b1", 8_000_000) == 8_000_000 - GAP_MS   # nenhuma viagem perto
+        assert _resume_from(con, "b2", 8_000_000) == 8_000_000 - GAP_MS   # device sem marca
+
+
+def test_late_points_before_watermark_match_a_full_rebuild(db):
+    from etl import trips
+    full = _track((3, 0.0), (20, 30.0), (4, 0.0), (20, 30.0), (12, 0.0), (20, 30.0))
+    late = 3 + 20  # primeira viagem e o começo da parada chegam atrasados
+    rows = _insert(db, *(a[late:] for a in full))
+    trips.update(rows)
+    before = _stored(db)
+    trips.update(_insert(db, *(a[:late] for a in full)))
+    after = _stored(db)
+
+    expected = [(t["start_ms"], t["end_ms"], t["points"]) for t in segment(*full)[0]]
+    assert after == expected
+    assert after != before  # parada de 2 min: as duas primeiras viram uma viagem
+    trips.rebuild()
+    assert _stored(db) == expected